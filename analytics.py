@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Statistiques du circuit des accords, calculées en colonnes sur tout l'index des dossiers.
+
+Entrée : l'instantané en colonnes de DossierIndex.snapshot(ANALYTICS_COLUMNS). Toutes les
+agrégations sont des opérations pandas / NumPy sur des colonnes entières (catégories,
+crosstab, groupby, comparaisons de dates vectorisées) : aucune boucle Python par dossier.
+relativedelta ne sert qu'à calculer les quelques dates de naissance limites des tranches d'âge,
+qui sont ensuite comparées à toute la colonne d'un coup.
+"""
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+ACCORD_LABELS = {"accord_tribunal": "Tribunal", "accord_ministere": "Ministère", "organisme_accord_statut": "Organisme"}
+ACCORDED = "Accordé"
+UNKNOWN = "Non renseigné"
+# (âge minimum en années révolues, libellé)
+AGE_COHORTS = ((0, "< 2 ans"), (2, "2–5 ans"), (6, "6–11 ans"), (12, "12–17 ans"), (18, "18–39 ans"), (40, "40–59 ans"), (60, "60 ans et plus"))
+ANALYTICS_COLUMNS = ["receveur_organisme", "receveur_date_naissance", "updated_at", "created_at"] + list(ACCORD_LABELS) + [f"{field}_at" for field in ACCORD_LABELS]
+
+
+def _dates(values):
+    try: # analyseur ISO de NumPy, en C ; les dates de l'index sont écrites par isoformat()
+        return pd.Series(np.array([value or "NaT" for value in values], dtype="datetime64[s]"))
+    except ValueError: # valeur saisie hors de l'application : analyse tolérante, NaT si illisible
+        return pd.to_datetime(pd.Series(values, dtype=object), format="ISO8601", errors="coerce")
+
+
+def snapshot_frame(snapshot):
+    """DataFrame typé : statuts et organismes en catégories, dates en datetime64 (NaT si absente ou illisible)."""
+    df = pd.DataFrame({"organisme": pd.Series(snapshot["receveur_organisme"], dtype=object).fillna(UNKNOWN).astype("category")})
+    for field in ACCORD_LABELS:
+        df[field] = pd.Series(snapshot[field], dtype=object).fillna(UNKNOWN).astype("category")
+        df[f"{field}_at"] = _dates(snapshot[f"{field}_at"])
+    df["naissance"] = _dates(snapshot["receveur_date_naissance"])
+    # Dossiers sans historique (antérieurs au journal) : la dernière modification tient lieu de création
+    updated = pd.to_datetime(pd.Series(snapshot["updated_at"], dtype="float64"), unit="s")
+    df["created_at"] = _dates(snapshot["created_at"]).fillna(updated)
+    return df
+
+
+def accord_counts(df):
+    """Organisme payeur x (accord, statut) -> nombre de dossiers."""
+    tables = {label: pd.crosstab(df["organisme"], df[field]) for field, label in ACCORD_LABELS.items()}
+    counts = pd.concat(tables, axis=1).fillna(0).astype(int)
+    counts.columns = [f"{accord} — {statut}" for accord, statut in counts.columns]
+    counts.index = counts.index.astype(str)
+    counts.loc["Total"] = counts.sum()
+    return counts
+
+
+def turnaround(df):
+    """Délai en jours entre la création du dossier et le passage à "Accordé", par accord et organisme payeur."""
+    frames = []
+    for field, label in ACCORD_LABELS.items():
+        days = (df[f"{field}_at"] - df["created_at"]).dt.total_seconds() / 86400
+        done = days.notna() & (df[field] == ACCORDED).to_numpy()
+        frames.append(pd.DataFrame({"Accord": label, "Organisme": df["organisme"].astype(str)[done], "jours": days[done]}))
+    long = pd.concat(frames, ignore_index=True)
+    if long.empty:
+        return pd.DataFrame(columns=["Accord", "Organisme", "Dossiers accordés", "Médiane (j)", "Moyenne (j)", "90e centile (j)"])
+    everyone = long.assign(Organisme="Tous")
+    grouped = pd.concat([long, everyone], ignore_index=True).groupby(["Accord", "Organisme"], sort=True)["jours"]
+    table = pd.DataFrame({"Dossiers accordés": grouped.size(), "Médiane (j)": grouped.median(), "Moyenne (j)": grouped.mean(), "90e centile (j)": grouped.quantile(0.9)})
+    return table.round(1).reset_index()
+
+
+def monthly_intake(df):
+    """Mois de création x organisme payeur -> nombre de nouveaux dossiers, mois sans dossier compris."""
+    created = df["created_at"].dropna()
+    if created.empty:
+        return pd.DataFrame()
+    months = created.dt.to_period("M")
+    table = pd.crosstab(months, df.loc[created.index, "organisme"])
+    table = table.reindex(pd.period_range(months.min(), months.max(), freq="M"), fill_value=0)
+    table.index = table.index.astype(str)
+    table.columns = table.columns.astype(str)
+    return table
+
+
+def age_cohorts(df, today):
+    """Nombre de receveurs par tranche d'âge (âge révolu au jour `today`)."""
+    births = df["naissance"].to_numpy(dtype="datetime64[s]")
+    # Âge >= n ans <=> né au plus tard le jour `today - n ans` (relativedelta gère les 29 février)
+    limits = np.array([np.datetime64(today - relativedelta(years=years), "s") for years, _ in AGE_COHORTS[1:]])
+    known = ~np.isnat(births) & (births <= np.datetime64(today, "s"))
+    cohort = (births[known, None] <= limits[None, :]).sum(axis=1)
+    counts = np.bincount(cohort, minlength=len(AGE_COHORTS))
+    result = pd.Series(counts, index=[label for _, label in AGE_COHORTS], name="Receveurs")
+    result[UNKNOWN] = int((~known).sum())
+    return result
+
+
+def compute_analytics(snapshot, today=None):
+    """Toutes les statistiques de la page, plus la durée du calcul."""
+    started = time.perf_counter()
+    today = today or datetime.date.today()
+    df = snapshot_frame(snapshot)
+    results = {
+        "dossiers": len(df),
+        "accorded": {label: int((df[field] == ACCORDED).sum()) for field, label in ACCORD_LABELS.items()},
+        "accord_counts": accord_counts(df),
+        "turnaround": turnaround(df),
+        "monthly_intake": monthly_intake(df),
+        "age_cohorts": age_cohorts(df, today),
+    }
+    results["duration_s"] = time.perf_counter() - started
+    return results
@@ -1,42 +1,90 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
 import datetime
-import pandas as pd
 import os
 import json
-from fpdf import FPDF
-import shutil # Keep if used, though not in the provided snippet
-import base64
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import qrcode
+import uuid
 from io import BytesIO
 from streamlit_option_menu import option_menu
-from dateutil.relativedelta import relativedelta # Added from first script, might be useful
+from dossier_index import DossierIndex, find_dossier_file
+from caching import DossierCache, LRUCache
+from upload_store import UploadStore
+from dossier_store import save_dossier, list_versions, load_version, accord_timeline
+from profiling import RerunProfiler
+from dossier_model import DossierSchema, checklist_key, checklist_bits, checklist_statuses
+from session_memory import SessionMemory, process_rss, state_sizes
+from assets import image_base64, image_html, stylesheet_html # Logos et CSS préparés une fois par process
+# Modules lourds (pandas, NumPy, pyarrow, PIL, fpdf, pypdf, qrcode) importés dans les fonctions qui s'en servent :
+# la page d'accueil s'affiche sans eux après un redémarrage, et chaque module n'est chargé qu'une fois par process
+# (aux reruns suivants, l'import n'est plus qu'une recherche dans sys.modules).
 
 # --- Configuration & Global Constants from Second Script ---
 BASE_UPLOAD_FOLDER = "patient_uploads_allogreffe"
 GENERATED_PDF_FOLDER = "generated_reports_allogreffe"
+BLOB_STORE_FOLDER = "blob_store_allogreffe" # Documents téléversés, stockés une fois par contenu (SHA-256) pour tous les patients
+REGISTRY_EXPORT_FOLDER = "registry_export_allogreffe" # Export Parquet / Arrow de tous les dossiers (registry_export.py)
+IMAGE_PIPELINE_WORKERS = 2 # Threads qui produisent vignettes et aperçus des images téléversées
+BUNDLE_DOWNLOAD_MAX_BYTES = 50 * 1024 * 1024 # Au-delà, le dossier complet est seulement écrit sur disque (le bouton de téléchargement le chargerait en mémoire)
+EXPORT_DOWNLOAD_MAX_BYTES = 50 * 1024 * 1024 # Au-delà, l'export du registre reste sur le serveur
+PROFILING_ENABLED = True # Histogrammes de latence des reruns et des fonctions render_* / E-S (page Administration)
+PROFILING_EXPORT_FOLDER = "profiling_allogreffe" # metrics.prom (Prometheus) et metrics.jsonl, réécrits périodiquement
+PROFILING_EXPORT_INTERVAL_SECONDS = 60
+SESSION_MEMORY_ENABLED = True # Taille de st.session_state mesurée à la fin de chaque rerun, clé par clé (page Administration)
 # ALLOGREFFE_LOGO_FOOTER = "allogreffe_logo_footer.png" # We'll use LOGO_PATH from first script's style
-
-ADMIN_DOCS_LIST = ["Extrait d'acte de naissance (Père)", "Extrait d'acte de naissance (Mère)", "Copie intégrale (Receveur)", "Copie intégrale (Donneur)", "Certificat de nationalité (Père)", "Certificat de nationalité (Mère)", "CIN (Père)", "CIN (Mère)", "CIN (Receveur)", "CIN (Donneur)", "Consentement éclairé (Receveur)", "Consentement éclairé (Donneur)"]
-MEDICAL_EXAMS_LIST = ["Rx Thorax", "Échographie Cardiaque", "FISH", "Bilan Hépatique", "Bilan Rénal", "Sérologies Virales (VIH, VHB, VHC)", "Consultation Anesthésie", "Typage HLA"]
-MINISTERE_DOCS_LIST = ["Rapport Médical", "Certificat médical", "Acte de mariage (si applicable)", "CIN légalisé du père", "CIN légalisé de la Mère", "Demande manuscrite au ministère"]
+INDEX_WATCH_INTERVAL_SECONDS = 5 # Période du scan des empreintes quand watchdog n'est pas installé
+SEARCH_MAX_RESULTS = 20 # Résultats d'une recherche (par IPP ou par nom) gardés dans la session
+DOSSIER_CACHE_MAX_ENTRIES = 512 # Dossiers parsés gardés en mémoire pour tout le process
+DOSSIER_CACHE_MAX_BYTES = 64 * 1024 * 1024 # Taille estimée des dossiers parsés en mémoire, pas sur disque
+ACCORD_STATUTS = ["En cours", "Accordé", "Refusé"]
+ORGANISMES_LIST = ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"]
+DASHBOARD_PAGE_SIZES = [25, 50, 100, 200]
+DASHBOARD_SORT_OPTIONS = {"IPP": "folder", "Nom Receveur": "receveur_nom", "Nom Donneur": "donneur_nom", "Date Création/Modif": "updated_at", "Date validation organisme": "organisme_accord_date_validation", "Accord Tribunal": "accord_tribunal", "Accord Ministère": "accord_ministere", "Accord Organisme": "organisme_accord_statut", "Organisme Payeur": "receveur_organisme"}
+
+ADMIN_DOCS_LIST = ["Copie de la CIN", "Passeport", "Justificatif de domicile", "Formulaire de demande", "Extrait de casier judiciaire"]
+MEDICAL_EXAMS_LIST = ["Echographie abdominale + images", "Echographie cardiaque + images", "Rx Thorax", "Antigène HLA I et II", "Bilan biologique + sérologies", "Observation médicale", "Myélogramme", "Caryotype hématologique", "Immunophénotypage", "FISH", "Biologie moléculaire"]
+MINISTERE_DOCS_LIST = ["Rapport médical d'hospitalisation", "Certificat médical", "Acte de mariage", "CIN légalisé père", "CIN légalisé mère", "Engagement des parents en arabe - donneur", "Engagement des parents en arabe - receveur", "Extrait d'acte de naissance - donneur", "Extrait d'acte de naissance - receveur"]
+
+# Étapes saisies dans un st.form (Receveur, Donneur, Organisme) : rien n'est renvoyé au serveur avant Précédent / Suivant
+FORM_STEPS = (0, 1, 5)
+FORM_KEY_PREFIX = "form_"
+CHECKLIST_STATUS_COLUMN = "Statut" # Check-lists : une colonne de statut (oui / non / vide = non renseigné) par élément
+RECEVEUR_FORM_FIELDS = ("receveur_ipp", "receveur_nom", "receveur_prenom", "receveur_date_naissance", "receveur_sexe", "receveur_groupage", "receveur_contact_principal", "receveur_organisme", "receveur_adresse", "receveur_nom_pere", "receveur_nom_mere", "receveur_age_pere", "receveur_age_mere")
+DONNEUR_FORM_FIELDS = tuple(key.replace("receveur_", "donneur_", 1) for key in RECEVEUR_FORM_FIELDS if key != "receveur_ipp")
+ORGANISME_FORM_FIELDS = ("organisme_accord", "organisme_accord_statut", "organisme_accord_date_validation")
 
 # --- Configuration Constants from First Script (Adapted) ---
 LOGO_PATH = "HM6_Logo.png"        # Main logo, used in footer (ensure this file exists)
 LOGO_PATH_2 = "HM6_Logo.png"            # Logo for sidebar (ensure this file exists)
+APP_CSS_PATH = os.path.join("assets", "app.css") # Feuille de style de l'application, minifiée au premier chargement
+FONT_AWESOME_CSS_URL = "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css"
 # If you want to use the Allo-Greffe logo for both:
 # LOGO_PATH = "allogreffe_logo_footer.png"
 # LOGO_PATH_2 = "allogreffe_logo_footer.png"
 
 
-os.makedirs(BASE_UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(GENERATED_PDF_FOLDER, exist_ok=True)
-
 # --- Basic Logging Setup (from first script) ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s-%(levelname)s-%(filename)s:%(lineno)d - %(message)s')
 
 
+@st.cache_resource
+def get_profiler():
+    # Histogrammes partagés par toutes les sessions du process ; chaque rerun y est compté par page et par session
+    return RerunProfiler(PROFILING_EXPORT_FOLDER, PROFILING_EXPORT_INTERVAL_SECONDS)
+
+profiled = get_profiler().timed if PROFILING_ENABLED else (lambda function: function)
+# Fragments relancés seuls : comptés comme un rerun de la page et de la session en cours
+profiled_fragment = get_profiler().fragment(lambda: (st.session_state.get('profiling_session'), profiling_page_label())) if PROFILING_ENABLED else (lambda function: function)
+
+@st.cache_resource
+def get_session_memory():
+    # Dernière mesure de st.session_state de chaque session du process (page Administration)
+    return SessionMemory()
+
+
 # --- Helper & Initialization Functions (from second script, get_base64_image from first) ---
 def init_session_state_key(key, default_value):
     if key not in st.session_state:
@@ -46,8 +94,10 @@ def reset_session_state():
     active_page = st.session_state.get('active_page', 'Nouveau Dossier')
     # Save sidebar state if needed, or other persistent states
     # For now, a simple clear and re-init
+    profiling_session = st.session_state.get('profiling_session')
     st.session_state.clear()
     st.session_state.active_page = active_page
+    if profiling_session: st.session_state.profiling_session = profiling_session # même session pour le profilage
     initialize_all_form_keys() # Re-initialize form keys
     st.session_state.edit_mode = False
     logging.info("Form state has been reset for a new dossier.")
@@ -55,215 +105,157 @@ def reset_session_state():
 def initialize_all_form_keys():
     init_session_state_key('current_step', 0)
     init_session_state_key('edit_mode', False)
-    # Patient Info
-    init_session_state_key('receveur_ipp', ""); init_session_state_key('receveur_nom', ""); init_session_state_key('receveur_prenom', ""); init_session_state_key('receveur_date_naissance', datetime.date(2000, 1, 1)); init_session_state_key('receveur_adresse', ""); init_session_state_key('receveur_sexe', "Homme"); init_session_state_key('receveur_groupage', "O+"); init_session_state_key('receveur_contact_principal', ""); init_session_state_key('receveur_nom_pere', ""); init_session_state_key('receveur_age_pere', 0); init_session_state_key('receveur_nom_mere', ""); init_session_state_key('receveur_age_mere', 0); init_session_state_key('receveur_organisme', "PAYANT");
-    # Donneur Info
-    init_session_state_key('donneur_nom', ""); init_session_state_key('donneur_prenom', ""); init_session_state_key('donneur_date_naissance', datetime.date(2000, 1, 1)); init_session_state_key('donneur_adresse', ""); init_session_state_key('donneur_sexe', "Homme"); init_session_state_key('donneur_groupage', "O+"); init_session_state_key('donneur_contact_principal', ""); init_session_state_key('donneur_nom_pere', ""); init_session_state_key('donneur_age_pere', 0); init_session_state_key('donneur_nom_mere', ""); init_session_state_key('donneur_age_mere', 0); init_session_state_key('donneur_organisme', "PAYANT");
-    # Documents & Status
-    for doc in ADMIN_DOCS_LIST: init_session_state_key(f"admin_doc_{doc.lower().replace(' ', '_').replace('(', '').replace(')', '')}_upload", None)
-    init_session_state_key('accord_tribunal', "En cours")
-    for exam in MEDICAL_EXAMS_LIST: init_session_state_key(f"medical_exam_{exam.lower().replace(' ', '_').replace('é', 'e').replace('è', 'e')}", False)
-    for doc in MINISTERE_DOCS_LIST: init_session_state_key(f"ministere_doc_{doc.lower().replace(' ', '_').replace('è', 'e')}_upload", None)
-    init_session_state_key('accord_ministere', "En cours")
-    init_session_state_key('organisme_accord_nom_specifique', ""); init_session_state_key('organisme_accord_statut', "En cours"); init_session_state_key('organisme_accord_date_validation', datetime.date.today()); init_session_state_key('organisme_accord_document_upload', None)
+    # Receveur, donneur, documents, examens et accords : valeurs par défaut du modèle de dossier
+    for key, value in get_dossier_schema().default_state().items(): init_session_state_key(key, value)
     # Search specific state
     init_session_state_key('search_query', '')
     init_session_state_key('search_by', 'IPP')
     init_session_state_key('search_results', [])
     init_session_state_key('app_initialized', True) # Mark as initialized
 
-def generate_qr_code(data):
-    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-    qr.add_data(data); qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO(); img.save(buffer, format='PNG'); buffer.seek(0)
-    return buffer
+def dossier_qr_payload(state):
+    return f"IPP: {state.get('receveur_ipp', 'N/A')}\nPatient: {state.get('receveur_nom', '')} {state.get('receveur_prenom', '')}"
+
+@profiled
+def generate_qr_code(data, fmt="png"):
+    # Mémorisé par (contenu, format) pour tout le process ; "svg" ne passe pas par PIL
+    from qr_codes import qr_code
+    value = qr_code(data, fmt)
+    return BytesIO(value) if fmt == "png" else value
+
+@st.cache_resource
+def get_dossier_schema():
+    # Table des champs compilée une fois par process (listes de documents et d'examens définitives)
+    return DossierSchema(ADMIN_DOCS_LIST, MEDICAL_EXAMS_LIST, MINISTERE_DOCS_LIST)
+
+@st.cache_resource
+def get_dossier_cache():
+    # Cache LRU des dossiers parsés, partagé par toutes les sessions du process
+    return DossierCache(BASE_UPLOAD_FOLDER, DOSSIER_CACHE_MAX_ENTRIES, DOSSIER_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def get_dossier_index():
+    # Une seule instance (et une seule connexion SQLite) partagée par toutes les sessions du process
+    index = DossierIndex(BASE_UPLOAD_FOLDER, loader=get_dossier_cache().read, timeline=accord_timeline)
+    index.start_watcher(INDEX_WATCH_INTERVAL_SECONDS) # rattrape les modifications faites hors de l'application
+    return index
 
 # --- get_base64_image from first script ---
+@profiled
 def get_base64_image(image_path):
-    try:
-        with open(image_path, "rb") as img_file: return base64.b64encode(img_file.read()).decode()
-    except FileNotFoundError: logging.warning(f"Logo file not found: {image_path}"); return None
-    except Exception as e: logging.error(f"Error reading logo {image_path}: {e}"); return None
-
-# --- PDF Generation (from second script - unchanged) ---
-class PDF(FPDF):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        try:
-            self.add_font('DejaVu', '', 'DejaVuSans.ttf', uni=True)
-            self.font_family = 'DejaVu'
-        except RuntimeError:
-            logging.warning("DejaVuSans.ttf not found. PDF may not render special characters correctly. Please download it and place it in the same folder as the script.")
-            self.font_family = 'Arial' # Fallback font
-
-    def header(self): self.set_font(self.font_family, 'B', 14); self.cell(0, 10, 'Dossier Patient Allo-Greffe', 0, 1, 'C'); self.ln(5)
-    def footer(self): self.set_y(-15); self.set_font(self.font_family, 'I', 8); self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
-    def chapter_title(self, title): self.set_font(self.font_family, 'B', 12); self.set_fill_color(220, 230, 240); self.cell(0, 8, title, 0, 1, 'L', fill=True); self.ln(3)
-
-    def chapter_body(self, data_dict):
-        label_width = 50
-        value_width = self.w - self.l_margin - self.r_margin - label_width - 2
-        for key, value in data_dict.items():
-            self.set_font(self.font_family, 'B', 10); self.cell(label_width, 6, f"{key.replace('_', ' ').title()}: ", 0, 0)
-            self.set_font(self.font_family, '', 10); self.multi_cell(value_width, 6, str(value), 0, 'L')
-        self.ln(2)
-
-    def check_list(self, title, items_dict):
-        self.chapter_title(title)
-        for item, status in items_dict.items():
-            self.set_font(self.font_family, 'B' if status else '', 10) # Bold if status is True
-            self.cell(0, 7, f"- {item}: {'Oui' if status else 'Non'}", 0, 1)
-        self.ln(4)
+    return image_base64(image_path) # lu et encodé une seule fois par process
+
+@st.cache_resource
+def get_upload_store():
+    # Magasin de blobs et mémoire des fichiers déjà ingérés, partagés par toutes les sessions du process
+    return UploadStore(BASE_UPLOAD_FOLDER, BLOB_STORE_FOLDER)
 
+@st.cache_resource
+def get_image_pipeline():
+    # Pool de fond partagé : vignettes et aperçus des images ingérées
+    from image_pipeline import ImagePipeline
+    return ImagePipeline(get_upload_store(), max_workers=IMAGE_PIPELINE_WORKERS)
+
+@profiled
 def save_uploaded_file(uploaded_file, subfolder):
+    """Rattache le fichier au dossier du receveur ; idempotent, le contenu n'est stocké qu'une fois. Retourne la référence."""
     if uploaded_file is None: return None
     ipp = st.session_state.get('receveur_ipp')
     if not ipp: st.error("IPP du receveur n'est pas défini. Impossible de sauvegarder le fichier."); return None
-    patient_folder = os.path.join(BASE_UPLOAD_FOLDER, ipp, subfolder); os.makedirs(patient_folder, exist_ok=True)
-    file_path = os.path.join(patient_folder, uploaded_file.name)
-    with open(file_path, "wb") as f: f.write(uploaded_file.getbuffer())
-    logging.info(f"Fichier sauvegardé : {file_path}"); return file_path
-
-def generate_pdf_report(state, output_filename):
-    pdf = PDF('P', 'mm', 'A4'); pdf.set_auto_page_break(auto=True, margin=15); pdf.add_page()
-    receveur_info = {"IPP": state.get('receveur_ipp'),"Nom Complet": f"{state.get('receveur_nom', '')} {state.get('receveur_prenom', '')}","Date de Naissance": str(state.get('receveur_date_naissance')),"Sexe": state.get('receveur_sexe'),"Adresse": state.get('receveur_adresse'),"Organisme Payeur": state.get('receveur_organisme')}
-    pdf.chapter_title("Informations sur le Receveur"); pdf.chapter_body(receveur_info)
-    donneur_info = {"Nom Complet": f"{state.get('donneur_nom', '')} {state.get('donneur_prenom', '')}","Date de Naissance": str(state.get('donneur_date_naissance')),"Sexe": state.get('donneur_sexe')}
-    pdf.chapter_title("Informations sur le Donneur"); pdf.chapter_body(donneur_info)
-    status_info = {"Accord Tribunal": state.get('accord_tribunal'),"Accord Ministère": state.get('accord_ministere'),"Accord Organisme": state.get('organisme_accord_statut')}
-    pdf.chapter_title("Statuts des Accords"); pdf.chapter_body(status_info)
-    medical_exams_status = {exam: state.get(f"medical_exam_{exam.lower().replace(' ', '_').replace('é', 'e').replace('è', 'e')}") for exam in MEDICAL_EXAMS_LIST}
-    pdf.check_list("Check-list des Examens Médicaux", medical_exams_status)
-    pdf.output(output_filename, 'F'); logging.info(f"Rapport PDF généré : {output_filename}"); return output_filename
+    reference = get_upload_store().ingest(ipp, subfolder, uploaded_file)
+    get_image_pipeline().submit(reference) # images seulement, une fois par contenu
+    return reference
+
+@profiled
+def render_uploaded_documents(category):
+    """Documents déjà rattachés au dossier pour `category`, avec vignette quand elle est prête (jamais l'image d'origine)."""
+    ipp = st.session_state.get('receveur_ipp')
+    references = [ref for ref in get_upload_store().references(ipp) if ref['category'] == category] if ipp else []
+    if not references: return
+    pipeline = get_image_pipeline()
+    cols = st.columns(6)
+    for i, ref in enumerate(references):
+        with cols[i % 6]:
+            thumbnail = pipeline.thumbnail_path(ref['sha256'])
+            if thumbnail: st.image(thumbnail, caption=ref['name'], width=120)
+            else: st.caption(f"📄 {ref['name']} ({ref['size'] / 1024:.0f} Ko)")
+    st.caption(f"Espace disque des documents du dossier : {get_upload_store().disk_usage(ipp) / 1024:.0f} Ko.")
+
+REPORT_TEMPLATE_VERSION = 3 # À incrémenter à chaque modification de la mise en page du rapport : batch_reports.py régénère alors tout
+REPORT_CACHE_MAX_BYTES = 32 * 1024 * 1024 # Rapports PDF déjà rendus gardés en mémoire
+
+@st.cache_resource
+def get_report_cache():
+    # Rapports PDF rendus, indexés par l'empreinte des champs du rapport ; partagé par toutes les sessions
+    return LRUCache(max_entries=256, max_weight=REPORT_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def get_report_writer():
+    # Un seul thread d'écriture : la sauvegarde sur disque des rapports ne bloque pas le rendu de la page
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-writer")
+
+def report_sections(state):
+    """Les seuls champs utilisés par la mise en page du rapport, section par section ; `state` : session ou dossier enregistré."""
+    medical = checklist_statuses(state.get(checklist_key("medical")), MEDICAL_EXAMS_LIST)
+    return {
+        "Informations sur le Receveur": {"IPP": state.get('receveur_ipp'),"Nom Complet": f"{state.get('receveur_nom', '')} {state.get('receveur_prenom', '')}","Date de Naissance": str(state.get('receveur_date_naissance')),"Sexe": state.get('receveur_sexe'),"Adresse": state.get('receveur_adresse'),"Organisme Payeur": state.get('receveur_organisme')},
+        "Informations sur le Donneur": {"Nom Complet": f"{state.get('donneur_nom', '')} {state.get('donneur_prenom', '')}","Date de Naissance": str(state.get('donneur_date_naissance')),"Sexe": state.get('donneur_sexe')},
+        "Statuts des Accords": {"Accord Tribunal": state.get('accord_tribunal'),"Accord Ministère": state.get('accord_ministere'),"Accord Organisme": state.get('organisme_accord_statut')},
+        "Check-list des Examens Médicaux": {exam: medical.get(exam) for exam in MEDICAL_EXAMS_LIST},
+    }
+
+def report_hash(sections, qr_data=None):
+    payload = json.dumps([REPORT_TEMPLATE_VERSION, sections, qr_data], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _write_report_file(output_filename, pdf_bytes):
+    folder = os.path.dirname(output_filename) or "."
+    os.makedirs(folder, exist_ok=True)
+    # Fichier temporaire propre à chaque écriture : deux écritures du même rapport (deux sessions, ou l'app et batch_reports) ne se mélangent pas
+    with tempfile.NamedTemporaryFile('wb', dir=folder, suffix='.tmp', delete=False) as f:
+        try: f.write(pdf_bytes)
+        except BaseException:
+            f.close(); os.remove(f.name)
+            raise
+    os.replace(f.name, output_filename)
+    logging.info(f"Rapport PDF généré : {output_filename}")
+
+@profiled
+def generate_pdf_report(state, output_filename=None, persist_async=True):
+    """Rapport PDF du dossier, en mémoire (bytes).
+
+    Un dossier dont les champs du rapport n'ont pas changé est servi depuis le cache sans refaire la mise en page.
+    Si `output_filename` est donné, le PDF est aussi écrit sur disque, en tâche de fond par défaut.
+    """
+    sections = report_sections(state); qr_data = dossier_qr_payload(state)
+    cache_key = report_hash(sections, qr_data)
+    report_cache = get_report_cache()
+    pdf_bytes = report_cache.get(cache_key)
+    if pdf_bytes is None:
+        from report_engine import render_report
+        pdf_bytes = render_report(sections, qr_data)
+        report_cache.put(cache_key, pdf_bytes, weight=len(pdf_bytes))
+    if output_filename:
+        if persist_async: get_report_writer().submit(_write_report_file, output_filename, pdf_bytes)
+        else: _write_report_file(output_filename, pdf_bytes)
+    return pdf_bytes
 
 
 # --- UI Specific Helpers (from first script) ---
+@profiled
 def render_footer():
-    logo_base64 = get_base64_image(LOGO_PATH)
-    logo_html = f'<img src="data:image/png;base64,{logo_base64}" alt="Logo" style="height: 45px; margin-bottom: 5px;">' if logo_base64 else ""
+    logo_html = image_html(LOGO_PATH, "Logo", "height: 45px; margin-bottom: 5px;")
     # You might want to change "FM6SS" to your app's name or organization
     st.markdown(f"""<div style="border-top: 1px solid #e0e0e0; margin-top: 40px; padding-top: 15px; text-align: center;">{logo_html}<p style="font-size: 12px; color: #6c757d; margin-top: 5px;">© {datetime.datetime.now().year} - Gestion Allo-Greffe | <b>Votre Organisation</b></p></div>""", unsafe_allow_html=True)
 
 # --- _inject_custom_styles from first script ---
+@profiled
 def _inject_custom_styles():
-    st.markdown("""<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
-    <style>
-        body { background-color: #FFFFFF !important; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }
-        .main { background-color: #FFFFFF !important; padding-top: 1rem !important; padding-left: 2rem; padding-right: 2rem;} /* Add padding */
-        .stApp > header { visibility: hidden; }
-        #MainMenu {visibility: hidden;}
-        footer {visibility: hidden;}
-        .page-header { padding: 1.5rem 1rem; background: linear-gradient(135deg, #115e2a 0%, #1a803d 100%); color: white; border-radius: 10px; margin-bottom: 2rem; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1); }
-        .page-header h1 { margin: 0; font-size: 2.0rem; font-weight: 600; letter-spacing: 0.5px; display: flex; align-items: center; }
-        .page-header h1 i { margin-right: 12px; font-size: 1.8rem; opacity: 0.9; }
-        .page-header p { margin: 5px 0 0 0; opacity: 0.9; font-size: 0.95rem; }
-        
-        /* Styles for connection info - can be removed if not used by this app directly */
-        .connection-info, .connection-info-disconnected { text-align: center; padding: 12px 15px; margin-bottom: 20px; border-radius: 8px; font-size: 0.95rem; font-weight: 500; box-shadow: 0 2px 6px rgba(0, 0, 0, 0.08); display: flex; align-items: center; justify-content: center; border-left: 5px solid transparent; }
-        .connection-info { background-color: #e6f4ea; color: #1e8449; border-left-color: #2ecc71; }
-        .connection-info-disconnected { background-color: #fdedec; color: #c0392b; border-left-color: #e74c3c; }
-        .connection-info i, .connection-info-disconnected i { font-size: 1.3rem; margin-right: 10px; }
-        .connection-info span, .connection-info-disconnected span { font-weight: 600; margin: 0 5px; }
-        .connection-info-disconnected a { color: #c0392b; font-weight: bold; text-decoration: none; }
-        .connection-info-disconnected a:hover { text-decoration: underline; }
-
-        div[data-testid="stDateInput"] label, div[data-testid="stTextInput"] label, div[data-testid="stSelectbox"] label, div[data-testid="stTextArea"] label, div[data-testid="stRadio"] label, div[data-testid="stNumberInput"] label, div[data-testid="stFileUploader"] label { font-weight: 550; font-size: 0.9rem; color: #333;} /* Slightly smaller form labels */
-        div[data-testid="stTabs"] button[role="tab"] { font-weight: 600; font-size: 1.0rem; padding: 0.7rem 1.3rem; border-bottom: 3px solid transparent; color: #495057;}
-        div[data-testid="stTabs"] button[aria-selected="true"] { color: #115e2a; border-bottom-color: #115e2a !important; background-color: #f8f9fa;}
-        div[data-testid="stAlert"] > div { border: none !important; border-radius: 6px; padding: 1rem; border-left: 4px solid; }
-        div[data-testid="stAlert"][kind="success"] { background-color: #e6f4ea; color: #1e8449; border-left-color: #2ecc71; }
-        div[data-testid="stAlert"][kind="info"] { background-color: #eaf2f8; color: #2980b9; border-left-color: #3498db; }
-        div[data-testid="stAlert"][kind="warning"] { background-color: #fef9e7; color: #b9770e; border-left-color: #f39c12; }
-        div[data-testid="stAlert"][kind="error"] { background-color: #fdedec; color: #c0392b; border-left-color: #e74c3c; }
-        
-        /* Metric styling - can be kept if you plan to add st.metric, or removed */
-        div[data-testid="stMetric"] { background-color: #FFFFFF; border: 1px solid #e0e0e0; border-radius: 10px; padding: 1.2rem 1rem; box-shadow: 0 2px 5px rgba(0,0,0,0.05); transition: transform 0.2s ease-in-out, box-shadow 0.2s ease-in-out; text-align: left; height: 100%; display: flex; flex-direction: column; justify-content: space-between; }
-        div[data-testid="stMetric"]:hover { transform: translateY(-4px); box-shadow: 0 4px 10px rgba(0,0,0,0.08); }
-        div[data-testid="stMetric"] > label { font-size: 0.9rem; color: #555; font-weight: 500; margin-bottom: 0.5rem; display: block; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;}
-        div[data-testid="stMetric"] > div[data-testid="stMetricValue"] { font-size: 2rem; font-weight: 700; color: #115e2a; line-height: 1.1; margin-bottom: 0.2rem; }
-        div[data-testid="stMetric"] > div[data-testid="stMetricDelta"] { font-size: 0.9rem; font-weight: 600; }
-        div[data-testid="stMetric"] > div[data-testid="stMetricDelta"] > div[data-testid="metric-delta-indicator"] { color: inherit !important; }
-        div[data-testid="stMetric"] > div[data-testid="stMetricDelta"][data-delta-direction="increase"] { color: #28a745 !important; }
-        div[data-testid="stMetric"] > div[data-testid="stMetricDelta"][data-delta-direction="decrease"] { color: #dc3545 !important; }
-
-        div[data-testid="stButton"] button, div[data-testid="stDownloadButton"] > button, form div[data-testid="stFormSubmitButton"] button { background: linear-gradient(135deg, #115e2a 0%, #1a803d 100%); color: white; border-radius: 6px; transition: transform 0.2s, box-shadow 0.2s, background 0.3s; border: none; padding: 0.6rem 1rem; font-weight: 500; font-size: 0.95rem; box-shadow: 0 2px 5px rgba(0,0,0,0.1); cursor: pointer; }
-        div[data-testid="stButton"] button:hover, div[data-testid="stDownloadButton"] > button:hover, form div[data-testid="stFormSubmitButton"] button:hover { transform: translateY(-2px); box-shadow: 0 4px 8px rgba(0,0,0,0.15); background: linear-gradient(135deg, #0f4a21 0%, #146630 100%); }
-        div[data-testid="stButton"] button:focus, div[data-testid="stDownloadButton"] > button:focus, form div[data-testid="stFormSubmitButton"] button:focus { outline: none; box-shadow: 0 0 0 3px rgba(17, 94, 42, 0.3); }
-        div[data-testid="stButton"] button:disabled, div[data-testid="stDownloadButton"] > button:disabled, form div[data-testid="stFormSubmitButton"] button:disabled { background: #cccccc !important; color: #666666 !important; cursor: not-allowed; box-shadow: none !important; transform: none !important; opacity: 0.7; }
-        .divider { height: 1px; background: #e9ecef; margin: 2rem 0; border: none; }
-        h3, h4, h5, h6 { color: #343a40; font-weight: 600; margin-bottom: 1rem; padding-bottom: 0.3rem; }
-        h3 { font-size: 1.5rem; margin-top: 2.5rem; border-bottom: 1px solid #dee2e6; } /* For st.subheader */
-        h4 { font-size: 1.3rem; margin-top: 2rem; display: flex; align-items: center;}
-        h4 i { margin-right: 10px; color: #115e2a; font-size: 1.1em; }
-        h5 { font-size: 1.1rem; margin-top: 1.5rem; color: #495057; font-weight: 600;}
-        h6 { font-size: 1.0rem; margin-top: 1.0rem; color: #495057; font-weight: 550;}
-        
-        /* Sidebar Styles */
-        div[data-testid="stSidebar"] { background-color: #f8f9fa !important; border-right: 1px solid #dee2e6; padding: 1.5rem 1rem; }
-        div[data-testid="stSidebar"] div[data-testid="stVerticalBlock"] { background-color: inherit !important; }
-        /* These will style streamlit_option_menu items */
-        /* div[data-testid="stSidebar"] .nav-link { font-size: 0.95rem !important; display: flex; align-items: center; padding: 8px 12px !important; margin: 3px 0px !important; border-radius: 6px;} */
-        /* div[data-testid="stSidebar"] .nav-link svg { font-size: 1.1rem !important; margin-right: 10px; width: 18px; text-align: center; } */
-        /* div[data-testid="stSidebar"] .nav-link-selected { background-color: #115e2a !important; color: white !important; font-weight: 500 !important; } */
-        /* div[data-testid="stSidebar"] .nav-link:not(.nav-link-selected):hover { background-color: #e9ecef; color: #333; } */
-        
-        /* DataFrame */
-        div[data-testid="stDataFrame"] { border-radius: 8px; overflow: hidden; box-shadow: 0 2px 5px rgba(0,0,0,0.05); border: 1px solid #dee2e6; }
-        div[data-testid="stDataFrame"] .col_heading { background-color: #f8f9fa; font-weight: 600; padding: 10px 8px; border-bottom: 1px solid #dee2e6; color: #343a40;}
-        div[data-testid="stDataFrame"] .cell { padding: 8px; border-bottom: 1px solid #f1f1f1; }
-        
-        /* About Page specific - can be removed if no "About" page with this structure */
-        .about-header { padding: 1.5rem 1rem; background: #fff; color: #333; border-radius: 10px; margin-bottom: 2rem; border: 1px solid #e0e0e0;}
-        .about-header h1 { color: #115e2a;}
-        .about-content.card { background: white; border-radius: 10px; padding: 2rem; box-shadow: 0 2px 5px rgba(0, 0, 0, 0.05); border: 1px solid #e0e0e0; font-size: 1rem; color: #343a40; line-height: 1.6; }
-
-        /* Custom step navigation from Allo-Greffe app - may need adjustments */
-        .step-navigation {
-            display:flex;
-            justify-content:center;
-            align-items:center;
-            flex-wrap:wrap;
-            gap:10px;
-            margin-bottom: 2rem;
-            padding:1rem;
-            background:#f8fafc; /* Light background to fit overall theme */
-            border-radius:12px; /* Softer radius */
-            border:1px solid #dee2e6; /* Consistent border */
-        }
-        .step-item{
-            display:flex;align-items:center;margin:0 .5rem;padding:.5rem 1rem;border-radius:10px; /* Softer radius */
-            font-weight:600;transition:all .3s ease; color: #495057; /* Default color */
-        }
-        .step-item.active{
-            background:linear-gradient(135deg, #115e2a 0%, #1a803d 100%); /* Theme primary color */
-            color:white;transform:scale(1.05);box-shadow:0 6px 12px rgba(17, 94, 42, 0.25); /* Theme shadow */
-        }
-        .step-item.completed{
-            background:linear-gradient(135deg, #1abc9c 0%, #16a085 100%); /* Theme secondary/success color */
-            color:white;
-        }
-        .step-item.inactive{
-            background:#e9ecef; /* Lighter inactive state */
-            color:#6c757d;
-        }
-        /* Styling for st.container(border=True) */
-        div[data-testid="stVerticalBlock"] > div[data-testid="stVerticalBlock"] > div[data-testid="stExpander"] > div[style*="border: 1px solid"] {
-             border-radius: 8px !important; box-shadow: 0 2px 5px rgba(0,0,0,0.05) !important;
-        }
-        div[data-testid="stVerticalBlock"] > div[data-testid="stVerticalBlock"] > div[data-testid="element-container"] > div[data-testid="stMarkdownContainer"] > div[style*="border: 1px solid"],
-        div[data-testid="stVerticalBlock"] > div[data-testid="stVerticalBlock"] > div[data-testid="stVerticalBlock"] > div[style*="border: 1px solid"] { /* For direct containers */
-            border-radius: 8px !important;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.05) !important;
-            padding: 1rem !important; /* Add some padding */
-            border: 1px solid #dee2e6 !important; /* Consistent border */
-            background-color: #ffffff; /* Ensure white background */
-        }
-
-
-    </style>""", unsafe_allow_html=True)
+    # CSS minifié et HTML prêt à l'emploi, préparés une fois par process (voir assets.py)
+    st.markdown(stylesheet_html(APP_CSS_PATH, external=(FONT_AWESOME_CSS_URL,)), unsafe_allow_html=True)
 
 
+@profiled
 def render_step_navigation():
     steps = [{"name": "Étape 1", "title": "Receveur", "icon": "fas fa-user-injured"}, {"name": "Étape 2", "title": "Donneur", "icon": "fas fa-user-friends"}, {"name": "Étape 3", "title": "Tribunaux", "icon": "fas fa-gavel"}, {"name": "Étape 4", "title": "Médical", "icon": "fas fa-file-medical-alt"}, {"name": "Étape 5", "title": "Ministère", "icon": "fas fa-landmark"}, {"name": "Étape 6", "title": "Organisme", "icon": "fas fa-hands-helping"}, {"name": "Étape 7", "title": "Confirmation", "icon": "fas fa-check-circle"}]
     current_step = st.session_state.current_step
@@ -273,18 +265,35 @@ def render_step_navigation():
         step_html += f'<div class="step-item {status_class}"><i class="{step["icon"]}" style="margin-right:8px;"></i><div><div style="font-size:0.8rem;opacity:0.8;">{step["name"]}</div><div style="font-size:0.9rem;">{step["title"]}</div></div></div>'
     st.markdown(step_html + '</div>', unsafe_allow_html=True)
 
-def render_navigation_buttons():
+def form_field(key):
+    # Clé du widget d'un formulaire d'étape ; la valeur n'est recopiée sous `key` qu'à l'envoi du formulaire
+    return FORM_KEY_PREFIX + key
+
+def go_to_step(delta, fields=()):
+    """Callback de Précédent / Suivant : recopie les champs envoyés par le formulaire de l'étape, puis change d'étape.
+
+    Exécuté avant le rerun déclenché par le clic : la nouvelle étape s'affiche sans second rerun (st.rerun).
+    """
+    for key in fields: st.session_state[key] = st.session_state[form_field(key)]
+    st.session_state.current_step += delta
+
+@profiled
+def render_navigation_buttons(fields=None):
+    # Avec `fields`, appelé dans le st.form de l'étape : les boutons envoient le formulaire, toute l'étape en un seul rerun
+    if fields is not None: st.caption("Les champs de cette étape sont enregistrés avec « Suivant » ou « Précédent ».")
     st.markdown("---") # This will be styled by .divider from the new CSS
+    button = st.button if fields is None else st.form_submit_button
     cols = st.columns([1, 1, 1, 1, 1]) # Consider 3 columns for prev/spacer/next
     # cols = st.columns([1,3,1])
     with cols[0]:
         if st.session_state.current_step > 0:
-            if st.button("← Précédent", use_container_width=True): st.session_state.current_step -= 1; st.rerun()
+            button("← Précédent", on_click=go_to_step, args=(-1, fields or ()), use_container_width=True)
     with cols[4]: # or cols[2] if using 3 columns
         if st.session_state.current_step < 6: # 6 is the last step index (Confirmation)
-            if st.button("Suivant →", type="primary", use_container_width=True): st.session_state.current_step += 1; st.rerun()
+            button("Suivant →", type="primary", on_click=go_to_step, args=(1, fields or ()), use_container_width=True)
 
 # --- Page Renderers (Modified Headers) ---
+@profiled
 def render_receveur_page():
     st.markdown('<div class="page-header"><h1><i class="fas fa-user-injured"></i> Informations sur le Receveur</h1><p>Détails personnels et administratifs du patient receveur.</p></div>', unsafe_allow_html=True)
     if st.session_state.edit_mode:
@@ -292,81 +301,82 @@ def render_receveur_page():
 
        
 
-    with st.container(border=True):
-        st.subheader("Informations sur le Receveur :") # st.subheader will be styled by h3
-        col1, col2 = st.columns(2)
-        with col1:
-            st.session_state.receveur_ipp = st.text_input("IPP", st.session_state.receveur_ipp, placeholder="Entrez l'IPP")
-            st.session_state.receveur_nom = st.text_input("Nom", st.session_state.receveur_nom, placeholder="Entrez le nom")
-            st.session_state.receveur_prenom = st.text_input("Prénom", st.session_state.receveur_prenom, placeholder="Entrez le prénom")
-            st.session_state.receveur_date_naissance = st.date_input("Date de Naissance", st.session_state.receveur_date_naissance)
-        with col2:
-            st.session_state.receveur_sexe = st.radio("Sexe", ["Homme", "Femme"], index=["Homme", "Femme"].index(st.session_state.receveur_sexe), horizontal=True)
-            st.session_state.receveur_groupage = st.selectbox("Groupage Sanguin", ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"], index=["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"].index(st.session_state.receveur_groupage))
-            st.session_state.receveur_contact_principal = st.text_input("Contact Principal", st.session_state.receveur_contact_principal)
-            st.session_state.receveur_organisme = st.selectbox("Organisme Payeur", ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"], index=["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"].index(st.session_state.receveur_organisme))
-        st.session_state.receveur_adresse = st.text_area("Adresse", st.session_state.receveur_adresse, height=100)
-    with st.container(border=True):
-        st.subheader("Informations Parents du Receveur")
-        col_p1, col_p2 = st.columns(2);
-        with col_p1: st.session_state.receveur_nom_pere = st.text_input("Nom du Père du Receveur", st.session_state.receveur_nom_pere); st.session_state.receveur_nom_mere = st.text_input("Nom de la Mère du Receveur", st.session_state.receveur_nom_mere)
-        with col_p2: st.session_state.receveur_age_pere = st.number_input("Âge du Père du Receveur", 0, 120, st.session_state.receveur_age_pere); st.session_state.receveur_age_mere = st.number_input("Âge de la Mère du Receveur", 0, 120, st.session_state.receveur_age_mere)
-
+    with st.form("receveur_form", border=False, enter_to_submit=False):
+        with st.container(border=True):
+            st.subheader("Informations sur le Receveur :") # st.subheader will be styled by h3
+            col1, col2 = st.columns(2)
+            with col1:
+                st.text_input("IPP", st.session_state.receveur_ipp, key=form_field("receveur_ipp"), placeholder="Entrez l'IPP")
+                st.text_input("Nom", st.session_state.receveur_nom, key=form_field("receveur_nom"), placeholder="Entrez le nom")
+                st.text_input("Prénom", st.session_state.receveur_prenom, key=form_field("receveur_prenom"), placeholder="Entrez le prénom")
+                st.date_input("Date de Naissance", st.session_state.receveur_date_naissance, key=form_field("receveur_date_naissance"))
+            with col2:
+                st.radio("Sexe", ["Homme", "Femme"], index=["Homme", "Femme"].index(st.session_state.receveur_sexe), key=form_field("receveur_sexe"), horizontal=True)
+                st.selectbox("Groupage Sanguin", ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"], index=["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"].index(st.session_state.receveur_groupage), key=form_field("receveur_groupage"))
+                st.text_input("Contact Principal", st.session_state.receveur_contact_principal, key=form_field("receveur_contact_principal"))
+                st.selectbox("Organisme Payeur", ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"], index=["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"].index(st.session_state.receveur_organisme), key=form_field("receveur_organisme"))
+            st.text_area("Adresse", st.session_state.receveur_adresse, height=100, key=form_field("receveur_adresse"))
+        with st.container(border=True):
+            st.subheader("Informations Parents du Receveur")
+            col_p1, col_p2 = st.columns(2);
+            with col_p1: st.text_input("Nom du Père du Receveur", st.session_state.receveur_nom_pere, key=form_field("receveur_nom_pere")); st.text_input("Nom de la Mère du Receveur", st.session_state.receveur_nom_mere, key=form_field("receveur_nom_mere"))
+            with col_p2: st.number_input("Âge du Père du Receveur", 0, 120, st.session_state.receveur_age_pere, key=form_field("receveur_age_pere")); st.number_input("Âge de la Mère du Receveur", 0, 120, st.session_state.receveur_age_mere, key=form_field("receveur_age_mere"))
+        render_navigation_buttons(RECEVEUR_FORM_FIELDS)
+
+@profiled
 def render_donneur_page():
     st.markdown('<div class="page-header"><h1><i class="fas fa-user-friends"></i> Informations sur le Donneur</h1><p>Détails personnels du donneur potentiel.</p></div>', unsafe_allow_html=True)
-    with st.container(border=True):
-        st.subheader("Informations sur le Donneur : ")
-        col1, col2 = st.columns(2)
-        with col1: st.session_state.donneur_nom = st.text_input("Nom du Donneur", st.session_state.donneur_nom); st.session_state.donneur_prenom = st.text_input("Prénom du Donneur", st.session_state.donneur_prenom)
-        with col2: st.session_state.donneur_date_naissance = st.date_input("Date de Naissance du Donneur", st.session_state.donneur_date_naissance); st.session_state.donneur_sexe = st.radio("Sexe du Donneur", ["Homme", "Femme"], index=["Homme", "Femme"].index(st.session_state.donneur_sexe), horizontal=True)
-        st.session_state.donneur_groupage = st.selectbox("Groupage Sanguin Donneur", ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"], index=["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"].index(st.session_state.donneur_groupage))
-        st.session_state.donneur_contact_principal = st.text_input("Contact Principal", st.session_state.donneur_contact_principal)
-        st.session_state.donneur_organisme = st.selectbox("Organisme Payeur", ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"], index=["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"].index(st.session_state.donneur_organisme))
-        st.session_state.donneur_adresse = st.text_area("Adresse Donneur", st.session_state.donneur_adresse, height=100)
-    with st.container(border=True):
-        st.subheader("Informations Parents du Donneur")
-        col_p1, col_p2 = st.columns(2)
-        with col_p1: st.session_state.donneur_nom_pere = st.text_input("Nom du Père du donneur", st.session_state.donneur_nom_pere); st.session_state.donneur_nom_mere = st.text_input("Nom de la Mère du donneur", st.session_state.donneur_nom_mere)
-        with col_p2: st.session_state.donneur_age_pere = st.number_input("Âge du Père du donneur", 0, 120, st.session_state.donneur_age_pere); st.session_state.donneur_age_mere = st.number_input("Âge de la Mère du donneur", 0, 120, st.session_state.donneur_age_mere)
-
-import streamlit as st
-import pandas as pd
-import os
-
-# --- Éléments de Simulation (à remplacer par vos vraies données) ---
-# Simule la liste de documents que vous aviez probablement
-ADMIN_DOCS_LIST = [
-    "Copie de la CIN",
-    "Passeport",
-    "Justificatif de domicile",
-    "Formulaire de demande",
-    "Extrait de casier judiciaire"
-]
-
-# Simule votre fonction pour sauvegarder un fichier
-def save_uploaded_file(uploaded_file, sub_directory):
-    # Crée un répertoire de sauvegarde s'il n'existe pas
-    save_path = os.path.join("uploads", sub_directory)
-    os.makedirs(save_path, exist_ok=True)
-    
-    # Crée un chemin de fichier unique
-    file_path = os.path.join(save_path, uploaded_file.name)
-    
-    # Écrit le fichier sur le disque
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    
-    # Retourne le chemin où le fichier a été sauvegardé
-    return file_path
-
-# Simule l'initialisation de st.session_state pour le test
-if 'receveur_ipp' not in st.session_state:
-    st.session_state.receveur_ipp = "USER_12345" # Mettez une valeur pour tester
-if 'accord_tribunal' not in st.session_state:
-    st.session_state.accord_tribunal = "En cours"
-# --- Fin des Éléments de Simulation ---
-
+    with st.form("donneur_form", border=False, enter_to_submit=False):
+        with st.container(border=True):
+            st.subheader("Informations sur le Donneur : ")
+            col1, col2 = st.columns(2)
+            with col1: st.text_input("Nom du Donneur", st.session_state.donneur_nom, key=form_field("donneur_nom")); st.text_input("Prénom du Donneur", st.session_state.donneur_prenom, key=form_field("donneur_prenom"))
+            with col2: st.date_input("Date de Naissance du Donneur", st.session_state.donneur_date_naissance, key=form_field("donneur_date_naissance")); st.radio("Sexe du Donneur", ["Homme", "Femme"], index=["Homme", "Femme"].index(st.session_state.donneur_sexe), key=form_field("donneur_sexe"), horizontal=True)
+            st.selectbox("Groupage Sanguin Donneur", ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"], index=["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"].index(st.session_state.donneur_groupage), key=form_field("donneur_groupage"))
+            st.text_input("Contact Principal", st.session_state.donneur_contact_principal, key=form_field("donneur_contact_principal"))
+            st.selectbox("Organisme Payeur", ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"], index=["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"].index(st.session_state.donneur_organisme), key=form_field("donneur_organisme"))
+            st.text_area("Adresse Donneur", st.session_state.donneur_adresse, height=100, key=form_field("donneur_adresse"))
+        with st.container(border=True):
+            st.subheader("Informations Parents du Donneur")
+            col_p1, col_p2 = st.columns(2)
+            with col_p1: st.text_input("Nom du Père du donneur", st.session_state.donneur_nom_pere, key=form_field("donneur_nom_pere")); st.text_input("Nom de la Mère du donneur", st.session_state.donneur_nom_mere, key=form_field("donneur_nom_mere"))
+            with col_p2: st.number_input("Âge du Père du donneur", 0, 120, st.session_state.donneur_age_pere, key=form_field("donneur_age_pere")); st.number_input("Âge de la Mère du donneur", 0, 120, st.session_state.donneur_age_mere, key=form_field("donneur_age_mere"))
+        render_navigation_buttons(DONNEUR_FORM_FIELDS)
+
+def apply_checklist_edits(name, items, yes_label, editor_key):
+    # Callback du tableau, avant le rerun : seules les cellules du delta de st.data_editor (edited_rows) sont appliquées.
+    # Le delta est cumulatif depuis l'affichage du tableau ; le réappliquer en entier donne le même résultat.
+    statuses = checklist_statuses(st.session_state[checklist_key(name)], items)
+    for row, cells in st.session_state[editor_key]["edited_rows"].items():
+        if CHECKLIST_STATUS_COLUMN not in cells: continue
+        item, value = items[int(row)], cells[CHECKLIST_STATUS_COLUMN]
+        if value is None: statuses.pop(item, None)
+        else: statuses[item] = value == yes_label
+    st.session_state[checklist_key(name)] = checklist_bits(statuses, items)
+
+@profiled
+def render_checklist(name, items, item_label, labels, editor_key):
+    """Check-list à un statut par élément, enregistrée dans le dossier : `labels` = (libellé de True, libellé de False), cellule vide = non renseigné.
+
+    Retourne {élément: True / False} des éléments renseignés (la session n'en garde que la forme compacte, un entier).
+    """
+    statuses = checklist_statuses(st.session_state[checklist_key(name)], items)
+    yes_label, no_label = labels
+    st.data_editor(
+        {item_label: list(items), CHECKLIST_STATUS_COLUMN: [None if item not in statuses else yes_label if statuses[item] else no_label for item in items]},
+        column_config={
+            item_label: st.column_config.TextColumn(item_label, disabled=True),
+            CHECKLIST_STATUS_COLUMN: st.column_config.SelectboxColumn(CHECKLIST_STATUS_COLUMN, options=list(labels), required=False, help="Cellule vide : non renseigné"),
+        },
+        hide_index=True,
+        use_container_width=True,
+        key=editor_key,
+        on_change=apply_checklist_edits, args=(name, items, yes_label, editor_key),
+    )
+    return statuses
 
+@st.fragment # coches, téléversements et statut ne relancent que la page de l'étape
+@profiled_fragment
 def render_tribunaux_page():
     """
     Affiche la page de gestion des documents administratifs pour les tribunaux
@@ -382,60 +392,18 @@ def render_tribunaux_page():
     # --- Section 1: Tableau de Suivi des Documents ---
     with st.container(border=True):
         st.subheader("Suivi des Documents Requis")
-        st.write("Cochez le statut de chaque document ci-dessous.")
-
-        # Initialisation du DataFrame dans st.session_state s'il n'existe pas
-        if 'doc_status_df' not in st.session_state:
-            df_data = {
-                "Document": ADMIN_DOCS_LIST,
-                "Présent": [False] * len(ADMIN_DOCS_LIST),
-                "Absent": [True] * len(ADMIN_DOCS_LIST)
-            }
-            st.session_state.doc_status_df = pd.DataFrame(df_data)
-
-        # Affiche le tableau éditable avec st.data_editor
-        edited_df = st.data_editor(
-            st.session_state.doc_status_df,
-            column_config={
-                "Document": st.column_config.TextColumn("Nom du Document", disabled=True),
-                "Présent": st.column_config.CheckboxColumn("Document Présent ?", required=True),
-                "Absent": st.column_config.CheckboxColumn("Document Absent ?", required=True),
-            },
-            hide_index=True,
-            key="doc_status_editor"
-        )
-
-        # Logique pour s'assurer qu'une seule case est cochée par ligne
-        # On compare le DataFrame édité avec celui en mémoire
-        if not edited_df.equals(st.session_state.doc_status_df):
-            # Parcourir les lignes pour trouver les changements
-            for i in edited_df.index:
-                old_row = st.session_state.doc_status_df.loc[i]
-                new_row = edited_df.loc[i]
-                
-                # Cas 1: L'utilisateur a coché "Présent"
-                if new_row['Présent'] and not old_row['Présent']:
-                    edited_df.at[i, 'Absent'] = False # Décocher automatiquement "Absent"
-                # Cas 2: L'utilisateur a coché "Absent"
-                elif new_row['Absent'] and not old_row['Absent']:
-                    edited_df.at[i, 'Présent'] = False # Décocher automatiquement "Présent"
-                # Cas 3: Si les deux sont décochés (par ex. par erreur), on remet "Absent" par défaut
-                elif not new_row['Présent'] and not new_row['Absent']:
-                     edited_df.at[i, 'Absent'] = True
-
-            # Mettre à jour le session_state et relancer l'affichage
-            st.session_state.doc_status_df = edited_df
-            st.rerun()
+        st.write("Indiquez le statut de chaque document ci-dessous.")
+        statuses = render_checklist("admin", ADMIN_DOCS_LIST, "Nom du Document", ("Présent", "Absent"), "doc_status_editor")
 
     # --- Section 2: Téléversement des Fichiers ---
     with st.container(border=True):
         st.subheader("Téléverser les Documents")
 
         # Récupérer la liste des documents marqués comme "Présents"
-        docs_a_fournir = edited_df[edited_df["Présent"]]["Document"].tolist()
+        docs_a_fournir = [doc for doc in ADMIN_DOCS_LIST if statuses.get(doc)]
 
         if not docs_a_fournir:
-            st.info("Aucun document n'est marqué comme 'Présent'. Cochez la case correspondante dans le tableau pour pouvoir téléverser.")
+            st.info("Aucun document n'est marqué comme 'Présent'. Choisissez ce statut dans le tableau pour pouvoir téléverser.")
         else:
             st.write("Veuillez joindre les fichiers pour les documents suivants :")
             # Affiche une liste à puces des documents attendus
@@ -455,9 +423,10 @@ def render_tribunaux_page():
                 st.success(f"{len(uploaded_files)} fichier(s) prêt(s) à être traité(s).")
                 # Ici, vous pouvez ajouter la logique pour sauvegarder les fichiers
                 for file in uploaded_files:
-                    # On utilise la fonction de sauvegarde simulée
-                    saved_path = save_uploaded_file(file, "tribunal")
-                    st.write(f"✅ Fichier '{file.name}' sauvegardé avec succès dans `{saved_path}`")
+                    # Idempotent : un fichier déjà ingéré n'est ni relu ni réécrit au rerun suivant
+                    reference = save_uploaded_file(file, "tribunal")
+                    if reference: st.write(f"✅ Fichier '{file.name}' sauvegardé avec succès (`{reference['sha256'][:12]}`)")
+                render_uploaded_documents("tribunal")
                 
                 # Optionnel : Ajouter un bouton pour finaliser ou confirmer
                 if st.button("Confirmer et terminer le téléversement"):
@@ -473,28 +442,8 @@ def render_tribunaux_page():
             ["En cours", "Accordé", "Refusé"],
             index=["En cours", "Accordé", "Refusé"].index(current_status)
         )
-import streamlit as st
-import pandas as pd
-
-# --- Éléments de Simulation (à remplacer par vos vraies données) ---
-
-# La liste des examens que vous avez fournie
-MEDICAL_EXAMS_LIST = [
-    "Echographie abdominale + images",
-    "Echographie cardiaque + images",
-    "Rx Thorax",
-    "Antigène HLA I et II",
-    "Bilan biologique + sérologies",
-    "Observation médicale",
-    "Myélogramme",
-    "Caryotype hématologique",
-    "Immunophénotypage",
-    "FISH",
-    "Biologie moléculaire"
-]
-
-# --- Fin des Éléments de Simulation ---
-
+@st.fragment # coches, téléversements et statut ne relancent que la page de l'étape
+@profiled_fragment
 def render_medical_page():
     """
     Affiche la page du dossier médical avec une check-list sous forme de tableau interactif.
@@ -503,99 +452,21 @@ def render_medical_page():
     
     with st.container(border=True):
         st.subheader("Statut des Examens Médicaux")
-        st.write("Cochez le statut de chaque examen dans le tableau ci-dessous.")
-
-        # Initialisation du DataFrame dans st.session_state s'il n'existe pas
-        # C'est ici que nous créons la structure du tableau pour la première fois.
-        if 'medical_exams_df' not in st.session_state:
-            df_data = {
-                "Examen": MEDICAL_EXAMS_LIST,
-                "Fait": [False] * len(MEDICAL_EXAMS_LIST),
-                "Non Fait": [True] * len(MEDICAL_EXAMS_LIST) # Par défaut, rien n'est fait
-            }
-            st.session_state.medical_exams_df = pd.DataFrame(df_data)
-
-        # Affichage du tableau éditable avec st.data_editor
-        # L'utilisateur interagit directement avec ce tableau.
-        edited_df = st.data_editor(
-            st.session_state.medical_exams_df,
-            column_config={
-                "Examen": st.column_config.TextColumn("Nom de l'Examen", disabled=True, help="Liste des examens requis"),
-                "Fait": st.column_config.CheckboxColumn("Examen Fait ?", required=True),
-                "Non Fait": st.column_config.CheckboxColumn("Examen Non Fait ?", required=True),
-            },
-            hide_index=True,
-            use_container_width=True, # Pour que le tableau prenne toute la largeur
-            key="medical_exams_editor"
-        )
-
-        # Logique pour s'assurer qu'une seule case est cochée par ligne (Fait / Non Fait)
-        # On ne lance cette logique que si l'utilisateur a réellement fait une modification.
-        if not edited_df.equals(st.session_state.medical_exams_df):
-            # On parcourt chaque ligne pour voir où le changement a eu lieu
-            for i in edited_df.index:
-                old_row = st.session_state.medical_exams_df.loc[i]
-                new_row = edited_df.loc[i]
-                
-                # Cas 1: L'utilisateur a coché "Fait"
-                if new_row['Fait'] and not old_row['Fait']:
-                    edited_df.at[i, 'Non Fait'] = False # On décoche automatiquement "Non Fait"
-                
-                # Cas 2: L'utilisateur a coché "Non Fait"
-                elif new_row['Non Fait'] and not old_row['Non Fait']:
-                    edited_df.at[i, 'Fait'] = False # On décoche automatiquement "Fait"
-                
-                # Cas 3 (sécurité): Si les deux sont décochés, on remet "Non Fait" par défaut
-                elif not new_row['Fait'] and not new_row['Non Fait']:
-                     edited_df.at[i, 'Non Fait'] = True
+        st.write("Indiquez le statut de chaque examen dans le tableau ci-dessous.")
+        statuses = render_checklist("medical", MEDICAL_EXAMS_LIST, "Nom de l'Examen", ("Fait", "Non fait"), "medical_exams_editor")
 
-            # On met à jour le statut dans la session et on rafraîchit l'écran
-            st.session_state.medical_exams_df = edited_df
-            st.rerun()
-            
         # (Optionnel) Afficher un résumé ou une progression
         st.write("---")
-        nb_faits = edited_df['Fait'].sum()
-        total_examens = len(edited_df)
+        nb_faits = sum(1 for exam in MEDICAL_EXAMS_LIST if statuses.get(exam))
+        total_examens = len(MEDICAL_EXAMS_LIST)
         st.metric(
             label="Progression des Examens",
             value=f"{nb_faits} / {total_examens}",
             delta=f"{round((nb_faits/total_examens)*100)} %" if total_examens > 0 else "0 %"
         )
-import streamlit as st
-import pandas as pd
-import os
-
-# --- Éléments de Simulation (à remplacer par vos vraies données) ---
-MINISTERE_DOCS_LIST = [
-    "Rapport médical d'hospitalisation",
-    "Certificat médical",
-    "Acte de mariage",
-    "CIN légalisé père",
-    "CIN légalisé mère",
-    "Engagement des parents en arabe - donneur",
-    "Engagement des parents en arabe - receveur",
-    "Extrait d'acte de naissance - donneur",
-    "Extrait d'acte de naissance - receveur"
-]
-
-# Simule votre fonction pour sauvegarder un fichier (à réutiliser)
-def save_uploaded_file(uploaded_file, sub_directory):
-    save_path = os.path.join("uploads", sub_directory)
-    os.makedirs(save_path, exist_ok=True)
-    file_path = os.path.join(save_path, uploaded_file.name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return file_path
-
-# Simule l'initialisation de st.session_state pour le test
-if 'receveur_ipp' not in st.session_state:
-    st.session_state.receveur_ipp = "USER_12345"
-if 'accord_ministere' not in st.session_state:
-    st.session_state.accord_ministere = "En cours"
-# --- Fin des Éléments de Simulation ---
-
 
+@st.fragment # coches, téléversements et statut ne relancent que la page de l'étape
+@profiled_fragment
 def render_ministere_page():
     """
     Affiche la page du dossier Ministère avec un tableau de suivi, un champ
@@ -623,54 +494,17 @@ def render_ministere_page():
             st.error("Veuillez renseigner l'IPP du receveur à l'étape 1 pour continuer.")
             return
 
-        st.write("Cochez le statut de chaque document ci-dessous.")
-
-        # Initialisation du DataFrame dans st.session_state
-        if 'ministere_docs_df' not in st.session_state:
-            df_data = {
-                "Document": MINISTERE_DOCS_LIST,
-                "Présent": [False] * len(MINISTERE_DOCS_LIST),
-                "Absent": [True] * len(MINISTERE_DOCS_LIST)
-            }
-            st.session_state.ministere_docs_df = pd.DataFrame(df_data)
-
-        # Affichage du tableau éditable
-        edited_df = st.data_editor(
-            st.session_state.ministere_docs_df,
-            column_config={
-                "Document": st.column_config.TextColumn("Nom du Document", disabled=True),
-                "Présent": st.column_config.CheckboxColumn("Document Présent ?", required=True),
-                "Absent": st.column_config.CheckboxColumn("Document Absent ?", required=True),
-            },
-            hide_index=True,
-            use_container_width=True,
-            key="ministere_docs_editor"
-        )
-
-        # Logique pour s'assurer qu'une seule case est cochée par ligne
-        if not edited_df.equals(st.session_state.ministere_docs_df):
-            for i in edited_df.index:
-                old_row = st.session_state.ministere_docs_df.loc[i]
-                new_row = edited_df.loc[i]
-                
-                if new_row['Présent'] and not old_row['Présent']:
-                    edited_df.at[i, 'Absent'] = False
-                elif new_row['Absent'] and not old_row['Absent']:
-                    edited_df.at[i, 'Présent'] = False
-                elif not new_row['Présent'] and not new_row['Absent']:
-                     edited_df.at[i, 'Absent'] = True
-
-            st.session_state.ministere_docs_df = edited_df
-            st.rerun()
+        st.write("Indiquez le statut de chaque document ci-dessous.")
+        statuses = render_checklist("ministere", MINISTERE_DOCS_LIST, "Nom du Document", ("Présent", "Absent"), "ministere_docs_editor")
 
     # --- Section 3: Téléversement des Fichiers ---
     with st.container(border=True):
         st.subheader("Téléverser les Documents")
 
-        docs_a_fournir = edited_df[edited_df["Présent"]]["Document"].tolist()
+        docs_a_fournir = [doc for doc in MINISTERE_DOCS_LIST if statuses.get(doc)]
 
         if not docs_a_fournir:
-            st.info("Aucun document n'est marqué comme 'Présent'. Cochez la case correspondante dans le tableau pour activer le téléversement.")
+            st.info("Aucun document n'est marqué comme 'Présent'. Choisissez ce statut dans le tableau pour activer le téléversement.")
         else:
             st.write("Veuillez joindre les fichiers pour les documents suivants :")
             st.markdown("\n".join([f"- **{doc_name}**" for doc_name in docs_a_fournir]))
@@ -686,18 +520,23 @@ def render_ministere_page():
                 st.write("---")
                 st.success(f"{len(uploaded_files)} fichier(s) ont été chargés.")
                 for file in uploaded_files:
-                    saved_path = save_uploaded_file(file, "ministere")
-                    st.write(f"✅ Document '{file.name}' sauvegardé dans `{saved_path}`")
+                    reference = save_uploaded_file(file, "ministere")
+                    if reference: st.write(f"✅ Document '{file.name}' sauvegardé (`{reference['sha256'][:12]}`)")
+                render_uploaded_documents("ministere")
 
+@profiled
 def render_organisme_page():
     st.markdown('<div class="page-header"><h1><i class="fas fa-hands-helping"></i> Accord Organisme </h1><p>Suivi de l\'accord de l\'organisme payeur.</p></div>', unsafe_allow_html=True)
-    with st.container(border=True):
-        st.subheader("Accord de l'Organisme")
-        st.session_state.organisme_accord = st.selectbox("Organisme", ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"], index=["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"].index(st.session_state.receveur_organisme))
-        st.session_state.organisme_accord_statut = st.selectbox("Statut de l'accord", ["En cours", "Accordé", "Refusé"], index=["En cours", "Accordé", "Refusé"].index(st.session_state.organisme_accord_statut))
-        st.session_state.organisme_accord_date_validation = st.date_input("Date de validation de l'accord", st.session_state.organisme_accord_date_validation)
+    with st.form("organisme_form", border=False, enter_to_submit=False):
+        with st.container(border=True):
+            st.subheader("Accord de l'Organisme")
+            st.selectbox("Organisme", ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"], index=["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"].index(st.session_state.receveur_organisme), key=form_field("organisme_accord"))
+            st.selectbox("Statut de l'accord", ["En cours", "Accordé", "Refusé"], index=["En cours", "Accordé", "Refusé"].index(st.session_state.organisme_accord_statut), key=form_field("organisme_accord_statut"))
+            st.date_input("Date de validation de l'accord", st.session_state.organisme_accord_date_validation, key=form_field("organisme_accord_date_validation"))
+        render_navigation_buttons(ORGANISME_FORM_FIELDS)
       
 
+@profiled
 def render_confirmation_page():
     st.markdown('<div class="page-header"><h1><i class="fas fa-check-circle"></i> Confirmation et Soumission</h1><p>Vérifiez les informations avant de finaliser le dossier.</p></div>', unsafe_allow_html=True)
     if st.session_state.edit_mode:
@@ -722,9 +561,7 @@ def render_confirmation_page():
             st.write(f"**Date de Naissance:** {st.session_state.get('donneur_date_naissance', datetime.date.today()).strftime('%d/%m/%Y')}")
         
         # QR Code for easy access/sharing - Example
-        qr_data = f"IPP: {st.session_state.get('receveur_ipp', 'N/A')}\nPatient: {st.session_state.get('receveur_nom', '')} {st.session_state.get('receveur_prenom', '')}"
-        qr_img_buffer = generate_qr_code(qr_data)
-        st.image(qr_img_buffer, caption="QR Code du Dossier (Simplifié)", width=150)
+        st.image(generate_qr_code(dossier_qr_payload(st.session_state), fmt="svg"), caption="QR Code du Dossier (Simplifié)", width=150)
 
 
     st.markdown("<hr class='divider'>", unsafe_allow_html=True) # Styled divider
@@ -732,95 +569,218 @@ def render_confirmation_page():
     if st.button(button_label, type="primary", use_container_width=True):
         if not st.session_state.receveur_ipp: st.error("L'IPP du receveur est obligatoire pour sauvegarder le dossier."); return
         patient_folder = os.path.join(BASE_UPLOAD_FOLDER, st.session_state.receveur_ipp); os.makedirs(patient_folder, exist_ok=True)
-        data_to_save = {}
-        # Filter session state items for saving
-        for k, v in st.session_state.items():
-            if k in ['app_initialized', 'current_step', 'active_page', 'edit_mode', 'search_query', 'search_by', 'search_results'] or k.startswith('uploader_') or k.startswith('FormSubmitter'):
-                continue # Skip internal UI state variables and uploaders
-            if isinstance(v, (datetime.date, datetime.datetime)): data_to_save[k] = v.isoformat()
-            elif isinstance(v, (str, int, float, bool, list, dict)) or v is None: data_to_save[k] = v
-            # else: logging.warning(f"Skipping non-serializable type for key {k}: {type(v)}")
-
-        with open(os.path.join(patient_folder, "data.json"), 'w', encoding='utf-8') as f: json.dump(data_to_save, f, indent=4, ensure_ascii=False)
+        schema = get_dossier_schema()
+        data_to_save = schema.to_record(schema.from_state(st.session_state)) # seuls les champs du dossier, l'état de l'interface n'est pas enregistré
+
+        save_dossier(patient_folder, data_to_save) # écriture atomique + différence ajoutée à history.jsonl
+        get_dossier_cache().invalidate(st.session_state.receveur_ipp)
+        get_dossier_index().upsert(st.session_state.receveur_ipp, data_to_save)
         
         pdf_filename = os.path.join(GENERATED_PDF_FOLDER, f"Rapport_{st.session_state.receveur_ipp}.pdf")
         try:
-            generate_pdf_report(st.session_state, pdf_filename) # Pass current session state
+            pdf_bytes = generate_pdf_report(st.session_state, pdf_filename) # Pass current session state ; l'écriture disque se fait en tâche de fond
             st.success(f"Dossier pour le patient IPP `{st.session_state.receveur_ipp}` a été sauvegardé avec succès!"); st.balloons()
-            with open(pdf_filename, "rb") as pdf_file:
-                st.download_button(label="Télécharger le Rapport PDF", data=pdf_file, file_name=os.path.basename(pdf_filename), mime="application/octet-stream", use_container_width=True)
+            st.download_button(label="Télécharger le Rapport PDF", data=pdf_bytes, file_name=os.path.basename(pdf_filename), mime="application/octet-stream", use_container_width=True)
         except Exception as e:
             st.error(f"Erreur lors de la génération du PDF: {e}")
             logging.error(f"PDF generation error: {e}", exc_info=True)
 
+    if st.session_state.receveur_ipp and find_dossier_file(os.path.join(BASE_UPLOAD_FOLDER, st.session_state.receveur_ipp))[0]:
+        render_bundle_section(st.session_state.receveur_ipp)
+
+@profiled
+def render_bundle_section(ipp):
+    """Rapport + toutes les pièces jointes en un seul PDF (ou ZIP), écrit pièce par pièce sur disque."""
+    from dossier_bundle import BUNDLE_FORMATS, build_bundle
+    with st.container(border=True):
+        st.subheader("Dossier complet (rapport + pièces jointes)")
+        fmt = st.radio("Format", BUNDLE_FORMATS, format_func=str.upper, horizontal=True, key="bundle_format")
+        if st.button("Préparer le dossier complet", use_container_width=True):
+            try:
+                st.session_state.bundle_result = dict(build_bundle(get_upload_store(), ipp, generate_pdf_report(st.session_state), GENERATED_PDF_FOLDER, fmt), ipp=ipp)
+            except Exception as e:
+                st.error(f"Erreur lors de la préparation du dossier complet : {e}"); logging.error(f"Bundle error: {e}", exc_info=True)
+        result = st.session_state.get('bundle_result')
+        if not result or result['ipp'] != ipp or not os.path.exists(result['path']): return
+        pages = f", {result['pages']} page(s)" if result['pages'] else ""
+        st.caption(f"{result['attachments']} pièce(s) jointe(s){pages} — {result['size'] / 1024 / 1024:.1f} Mo.")
+        if result['skipped']: st.warning("Pièces non intégrées : " + ", ".join(result['skipped']))
+        if result['size'] <= BUNDLE_DOWNLOAD_MAX_BYTES:
+            with open(result['path'], 'rb') as f:
+                st.download_button("Télécharger le dossier complet", data=f, file_name=os.path.basename(result['path']), mime="application/zip" if result['format'] == "zip" else "application/pdf", use_container_width=True)
+        else:
+            st.info(f"Dossier trop volumineux pour le téléchargement direct ; il est disponible dans `{result['path']}`.")
+
 
+@profiled
 def render_dashboard_page():
+    from registry_export import EXPORT_FORMATS, columnar
     st.markdown('<div class="page-header"><h1><i class="fas fa-tachometer-alt"></i> Tableau de Bord des Dossiers</h1><p>Vue d\'ensemble des dossiers patients enregistrés.</p></div>', unsafe_allow_html=True)
-    dossiers = []
-    if os.path.exists(BASE_UPLOAD_FOLDER):
-        for ipp_folder_name in sorted(os.listdir(BASE_UPLOAD_FOLDER)):
-            # Ensure it's a directory
-            if not os.path.isdir(os.path.join(BASE_UPLOAD_FOLDER, ipp_folder_name)):
-                continue
-            json_path = os.path.join(BASE_UPLOAD_FOLDER, ipp_folder_name, "data.json")
-            if os.path.isfile(json_path):
+    index = get_dossier_index()
+    col_refresh, col_rebuild = st.columns(2)
+    if col_refresh.button("Actualiser l'index", help="Relit uniquement les dossiers modifiés depuis la dernière actualisation.", use_container_width=True):
+        index.refresh()
+    if col_rebuild.button("Reconstruire l'index des dossiers", help="Relit tous les fichiers de dossier (dossier.msgpack, data.json, patient_data.json).", use_container_width=True):
+        nb_dossiers = index.rebuild()
+        st.success(f"Index reconstruit : {nb_dossiers} dossier(s).")
+    refresh_stats = index.last_refresh_stats
+    st.caption(f"Dernière actualisation : {refresh_stats['files_scanned']} fichier(s) examiné(s), {refresh_stats['files_reparsed']} relu(s), {refresh_stats['files_removed']} retiré(s) en {refresh_stats['duration_s'] * 1000:.0f} ms.")
+    render_bulk_import_section()
+
+    def reset_dashboard_page(): st.session_state.dashboard_page = 1
+    def shift_dashboard_page(delta): st.session_state.dashboard_page += delta
+    with st.expander("🔎 Filtres et tri", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        filters = {
+            "accord_tribunal": col1.multiselect("Accord Tribunal", ACCORD_STATUTS, key="dashboard_filter_tribunal", on_change=reset_dashboard_page),
+            "accord_ministere": col2.multiselect("Accord Ministère", ACCORD_STATUTS, key="dashboard_filter_ministere", on_change=reset_dashboard_page),
+            "organisme_accord_statut": col3.multiselect("Accord Organisme", ACCORD_STATUTS, key="dashboard_filter_organisme_statut", on_change=reset_dashboard_page),
+            "receveur_organisme": col4.multiselect("Organisme Payeur", ORGANISMES_LIST, key="dashboard_filter_organisme", on_change=reset_dashboard_page),
+        }
+        col1, col2, col3, col4 = st.columns(4)
+        filters["updated_from"] = col1.date_input("Modifié depuis le", value=None, key="dashboard_filter_updated_from", on_change=reset_dashboard_page)
+        filters["updated_to"] = col2.date_input("Modifié jusqu'au", value=None, key="dashboard_filter_updated_to", on_change=reset_dashboard_page)
+        filters["validation_from"] = col3.date_input("Accord organisme validé depuis le", value=None, key="dashboard_filter_validation_from", on_change=reset_dashboard_page)
+        filters["validation_to"] = col4.date_input("Accord organisme validé jusqu'au", value=None, key="dashboard_filter_validation_to", on_change=reset_dashboard_page)
+        col1, col2, col3 = st.columns([2, 1, 1])
+        sort_label = col1.selectbox("Trier par", list(DASHBOARD_SORT_OPTIONS), key="dashboard_sort_by", on_change=reset_dashboard_page)
+        descending = col2.radio("Ordre", ["Croissant", "Décroissant"], horizontal=True, key="dashboard_sort_order", on_change=reset_dashboard_page) == "Décroissant"
+        page_size = col3.selectbox("Dossiers par page", DASHBOARD_PAGE_SIZES, key="dashboard_page_size", on_change=reset_dashboard_page)
+
+    # Seule la page courante est lue dans l'index et envoyée au navigateur
+    total = index.count_dossiers(filters)
+    if not total: st.info("Aucun dossier patient n'a été trouvé."); return
+    nb_pages = (total + page_size - 1) // page_size
+    init_session_state_key('dashboard_page', 1)
+    st.session_state.dashboard_page = min(max(1, st.session_state.dashboard_page), nb_pages)
+    rows = index.query_dossiers(filters, sort_by=DASHBOARD_SORT_OPTIONS[sort_label], descending=descending, limit=page_size, offset=(st.session_state.dashboard_page - 1) * page_size)
+    # Colonnes construites directement, passées à st.dataframe en table Arrow (sans DataFrame intermédiaire)
+    table = columnar({
+        "IPP": [row["receveur_ipp"] if row["receveur_ipp"] is not None else "N/A" for row in rows],
+        "Nom Receveur": [f"{row['receveur_nom'] or ''} {row['receveur_prenom'] or ''}".strip() for row in rows],
+        "Accord Tribunal": [row["accord_tribunal"] if row["accord_tribunal"] is not None else "N/A" for row in rows],
+        "Accord Ministère": [row["accord_ministere"] if row["accord_ministere"] is not None else "N/A" for row in rows],
+        "Nom Donneur": [f"{row['donneur_nom'] or ''} {row['donneur_prenom'] or ''}".strip() for row in rows],
+        "Date Création/Modif": [datetime.datetime.fromtimestamp(row["updated_at"]).strftime('%Y-%m-%d %H:%M') if row["updated_at"] else "N/A" for row in rows],
+    })
+    st.dataframe(table, use_container_width=True, hide_index=True)
+
+    col_prev, col_info, col_page, col_next = st.columns([1, 2, 1, 1])
+    col_prev.button("← Page précédente", disabled=st.session_state.dashboard_page <= 1, on_click=shift_dashboard_page, args=(-1,), use_container_width=True)
+    col_info.markdown(f"<div style='text-align: center; padding-top: 0.5rem;'>{total} dossier(s) — page {st.session_state.dashboard_page} / {nb_pages}</div>", unsafe_allow_html=True)
+    col_page.number_input("Aller à la page", 1, nb_pages, key="dashboard_page", label_visibility="collapsed")
+    col_next.button("Page suivante →", disabled=st.session_state.dashboard_page >= nb_pages, on_click=shift_dashboard_page, args=(1,), use_container_width=True)
+    if EXPORT_FORMATS: render_registry_export_section()
+
+@profiled
+def render_bulk_import_section():
+    """Création ou mise à jour de dossiers depuis un fichier CSV / Excel ; toutes les lignes sont validées avant écriture."""
+    from bulk_import import import_dossiers, template_csv
+    with st.expander("📥 Importer des dossiers (CSV / Excel)", expanded=False):
+        st.download_button("Télécharger le modèle CSV", template_csv(), file_name="modele_import_dossiers.csv", mime="text/csv")
+        uploaded = st.file_uploader("Fichier à importer (une ligne par receveur)", type=["csv", "xlsx"], key="dashboard_import_file")
+        update_existing = st.checkbox("Mettre à jour les dossiers existants", key="dashboard_import_update", help="Sinon, les lignes dont l'IPP est déjà enregistré sont refusées.")
+        col_check, col_import = st.columns(2)
+        check = col_check.button("Vérifier le fichier", disabled=uploaded is None, use_container_width=True)
+        run = col_import.button("Importer les lignes valides", type="primary", disabled=uploaded is None, use_container_width=True)
+        if uploaded is not None and (check or run):
+            with st.spinner("Validation du fichier..." if check else "Import des dossiers..."):
                 try:
-                    with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
-                    dossiers.append({
-                        "IPP": data.get("receveur_ipp", "N/A"),
-                        "Nom Receveur": f"{data.get('receveur_nom', '')} {data.get('receveur_prenom', '')}".strip(),
-                        "Accord Tribunal": data.get("accord_tribunal", "N/A"),
-                        "Accord Ministère": data.get("accord_ministere", "N/A"),
-                        "Nom Donneur": f"{data.get('donneur_nom', '')} {data.get('donneur_prenom', '')}".strip(),
-                        "Date Création/Modif": datetime.datetime.fromtimestamp(os.path.getmtime(json_path)).strftime('%Y-%m-%d %H:%M') if os.path.exists(json_path) else "N/A"
-                    })
-                except json.JSONDecodeError: logging.error(f"Could not decode JSON for patient {ipp_folder_name}")
-                except Exception as e: logging.error(f"Error processing folder {ipp_folder_name}: {e}")
-    if not dossiers: st.info("Aucun dossier patient n'a été trouvé."); return
-    df_dossiers = pd.DataFrame(dossiers)
-    st.dataframe(df_dossiers, use_container_width=True, hide_index=True)
-
+                    result = import_dossiers(uploaded, BASE_UPLOAD_FOLDER, get_dossier_schema(), get_dossier_index(), update_existing, dry_run=check, organismes=ORGANISMES_LIST, statuts=ACCORD_STATUTS)
+                except Exception as e:
+                    st.error(f"Fichier illisible : {e}"); logging.error(f"Bulk import error: {e}", exc_info=True); return
+            cache = get_dossier_cache()
+            for folder in result.pop("folders"): cache.invalidate(folder) # liste non gardée dans la session (un dossier par ligne importée)
+            st.session_state.dashboard_import_result = dict(result, dry_run=check, file=uploaded.name)
+        result = st.session_state.get('dashboard_import_result')
+        if not result: return
+        refused = result["errors"]["Ligne"].nunique()
+        if result["dry_run"]: st.info(f"`{result['file']}` : {result['rows']} ligne(s), {result['valid']} valide(s), {refused} refusée(s) — vérifié en {result['duration_s']:.2f} s, rien n'a été enregistré.")
+        else: st.success(f"`{result['file']}` : {result['created']} dossier(s) créé(s), {result['updated']} mis à jour, {refused} ligne(s) refusée(s) — {result['duration_s']:.2f} s.")
+        if result["ignored_columns"]: st.caption("Colonnes ignorées : " + ", ".join(result["ignored_columns"]))
+        if len(result["errors"]):
+            st.dataframe(result["errors"], use_container_width=True, hide_index=True)
+            st.download_button("Télécharger les erreurs (CSV)", result["errors"].to_csv(index=False).encode('utf-8-sig'), file_name="erreurs_import.csv", mime="text/csv")
+
+@profiled
+def render_registry_export_section():
+    """Tous les dossiers en un fichier Parquet / Arrow ; seuls les dossiers modifiés depuis le dernier export sont relus."""
+    from registry_export import EXPORT_FORMATS, export_registry
+    with st.expander("📦 Exporter le registre complet (Parquet / Arrow)", expanded=False):
+        fmt = st.radio("Format", EXPORT_FORMATS, horizontal=True, key="dashboard_export_format", help="Parquet : compact, pour pandas / R / tableurs. Arrow : lecture sans copie (pyarrow, polars).")
+        if st.button("Mettre à jour l'export", use_container_width=True):
+            with st.spinner("Export des dossiers modifiés..."):
+                st.session_state.dashboard_export_result = export_registry(BASE_UPLOAD_FOLDER, REGISTRY_EXPORT_FOLDER, get_dossier_schema(), fmt)
+        result = st.session_state.get('dashboard_export_result')
+        if result and result["format"] == fmt and os.path.exists(result["path"]):
+            st.caption(f"{result['dossiers']} dossier(s), dont {result['reread']} relu(s) ; {result['removed']} retiré(s), {result['errors']} erreur(s) — {result['size'] / 1024:.0f} Ko en {result['duration_s']:.2f} s.")
+            if result["size"] <= EXPORT_DOWNLOAD_MAX_BYTES:
+                with open(result["path"], 'rb') as f:
+                    st.download_button(f"Télécharger {os.path.basename(result['path'])}", f.read(), file_name=os.path.basename(result["path"]), mime="application/octet-stream", use_container_width=True)
+            else:
+                st.info(f"Export trop volumineux pour le navigateur : disponible sur le serveur ({result['path']}).")
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_analytics(index_generation, today):
+    # Recalculé seulement quand l'index a changé (ou le jour suivant, pour les âges) ; partagé par toutes les sessions
+    from analytics import ANALYTICS_COLUMNS, compute_analytics
+    return compute_analytics(get_dossier_index().snapshot(ANALYTICS_COLUMNS), today)
+
+@profiled
+def render_analytics_page():
+    st.markdown('<div class="page-header"><h1><i class="fas fa-chart-line"></i> Statistiques</h1><p>Circuit des accords, délais, nouveaux dossiers et âge des receveurs.</p></div>', unsafe_allow_html=True)
+    index = get_dossier_index()
+    results = get_analytics(index.generation, datetime.date.today())
+    if not results["dossiers"]: st.info("Aucun dossier patient n'a été trouvé."); return
+    cols = st.columns(4)
+    cols[0].metric("Dossiers", results["dossiers"])
+    for col, (label, count) in zip(cols[1:], results["accorded"].items()):
+        col.metric(f"Accord {label} obtenu", count, f"{count / results['dossiers']:.0%}", delta_color="off")
 
+    with st.container(border=True):
+        st.subheader("Statuts des accords par organisme payeur")
+        st.dataframe(results["accord_counts"], use_container_width=True)
+    with st.container(border=True):
+        st.subheader("Délai entre la création du dossier et l'accord")
+        st.caption("Date de création et date de passage à « Accordé » tirées de l'historique des versions ; les dossiers enregistrés avant l'historique en sont exclus.")
+        st.dataframe(results["turnaround"], use_container_width=True, hide_index=True)
+    col_intake, col_ages = st.columns([3, 2])
+    with col_intake, st.container(border=True):
+        st.subheader("Nouveaux dossiers par mois")
+        st.bar_chart(results["monthly_intake"])
+    with col_ages, st.container(border=True):
+        st.subheader("Âge des receveurs")
+        st.bar_chart(results["age_cohorts"])
+    st.caption(f"Calculé sur {results['dossiers']} dossier(s) en {results['duration_s'] * 1000:.0f} ms (mis en cache jusqu'à la prochaine modification de l'index).")
+
+
+@profiled
 def search_for_patient(query, search_by):
-    matches = []
-    if not query: return matches
-    query = query.lower().strip()
-    if not os.path.exists(BASE_UPLOAD_FOLDER): return matches
-
-    for ipp_folder_name in os.listdir(BASE_UPLOAD_FOLDER):
-        if not os.path.isdir(os.path.join(BASE_UPLOAD_FOLDER, ipp_folder_name)):
-            continue
-        json_path = os.path.join(BASE_UPLOAD_FOLDER, ipp_folder_name, "data.json")
-        if os.path.isfile(json_path):
-            with open(json_path, 'r', encoding='utf-8') as f:
-                try:
-                    data = json.load(f)
-                    patient_ipp = data.get('receveur_ipp', '').lower()
-                    patient_name = f"{data.get('receveur_nom', '')} {data.get('receveur_prenom', '')}".lower().strip()
-                    
-                    if (search_by == 'IPP' and query in patient_ipp) or \
-                       (search_by == 'Nom' and query in patient_name):
-                        matches.append({
-                            'ipp': data.get('receveur_ipp', 'N/A'),
-                            'name': f"{data.get('receveur_nom', '')} {data.get('receveur_prenom', '')}".strip()
-                        })
-                except (json.JSONDecodeError, KeyError):
-                    logging.warning(f"Skipping folder {ipp_folder_name} due to data error.")
-                    continue
-    return matches
-
-def load_patient_data(ipp_to_load):
-    json_path = os.path.join(BASE_UPLOAD_FOLDER, ipp_to_load, "data.json")
-    if not os.path.isfile(json_path):
+    """Résumé des dossiers trouvés, gardé dans la session : un tuple (ipp, nom, score, correspondance) par dossier, au plus SEARCH_MAX_RESULTS."""
+    if not query: return []
+    return [(
+        row['receveur_ipp'] if row['receveur_ipp'] is not None else 'N/A',
+        f"{row['receveur_nom'] or ''} {row['receveur_prenom'] or ''}".strip(),
+        row.get('match_score'),
+        f"{row['match_role']} : {row['match_name']}" if row.get('match_role') else None
+    ) for row in get_dossier_index().search(query, search_by, top_k=SEARCH_MAX_RESULTS)]
+
+@profiled
+def load_patient_data(ipp_to_load, version=None):
+    try:
+        # Une version antérieure est reconstruite depuis l'historique ; elle n'est enregistrée qu'à la prochaine sauvegarde
+        data = get_dossier_cache().load(ipp_to_load) if version is None else load_version(os.path.join(BASE_UPLOAD_FOLDER, ipp_to_load), version)
+    except KeyError:
+        st.error(f"Version {version} introuvable dans l'historique du dossier {ipp_to_load}.")
+        return
+    except ValueError: # JSON invalide ou dossier binaire illisible
+        st.error(f"Erreur de lecture du fichier de données pour l'IPP {ipp_to_load}.")
+        return
+    if data is None:
         st.error(f"Fichier de données introuvable pour l'IPP {ipp_to_load}.")
         return
-
-    with open(json_path, 'r', encoding='utf-8') as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            st.error(f"Erreur de lecture du fichier de données pour l'IPP {ipp_to_load}.")
-            return
+    schema = get_dossier_schema()
+    dossier = schema.from_record(data) # dates décodées une fois ; `data` (en cache, partagé entre sessions) n'est pas modifié
 
     # Preserve active page, then clear and re-initialize specific form keys
     active_page_before_load = st.session_state.get('active_page') # Store current page
@@ -832,7 +792,8 @@ def load_patient_data(ipp_to_load):
         'app_initialized': st.session_state.get('app_initialized', True),
         'search_query': st.session_state.get('search_query', ''), # Preserve search state
         'search_by': st.session_state.get('search_by', 'IPP'),
-        'search_results': st.session_state.get('search_results', [])
+        'search_results': st.session_state.get('search_results', []),
+        'profiling_session': st.session_state.get('profiling_session'),
     }
 
     st.session_state.clear() # Clear everything first
@@ -842,22 +803,7 @@ def load_patient_data(ipp_to_load):
     for pk, pv in preserved_keys.items():
         st.session_state[pk] = pv
         
-    # Load data from JSON
-    for key, value in data.items():
-        if key in st.session_state: # Only update if key is part of our initialized form
-            if isinstance(st.session_state[key], datetime.date) and isinstance(value, str):
-                try:
-                    st.session_state[key] = datetime.datetime.strptime(value, '%Y-%m-%d').date()
-                except ValueError:
-                    try: # Handle full ISO format if present
-                        st.session_state[key] = datetime.datetime.fromisoformat(value).date()
-                    except ValueError:
-                        logging.warning(f"Could not parse date string '{value}' for key '{key}'. Keeping default.")
-                        # Keep default if parsing fails
-            else:
-                st.session_state[key] = value
-        # else:
-            # logging.warning(f"Key '{key}' from JSON not found in initialized session state. Skipping.")
+    st.session_state.update(schema.to_state(dossier)) # tous les champs du formulaire en une fois
 
     st.session_state.active_page = "Nouveau Dossier" # Navigate to form
     st.session_state.edit_mode = True
@@ -866,6 +812,7 @@ def load_patient_data(ipp_to_load):
     st.rerun()
 
 
+@profiled
 def render_search_page():
     st.markdown('<div class="page-header"><h1><i class="fas fa-search"></i> Rechercher / Modifier un Dossier</h1><p>Trouver et éditer des dossiers patients existants.</p></div>', unsafe_allow_html=True)
     
@@ -873,7 +820,7 @@ def render_search_page():
         st.subheader("Critères de Recherche")
         col1, col2 = st.columns([3,1])
         with col1: st.session_state.search_query = st.text_input("Rechercher un patient", st.session_state.get('search_query',''), placeholder="Entrez un IPP ou un nom...")
-        with col2: st.session_state.search_by = st.selectbox("Rechercher par", ["IPP", "Nom"], index=["IPP", "Nom"].index(st.session_state.get('search_by','IPP')))
+        with col2: st.session_state.search_by = st.selectbox("Rechercher par", ["IPP", "Nom"], index=["IPP", "Nom"].index(st.session_state.get('search_by','IPP')), help="La recherche par nom ignore accents, espaces et tirets, et couvre aussi le donneur et les parents du receveur.")
         
         if st.button("Lancer la recherche", type="primary", use_container_width=True):
             st.session_state.search_results = search_for_patient(st.session_state.search_query, st.session_state.search_by)
@@ -886,13 +833,146 @@ def render_search_page():
     if st.session_state.get('search_results'):
         st.markdown("---") # Styled divider
         st.subheader(f"Résultats de la Recherche ({len(st.session_state.search_results)} trouvé(s))")
-        for patient in st.session_state.search_results:
+        if len(st.session_state.search_results) >= SEARCH_MAX_RESULTS: st.caption(f"Seuls les {SEARCH_MAX_RESULTS} premiers résultats sont affichés : précisez la recherche.")
+        for ipp, name, score, match in st.session_state.search_results:
             with st.container(border=True): # Each result in a styled container
                 c1, c2 = st.columns([3, 1])
-                c1.markdown(f"**Nom:** {patient['name']}<br>**IPP:** {patient['ipp']}", unsafe_allow_html=True)
-                if c2.button("Modifier ce dossier", key=f"load_{patient['ipp']}", use_container_width=True):
-                    load_patient_data(patient['ipp']) # This will trigger a rerun
-
+                details = f"**Nom:** {name}<br>**IPP:** {ipp}"
+                if match: details += f"<br><small>Correspondance {match} ({score:.0%})</small>"
+                c1.markdown(details, unsafe_allow_html=True)
+                if c2.button("Modifier ce dossier", key=f"load_{ipp}", use_container_width=True):
+                    load_patient_data(ipp) # This will trigger a rerun
+                if c2.button("Historique", key=f"history_{ipp}", use_container_width=True):
+                    st.session_state.search_history_ipp = ipp
+                if st.session_state.get('search_history_ipp') == ipp:
+                    render_version_history(ipp)
+
+@profiled
+def render_version_history(ipp):
+    versions = list_versions(os.path.join(BASE_UPLOAD_FOLDER, ipp))
+    if not versions: st.caption("Aucun historique pour ce dossier (jamais enregistré depuis l'application)."); return
+    labels = {v['v']: f"Version {v['v']} — {v['at']} — {v['changed']} champ(s) modifié(s)" for v in versions}
+    col_version, col_restore = st.columns([3, 1])
+    version = col_version.selectbox("Version", list(labels), format_func=labels.get, key=f"history_version_{ipp}")
+    if col_restore.button("Ouvrir cette version", key=f"restore_{ipp}", use_container_width=True):
+        load_patient_data(ipp, version)
+
+
+@profiled
+def render_admin_page():
+    st.markdown('<div class="page-header"><h1><i class="fas fa-tools"></i> Administration</h1><p>État des caches et de l\'index des dossiers.</p></div>', unsafe_allow_html=True)
+    if PROFILING_ENABLED: render_profiling_section()
+    if SESSION_MEMORY_ENABLED: render_session_memory_section()
+    cache = get_dossier_cache()
+    with st.container(border=True):
+        st.subheader("Cache des dossiers (partagé par toutes les sessions)")
+        stats = cache.stats()
+        cols = st.columns(5)
+        cols[0].metric("Entrées", f"{stats['entries']} / {cache.max_entries}")
+        cols[1].metric("Taux de succès", f"{stats['hit_rate']:.0%}")
+        cols[2].metric("Succès / Échecs", f"{stats['hits']} / {stats['misses']}")
+        cols[3].metric("Évictions", stats['evictions'])
+        cols[4].metric("Invalidations", stats['invalidations'])
+        st.caption(f"Mémoire estimée : {stats['weight'] / 1024:.0f} Ko / {cache.max_weight / 1024:.0f} Ko — entrées périmées relues : {stats['stale']}.")
+        if st.button("Vider le cache des dossiers"): cache.clear(); st.rerun()
+    with st.container(border=True):
+        st.subheader("Cache des rapports PDF")
+        stats = get_report_cache().stats()
+        cols = st.columns(4)
+        cols[0].metric("Rapports en cache", stats['entries'])
+        cols[1].metric("Taux de succès", f"{stats['hit_rate']:.0%}")
+        cols[2].metric("Évictions", stats['evictions'])
+        cols[3].metric("Mémoire", f"{stats['weight'] / 1024:.0f} Ko")
+    with st.container(border=True):
+        st.subheader("Cache des QR codes")
+        from qr_codes import cache_stats as qr_cache_stats
+        stats = qr_cache_stats()
+        cols = st.columns(4)
+        cols[0].metric("Entrées", f"{stats['entries']} / {stats['max_entries']}")
+        cols[1].metric("Taux de succès", f"{stats['hit_rate']:.0%}")
+        cols[2].metric("Évictions", stats['evictions'])
+        cols[3].metric("Mémoire", f"{stats['weight'] / 1024:.0f} Ko")
+    with st.container(border=True):
+        st.subheader("Documents téléversés")
+        stats = get_upload_store().stats
+        cols = st.columns(4)
+        cols[0].metric("Fichiers ingérés", stats['ingested'])
+        cols[1].metric("Reruns sans relecture", stats['skipped'])
+        cols[2].metric("Doublons évités", stats['deduplicated'])
+        cols[3].metric("Octets écrits / évités", f"{stats['bytes_written'] / 1024:.0f} / {stats['bytes_deduplicated'] / 1024:.0f} Ko")
+    with st.container(border=True):
+        st.subheader("Vignettes et aperçus des images")
+        stats = get_image_pipeline().stats
+        cols = st.columns(3)
+        cols[0].metric("Images traitées", stats['processed'])
+        cols[1].metric("En attente / Échecs", f"{get_image_pipeline().pending()} / {stats['failed']}")
+        cols[2].metric("Vignettes et aperçus", f"{stats['derived_bytes'] / 1024:.0f} Ko")
+    index = get_dossier_index()
+    with st.container(border=True):
+        st.subheader("Index des dossiers")
+        totals = index.total_refresh_stats
+        cols = st.columns(4)
+        cols[0].metric("Dossiers indexés", index.count())
+        cols[1].metric("Fichiers examinés (cumul)", totals['files_scanned'])
+        cols[2].metric("Fichiers relus (cumul)", totals['files_reparsed'])
+        cols[3].metric("Temps d'actualisation (cumul)", f"{totals['duration_s']:.2f} s")
+
+
+@profiled
+def render_profiling_section():
+    """Latences des reruns par page et par session, et des fonctions instrumentées (render_*, E-S)."""
+    import pandas as pd
+    profiler = get_profiler()
+    def frame(rows, label):
+        df = pd.DataFrame(rows, columns=["name", "count", "sum_s", "mean_s", "p50_s", "p95_s", "max_s"])
+        for column in ("mean_s", "p50_s", "p95_s", "max_s"): df[column] = (df[column] * 1000).round(1)
+        df["sum_s"] = df["sum_s"].round(2)
+        return df.sort_values("sum_s", ascending=False).rename(columns={"name": label, "count": "Appels", "sum_s": "Total (s)", "mean_s": "Moyenne (ms)", "p50_s": "Médiane (ms)", "p95_s": "95e centile (ms)", "max_s": "Max (ms)"})
+    with st.container(border=True):
+        st.subheader("Profilage des reruns")
+        pages = profiler.table("pages")
+        cols = st.columns(3)
+        cols[0].metric("Reruns comptés", sum(row["count"] for row in pages))
+        cols[1].metric("Sessions suivies", len(profiler.sessions))
+        cols[2].metric("Depuis", profiler.started_at.strftime('%d/%m %H:%M'))
+        st.caption("Médiane et 95e centile estimés depuis les seuils des histogrammes ; durées inclusives (un render_* compte aussi les fonctions qu'il appelle).")
+        tab_pages, tab_functions, tab_sessions = st.tabs(["Par page", "Par fonction", "Par session"])
+        with tab_pages:
+            st.dataframe(frame(pages, "Page"), use_container_width=True, hide_index=True)
+            page = st.selectbox("Détail d'une page", sorted(row["name"] for row in pages), key="admin_profiling_page")
+            if page: st.dataframe(frame(profiler.table("page_functions", page), "Fonction"), use_container_width=True, hide_index=True)
+        with tab_functions:
+            st.dataframe(frame(profiler.table("functions"), "Fonction"), use_container_width=True, hide_index=True)
+        with tab_sessions:
+            st.dataframe(frame(profiler.table("sessions"), "Session"), use_container_width=True, hide_index=True)
+        col_prom, col_jsonl, col_reset = st.columns(3)
+        col_prom.download_button("Export Prometheus", profiler.prometheus_text(), file_name="metrics.prom", mime="text/plain", use_container_width=True)
+        col_jsonl.download_button("Export JSON lines", profiler.json_lines(), file_name="metrics.jsonl", mime="application/x-ndjson", use_container_width=True)
+        if col_reset.button("Remettre à zéro", use_container_width=True): profiler.reset(); st.rerun()
+        st.caption(f"Fichiers réécrits toutes les {PROFILING_EXPORT_INTERVAL_SECONDS} s : `{PROFILING_EXPORT_FOLDER}/metrics.prom` et `metrics.jsonl`.")
+
+@profiled
+def render_session_memory_section():
+    """Taille estimée de l'état de chaque session (dernière mesure) et détail clé par clé de la session courante."""
+    memory = get_session_memory()
+    with st.container(border=True):
+        st.subheader("Mémoire des sessions")
+        rows, total, rss = memory.table(), memory.total(), process_rss()
+        cols = st.columns(4)
+        cols[0].metric("Sessions suivies", len(rows))
+        cols[1].metric("État de toutes les sessions", f"{total / 1024:.0f} Ko")
+        cols[2].metric("État moyen par session", f"{total / len(rows) / 1024:.1f} Ko" if rows else "—")
+        cols[3].metric("Mémoire du process (RSS)", f"{rss / 1024 / 1024:.0f} Mo" if rss else "inconnue")
+        st.caption("Taille estimée de st.session_state à la fin du dernier rerun de chaque session (contenu compris, objets partagés comptés dans chaque session) ; "
+                   "les fichiers gardés par les champs de téléversement et l'état interne de Streamlit n'y figurent pas.")
+        tab_sessions, tab_current = st.tabs(["Par session", "Session courante"])
+        with tab_sessions:
+            st.dataframe([{"Session": row["session"], "Page": row["page"], "Clés": row["keys"], "État (Ko)": round(row["bytes"] / 1024, 1), "Clé la plus lourde": row["largest_key"],
+                           "Taille (Ko)": round(row["largest_bytes"] / 1024, 1), "Mesuré à": datetime.datetime.fromtimestamp(row["measured_at"]).strftime('%H:%M:%S')} for row in rows], use_container_width=True, hide_index=True)
+        with tab_current:
+            sizes = state_sizes(st.session_state) # maintenant, pas à la fin du rerun précédent
+            st.dataframe([{"Clé": key, "Octets": size} for key, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True)], use_container_width=True, hide_index=True)
+            st.caption(f"{len(sizes)} clé(s), {sum(sizes.values()) / 1024:.1f} Ko.")
 
 # --- Main Application ---
 def main():
@@ -903,7 +983,6 @@ def main():
         layout="wide",
         initial_sidebar_state="expanded"
     )
-    _inject_custom_styles() # Apply custom CSS globally
 
     # Initialize session state if not already done
     if 'app_initialized' not in st.session_state:
@@ -911,19 +990,35 @@ def main():
         st.session_state.active_page = 'Nouveau Dossier' # Default page
         logging.info("Main app: Session state initialized for the first time.")
 
+    if not st.session_state.get('profiling_session'): st.session_state.profiling_session = uuid.uuid4().hex[:8] # identifiant de la session pour le profilage et la mémoire
+    if PROFILING_ENABLED: get_profiler().begin_rerun(st.session_state.profiling_session, profiling_page_label())
+    try:
+        render_layout()
+    finally: # st.rerun() interrompt le rerun par une exception : il est compté quand même
+        if PROFILING_ENABLED: get_profiler().end_rerun(profiling_page_label())
+        if SESSION_MEMORY_ENABLED: get_session_memory().record(st.session_state.get('profiling_session'), st.session_state, profiling_page_label())
+
+def profiling_page_label():
+    page = st.session_state.get('active_page')
+    return f"{page} / étape {st.session_state.get('current_step', 0) + 1}" if page == "Nouveau Dossier" else page
 
+def render_layout():
+    """Barre latérale, page active et pied de page."""
+    _inject_custom_styles() # Apply custom CSS globally
     with st.sidebar:
         # Sidebar Logo (from first script's style)
-        logo_base64_sidebar = get_base64_image(LOGO_PATH_2) # LOGO_PATH_2 from first script
-        if logo_base64_sidebar:
-            st.markdown(f'<div style="text-align: center; padding-bottom: 1rem;"><img src="data:image/png;base64,{logo_base64_sidebar}" alt="Logo App" style="height: 55px;"></div>', unsafe_allow_html=True)
+        logo_html_sidebar = image_html(LOGO_PATH_2, "Logo App", "height: 55px;") # LOGO_PATH_2 from first script
+        if logo_html_sidebar:
+            st.markdown(f'<div style="text-align: center; padding-bottom: 1rem;">{logo_html_sidebar}</div>', unsafe_allow_html=True)
         else: # Fallback title if logo not found
             st.markdown("<h2 style='text-align: center;'>Gestion Allo-Greffe</h2>", unsafe_allow_html=True)
         
         st.markdown("---") # Divider
 
-        page_options = ["Nouveau Dossier", "Rechercher / Modifier", "Tableau de Bord"]
-        page_icons = ["plus-square-fill", "search", "bar-chart-fill"] # Bootstrap Icons
+        page_options = ["Nouveau Dossier", "Rechercher / Modifier", "Tableau de Bord", "Statistiques"]
+        page_icons = ["plus-square-fill", "search", "bar-chart-fill", "graph-up"] # Bootstrap Icons
+        if st.query_params.get("admin") == "1": # Page cachée : ?admin=1 dans l'URL
+            page_options.append("Administration"); page_icons.append("gear-fill")
 
         try:
             default_index = page_options.index(st.session_state.active_page)
@@ -974,12 +1069,16 @@ def main():
             st.session_state.current_step = 0
             page_renderers[0]()
 
-        if current_step < len(page_renderers) -1: # Don't show nav buttons on confirmation page
+        if current_step < len(page_renderers) -1 and current_step not in FORM_STEPS: # Don't show nav buttons on confirmation page
             render_navigation_buttons()
     elif st.session_state.active_page == "Tableau de Bord":
         render_dashboard_page()
+    elif st.session_state.active_page == "Statistiques":
+        render_analytics_page()
     elif st.session_state.active_page == "Rechercher / Modifier":
         render_search_page()
+    elif st.session_state.active_page == "Administration":
+        render_admin_page()
 
     render_footer() # Add the footer to all pages
 
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Ressources statiques de l'interface (logos, feuille de style), préparées une fois par process.
+
+Streamlit réexécute app.py à chaque rerun ; ce module, lui, n'est importé qu'une fois.
+Les logos y sont lus et encodés en base64 une seule fois, la feuille de style est
+minifiée et identifiée par une empreinte de son contenu, et les fragments HTML
+obtenus sont gardés tels quels : un rerun ne fait plus qu'un st.markdown d'une
+chaîne déjà prête, identique d'un rerun à l'autre.
+"""
+import base64
+import functools
+import hashlib
+import logging
+import re
+
+_CSS_STRINGS = re.compile(r"""("[^"]*"|'[^']*')""")  # chaînes entre guillemets, laissées intactes
+_CSS_COMMENTS = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACES = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLONS = re.compile(r":\s+")
+
+
+def minify_css(css):
+    """Supprime commentaires et espaces superflus ; le contenu des chaînes ("...", '...') n'est pas modifié."""
+    parts = _CSS_STRINGS.split(_CSS_COMMENTS.sub("", css))
+    for i in range(0, len(parts), 2): # indices pairs : hors chaînes
+        part = _CSS_SPACES.sub(" ", parts[i])
+        part = _CSS_PUNCTUATION.sub(r"\1", part)
+        parts[i] = _CSS_COLONS.sub(":", part).replace(";}", "}")
+    return "".join(parts).strip()
+
+
+@functools.lru_cache(maxsize=None)
+def css_bundle(path):
+    """(CSS minifié, empreinte) du fichier `path`, lu une seule fois."""
+    with open(path, 'r', encoding='utf-8') as f: css = minify_css(f.read())
+    return css, hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]
+
+
+@functools.lru_cache(maxsize=None)
+def stylesheet_html(path, external=()):
+    """Balises <link> des feuilles externes puis <style> du CSS minifié, marqué par son empreinte."""
+    css, fingerprint = css_bundle(path)
+    links = "".join(f'<link rel="stylesheet" href="{url}">' for url in external)
+    return f'{links}<style data-asset="{fingerprint}">{css}</style>'
+
+
+@functools.lru_cache(maxsize=None)
+def image_base64(path):
+    """Contenu de l'image encodé en base64, ou None si le fichier est illisible (signalé une seule fois)."""
+    try:
+        with open(path, "rb") as img_file: return base64.b64encode(img_file.read()).decode()
+    except FileNotFoundError: logging.warning(f"Logo file not found: {path}"); return None
+    except Exception as e: logging.error(f"Error reading logo {path}: {e}"); return None
+
+
+@functools.lru_cache(maxsize=None)
+def image_html(path, alt, style):
+    """Balise <img> avec l'image intégrée en data URI, ou "" si l'image est absente."""
+    encoded = image_base64(path)
+    return f'<img src="data:image/png;base64,{encoded}" alt="{alt}" style="{style}">' if encoded else ""
+
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Régénération en lot des rapports PDF (Rapport_<IPP>.pdf) sans passer par l'interface.
+
+Usage (depuis le dossier de l'application) :
+    python batch_reports.py                 # tous les dossiers modifiés depuis la dernière génération
+    python batch_reports.py --force         # tous les dossiers
+    python batch_reports.py IPP1 IPP2 -j 4  # dossiers choisis, 4 processus
+
+Un dossier est sauté si l'empreinte SHA-256 de son fichier de données (et de la version du gabarit,
+REPORT_TEMPLATE_VERSION) est identique à celle de la dernière génération réussie et que le PDF existe.
+Les empreintes sont gardées dans GENERATED_PDF_FOLDER/.report_hashes.json.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import app
+from dossier_format import read_dossier_file
+from dossier_index import find_dossier_file
+
+MANIFEST_FILENAME = ".report_hashes.json"
+
+
+def report_path(ipp):
+    return os.path.join(app.GENERATED_PDF_FOLDER, f"Rapport_{ipp}.pdf")
+
+
+def list_dossiers(ipps=None):
+    """(ipp, chemin du fichier de données) pour chaque dossier à traiter."""
+    if not ipps:
+        with os.scandir(app.BASE_UPLOAD_FOLDER) as entries:
+            ipps = sorted(entry.name for entry in entries if entry.is_dir())
+    dossiers = []
+    for ipp in ipps:
+        source, _ = find_dossier_file(os.path.join(app.BASE_UPLOAD_FOLDER, ipp))
+        if source is None:
+            logging.warning(f"Aucun fichier de données pour {ipp}, dossier ignoré.")
+            continue
+        dossiers.append((ipp, os.path.join(app.BASE_UPLOAD_FOLDER, ipp, source)))
+    return dossiers
+
+
+def dossier_hash(dossier_path):
+    digest = hashlib.sha256(f"template-v{app.REPORT_TEMPLATE_VERSION}\n".encode())
+    with open(dossier_path, 'rb') as f: digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_manifest():
+    try:
+        with open(os.path.join(app.GENERATED_PDF_FOLDER, MANIFEST_FILENAME), 'r', encoding='utf-8') as f: return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest):
+    path = os.path.join(app.GENERATED_PDF_FOLDER, MANIFEST_FILENAME)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path) or ".", suffix='.tmp', delete=False) as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f.name, path)
+
+
+def _render_one(job):
+    """Exécuté dans un processus du pool : (ipp, hash, erreur ou None)."""
+    ipp, dossier_path, data_hash = job
+    try:
+        state = read_dossier_file(dossier_path)
+        state.setdefault('receveur_ipp', ipp)
+        app.generate_pdf_report(state, report_path(ipp), persist_async=False)
+        return ipp, data_hash, None
+    except Exception as e:
+        return ipp, data_hash, f"{type(e).__name__}: {e}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Régénère les rapports PDF des dossiers Allo-Greffe.")
+    parser.add_argument("ipps", nargs="*", help="IPP à traiter (par défaut : tous les dossiers)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="nombre de processus (par défaut : tous les cœurs)")
+    parser.add_argument("--force", action="store_true", help="régénère même les dossiers inchangés")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING) # les logs INFO par rapport noieraient la sortie
+
+    started = time.perf_counter()
+    manifest = load_manifest()
+    jobs, skipped = [], 0
+    for ipp, dossier_path in list_dossiers(args.ipps):
+        data_hash = dossier_hash(dossier_path)
+        if not args.force and manifest.get(ipp) == data_hash and os.path.exists(report_path(ipp)):
+            skipped += 1
+            continue
+        jobs.append((ipp, dossier_path, data_hash))
+
+    failures = []
+    render_started = time.perf_counter()
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(jobs)))) as pool:
+            for ipp, data_hash, error in pool.map(_render_one, jobs, chunksize=max(1, len(jobs) // (args.workers * 4) or 1)):
+                if error is None:
+                    manifest[ipp] = data_hash
+                else:
+                    failures.append((ipp, error))
+        save_manifest(manifest)
+    render_time = time.perf_counter() - render_started
+
+    generated = len(jobs) - len(failures)
+    print(f"{generated} rapport(s) généré(s), {skipped} inchangé(s), {len(failures)} échec(s) en {time.perf_counter() - started:.2f} s")
+    if generated:
+        print(f"Débit : {generated / render_time:.1f} rapports/s avec {min(args.workers, len(jobs))} processus")
+    for ipp, error in failures:
+        print(f"ÉCHEC {ipp} : {error}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Temps de la page Statistiques : instantané en colonnes de l'index SQLite + agrégations (analytics.compute_analytics).
+
+Les lignes d'index sont générées (graine fixe) et écrites directement dans un index temporaire,
+sans fichiers de dossier. Objectif : moins d'une seconde pour 100 000 dossiers.
+
+Usage :
+    python benchmarks/bench_analytics.py [--dossiers 1000 10000 100000]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import ACCORD_LABELS, ACCORDED, ANALYTICS_COLUMNS, compute_analytics
+from dossier_index import DossierIndex, summarize_dossier
+
+ORGANISMES = ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"]
+STATUTS = ["En cours", ACCORDED, "Refusé"]
+START = datetime.datetime(2019, 1, 1)
+
+
+def make_summary(rnd, i):
+    created = START + datetime.timedelta(minutes=rnd.randint(0, 6 * 365 * 24 * 60))
+    data = {"receveur_ipp": f"IPP{i:06d}", "receveur_nom": "Benani", "receveur_organisme": rnd.choice(ORGANISMES), "receveur_date_naissance": (datetime.date(1950, 1, 1) + datetime.timedelta(days=rnd.randint(0, 27_000))).isoformat()}
+    timeline = {"created_at": created.isoformat(timespec='seconds')} if rnd.random() < 0.9 else {}
+    for field in ACCORD_LABELS:
+        data[field] = rnd.choice(STATUTS)
+        if data[field] == ACCORDED and timeline:
+            timeline[f"{field}_at"] = (created + datetime.timedelta(days=rnd.expovariate(1 / 45))).isoformat(timespec='seconds')
+    return summarize_dossier(f"IPP{i:06d}", data, created.timestamp(), timeline=timeline)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dossiers", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args(argv)
+    for count in args.dossiers:
+        rnd = random.Random(42)
+        with tempfile.TemporaryDirectory() as folder:
+            index = DossierIndex(folder)
+            with index._lock, index._conn:
+                for i in range(count): index._write_summary(make_summary(rnd, i))
+            started = time.perf_counter()
+            snapshot = index.snapshot(ANALYTICS_COLUMNS)
+            snapshot_time = time.perf_counter() - started
+            results = compute_analytics(snapshot)
+            index._conn.close()
+        total = snapshot_time + results["duration_s"]
+        print(f"{count:>7} dossiers : instantané {snapshot_time * 1000:6.0f} ms + calcul {results['duration_s'] * 1000:6.0f} ms = {total * 1000:6.0f} ms {'OK' if total < 1 else '> 1 s'}")
+
+
+if __name__ == "__main__":
+    main()
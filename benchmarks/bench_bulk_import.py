@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Import en lot (bulk_import) : validation en colonnes puis écriture des dossiers et de l'index.
+
+Un fichier CSV est généré (graine fixe) avec environ 2 % de lignes fautives (IPP en double, date,
+groupage, sexe ou organisme invalides), puis importé dans un dossier temporaire avec son index.
+Objectif : 10 000 lignes en quelques secondes.
+
+Usage (depuis le dossier de l'application) :
+    python benchmarks/bench_bulk_import.py [--lignes 1000 10000] [--format csv|xlsx]
+"""
+import argparse
+import datetime
+import logging
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.WARNING) # import de app hors de `streamlit run`
+import pandas as pd
+
+import app
+from bulk_import import IMPORT_LABELS, import_dossiers
+from dossier_index import DossierIndex
+from dossier_store import accord_timeline
+
+NOMS = ["El Fédini", "Benani", "Alaoui", "Zahraoui", "Ait Lhaj", "Bouchaïb", "Lahlou", "Chraïbi"]
+PRENOMS = ["Ali", "Sara", "Youssef", "Fatima-Zahra", "Anaïs", "Hélène", "Omar", "Noûr"]
+FAULTS = {"receveur_groupage": "C+", "receveur_sexe": "X", "receveur_organisme": "Mutuelle inconnue", "receveur_date_naissance": "31/02/2001", "donneur_date_naissance": "demain"}
+
+
+def make_rows(rnd, count):
+    rows = []
+    for i in range(count):
+        row = {"receveur_ipp": f"IPP{i:06d}"}
+        for role in ("receveur", "donneur"):
+            row.update({f"{role}_nom": rnd.choice(NOMS), f"{role}_prenom": rnd.choice(PRENOMS), f"{role}_sexe": rnd.choice(["Homme", "femme", "F", "H"]),
+                        f"{role}_groupage": rnd.choice(["A+", "a-", "B+", "AB+", "O+", "O-"]), f"{role}_organisme": rnd.choice(app.ORGANISMES_LIST),
+                        f"{role}_age_pere": str(rnd.randint(25, 80)), f"{role}_age_mere": str(rnd.randint(25, 80))})
+            birth = datetime.date(1960, 1, 1) + datetime.timedelta(days=rnd.randint(0, 22_000))
+            row[f"{role}_date_naissance"] = birth.isoformat() if rnd.random() < 0.5 else birth.strftime("%d/%m/%Y")
+        row.update(accord_tribunal=rnd.choice(app.ACCORD_STATUTS), accord_ministere=rnd.choice(app.ACCORD_STATUTS))
+        if rnd.random() < 0.02:
+            key = rnd.choice(list(FAULTS) + ["receveur_ipp"])
+            row[key] = FAULTS.get(key, f"IPP{max(i - 1, 0):06d}")
+        rows.append(row)
+    return pd.DataFrame(rows).rename(columns=IMPORT_LABELS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lignes", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--format", choices=("csv", "xlsx"), default="csv")
+    args = parser.parse_args(argv)
+    schema = app.get_dossier_schema()
+    for count in args.lignes:
+        with tempfile.TemporaryDirectory() as folder:
+            source = os.path.join(folder, f"import.{args.format}")
+            rows = make_rows(random.Random(42), count)
+            if args.format == "csv": rows.to_csv(source, index=False, sep=";")
+            else: rows.to_excel(source, index=False)
+            base = os.path.join(folder, "dossiers")
+            index = DossierIndex(base, timeline=accord_timeline)
+            result = import_dossiers(source, base, schema, index, organismes=app.ORGANISMES_LIST, statuts=app.ACCORD_STATUTS)
+            assert index.count() == result["created"], "index incomplet"
+            index._conn.close()
+        print(f"{count:>6} lignes : {result['valid']} valides, {len(result['errors'])} erreur(s) ; validation {result['validation_s'] * 1000:5.0f} ms,"
+              f" total {result['duration_s']:5.2f} s ({result['created'] / result['duration_s']:.0f} dossiers/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Formats de stockage des dossiers : JSON indenté (historique), JSON compact, msgpack (dossier_format), orjson si installé.
+
+Mesure, sur N dossiers générés (graine fixe) et écrits dans un répertoire temporaire :
+temps d'encodage, de lecture des fichiers et de décodage, octets et blocs occupés.
+
+Usage :
+    python benchmarks/bench_dossier_format.py [--dossiers 10000]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dossier_format
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NOMS = ["El Fédini", "Benani", "Alaoui", "Zahraoui", "Ait Lhaj", "Bouchaïb", "Lahlou", "Chraïbi"]
+PRENOMS = ["Ali", "Sara", "Youssef", "Fatima-Zahra", "Anaïs", "Hélène", "Omar", "Noûr"]
+GROUPAGES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+ORGANISMES = ["CNSS", "CNOPS", "FAR", "AXA", "PAYANT"]
+STATUTS = ["En cours", "Accordé", "Refusé"]
+EXAMS = ["echographie_abdominale_+_images", "echographie_cardiaque_+_images", "rx_thorax", "antigene_hla_i_et_ii", "bilan_biologique_+_serologies", "observation_medicale", "myelogramme", "caryotype_hematologique", "immunophenotypage", "fish", "biologie_moleculaire"]
+DOCS = ["cin_receveur", "cin_donneur", "acte_de_naissance_receveur", "acte_de_naissance_donneur", "certificat_de_residence"]
+
+
+def _date(rnd, start_year, end_year):
+    return (datetime.date(start_year, 1, 1) + datetime.timedelta(days=rnd.randint(0, (end_year - start_year) * 365))).isoformat()
+
+
+def _reference(rnd, category, i):
+    return {"sha256": "%064x" % rnd.getrandbits(256), "name": f"scan_{i}.{rnd.choice(['pdf', 'jpg'])}", "category": category, "size": rnd.randint(50_000, 8_000_000), "type": rnd.choice(["application/pdf", "image/jpeg"])}
+
+
+def make_dossier(rnd, i):
+    """Dossier tel qu'enregistré par app.py (dates en ISO, pièces jointes sous forme de références)."""
+    data = {"receveur_ipp": f"IPP{i:06d}", "edit_mode": False, "current_step": 6}
+    for role in ("receveur", "donneur"):
+        data.update({f"{role}_nom": rnd.choice(NOMS), f"{role}_prenom": rnd.choice(PRENOMS), f"{role}_date_naissance": _date(rnd, 1960, 2022), f"{role}_adresse": f"{rnd.randint(1, 300)} rue des Orangers, Casablanca", f"{role}_sexe": rnd.choice(["Homme", "Femme"]), f"{role}_groupage": rnd.choice(GROUPAGES), f"{role}_contact_principal": f"06{rnd.randint(10_000_000, 99_999_999)}", f"{role}_nom_pere": rnd.choice(NOMS), f"{role}_age_pere": rnd.randint(30, 90), f"{role}_nom_mere": rnd.choice(NOMS), f"{role}_age_mere": rnd.randint(30, 90), f"{role}_organisme": rnd.choice(ORGANISMES)})
+    for exam in EXAMS:
+        data[f"medical_exam_{exam}"] = rnd.random() < 0.6
+    for j, doc in enumerate(DOCS):
+        data[f"admin_doc_{doc}_upload"] = _reference(rnd, "admin", j) if rnd.random() < 0.7 else None
+    data.update({"accord_tribunal": rnd.choice(STATUTS), "accord_ministere": rnd.choice(STATUTS), "organisme_accord_statut": rnd.choice(STATUTS), "organisme_accord_nom_specifique": rnd.choice(ORGANISMES), "organisme_accord_date_validation": _date(rnd, 2020, 2025), "last_updated": datetime.datetime(2025, 1, 1).isoformat()})
+    return data
+
+
+FORMATS = {
+    "JSON indenté (data.json)": (lambda d: json.dumps(d, indent=4, ensure_ascii=False).encode('utf-8'), json.loads),
+    "JSON compact": (lambda d: json.dumps(d, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), json.loads),
+}
+if dossier_format.msgpack is not None:
+    FORMATS["msgpack (dossier.msgpack)"] = (dossier_format.encode_dossier, dossier_format.decode_dossier)
+if orjson is not None:
+    FORMATS["orjson"] = (orjson.dumps, orjson.loads)
+
+
+def run(label, encode, decode, dossiers, folder):
+    started = time.perf_counter()
+    encoded = [encode(data) for data in dossiers]
+    encode_time = time.perf_counter() - started
+    paths = [os.path.join(folder, f"{i}.bin") for i in range(len(encoded))]
+    for path, raw in zip(paths, encoded):
+        with open(path, 'wb') as f: f.write(raw)
+    started = time.perf_counter()
+    raws = []
+    for path in paths:
+        with open(path, 'rb') as f: raws.append(f.read())
+    read_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for raw in raws: decode(raw)
+    decode_time = time.perf_counter() - started
+    size = sum(len(raw) for raw in encoded)
+    blocks = sum(os.stat(path).st_blocks * 512 for path in paths) if hasattr(os.stat_result, 'st_blocks') else size
+    print(f"{label:<28} encodage {encode_time:6.2f} s   lecture {read_time:5.2f} s + décodage {decode_time:5.2f} s   {size / 1024 / 1024:7.2f} Mo ({size / len(encoded):6.0f} o/dossier)   disque {blocks / 1024 / 1024:7.2f} Mo")
+    return decode_time, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dossiers", type=int, default=10_000)
+    args = parser.parse_args(argv)
+    rnd = random.Random(42)
+    dossiers = [make_dossier(rnd, i) for i in range(args.dossiers)]
+    if orjson is None:
+        print("orjson non installé : format ignoré.")
+    results = {}
+    for label, (encode, decode) in FORMATS.items():
+        with tempfile.TemporaryDirectory() as folder:
+            results[label] = run(label, encode, decode, dossiers, folder)
+    baseline_time, baseline_size = results["JSON indenté (data.json)"]
+    for label, (decode_time, size) in results.items():
+        print(f"{label:<28} décodage x{baseline_time / decode_time:4.1f}   taille {size / baseline_size:5.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Sérialisation des dossiers : boucles historiques sur session_state vs modèle typé (dossier_model).
+
+"avant" : filtrage de toute la session clé par clé (liste d'exclusion + isinstance) à l'enregistrement,
+puis strptime / fromisoformat essayés sur chaque date au chargement.
+"après" : DossierSchema.from_state + to_record, puis from_record + to_state.
+La session est simulée par un dict (champs du formulaire + état de l'interface) ; la vraie
+st.session_state ajoute le même coût par accès aux deux variantes.
+
+Usage (depuis le dossier de l'application) :
+    python benchmarks/bench_dossier_model.py [--dossiers 20000]
+"""
+import argparse
+import datetime
+import gc
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.WARNING) # import de app hors de `streamlit run`
+import app
+from dossier_model import Dossier, DossierSchema
+
+NOMS = ["El Fédini", "Benani", "Alaoui", "Zahraoui", "Ait Lhaj", "Bouchaïb", "Lahlou", "Chraïbi"]
+PRENOMS = ["Ali", "Sara", "Youssef", "Fatima-Zahra", "Anaïs", "Hélène", "Omar", "Noûr"]
+UI_STATE = {"app_initialized": True, "current_step": 6, "active_page": "Nouveau Dossier", "edit_mode": False, "search_query": "ben", "search_by": "Nom", "search_results": [(f"IPP{i}", "Benani Ali", 0.9, None) for i in range(20)], "dashboard_page": 1, "dashboard_page_size": 50, "dashboard_sort_by": "IPP", "dashboard_filter_tribunal": [], "bundle_format": "pdf", "doc_status_editor": {"edited_rows": {}, "added_rows": [], "deleted_rows": []}, "medical_exams_editor": {"edited_rows": {"2": {"Fait": True}}, "added_rows": [], "deleted_rows": []}}
+EXCLUDED = ['app_initialized', 'current_step', 'active_page', 'edit_mode', 'search_query', 'search_by', 'search_results']
+
+
+def make_state(schema, rnd, i):
+    dossier = Dossier(f"IPP{i:06d}")
+    for person in (dossier.receveur, dossier.donneur):
+        person.nom, person.prenom = rnd.choice(NOMS), rnd.choice(PRENOMS)
+        person.date_naissance = datetime.date(1960, 1, 1) + datetime.timedelta(days=rnd.randint(0, 22_000))
+        person.adresse = f"{rnd.randint(1, 300)} rue des Orangers, Casablanca"
+    dossier.accords.tribunal = rnd.choice(app.ACCORD_STATUTS)
+    dossier.checklists["medical"] = {exam: rnd.random() < 0.5 for exam in app.MEDICAL_EXAMS_LIST}
+    return dict(UI_STATE, **schema.to_state(dossier))
+
+
+def save_before(state):
+    data = {}
+    for k, v in state.items():
+        if k in EXCLUDED or k.startswith('uploader_') or k.startswith('FormSubmitter') or k.startswith('dashboard_') or k.startswith('bundle_') or k.startswith('search_') or k.startswith('history_'):
+            continue
+        if isinstance(v, (datetime.date, datetime.datetime)): data[k] = v.isoformat()
+        elif isinstance(v, (str, int, float, bool, list, dict)) or v is None: data[k] = v
+    return data
+
+
+def load_before(data, defaults):
+    state = dict(defaults)
+    for key, value in data.items():
+        if key in state:
+            if isinstance(state[key], datetime.date) and isinstance(value, str):
+                try: state[key] = datetime.datetime.strptime(value, '%Y-%m-%d').date()
+                except ValueError:
+                    try: state[key] = datetime.datetime.fromisoformat(value).date()
+                    except ValueError: pass
+            else:
+                state[key] = value
+    return state
+
+
+def timed(label, function, items):
+    gc.collect(); gc.disable() # comme timeit : le ramasse-miettes déclenché par les résultats accumulés fausserait la comparaison
+    try:
+        started = time.perf_counter()
+        results = [function(item) for item in items]
+        elapsed = time.perf_counter() - started
+    finally:
+        gc.enable()
+    print(f"{label:<34} {elapsed:6.2f} s  {len(items) / elapsed:9.0f} dossiers/s")
+    return results, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dossiers", type=int, default=20_000)
+    args = parser.parse_args(argv)
+    schema = DossierSchema(app.ADMIN_DOCS_LIST, app.MEDICAL_EXAMS_LIST, app.MINISTERE_DOCS_LIST)
+    rnd = random.Random(42)
+    states = [make_state(schema, rnd, i) for i in range(args.dossiers)]
+    defaults = dict(UI_STATE, **schema.default_state())
+
+    records_before, save_b = timed("enregistrement, avant", save_before, states)
+    records_after, save_a = timed("enregistrement, après (modèle)", lambda state: schema.to_record(schema.from_state(state)), states)
+    _, load_b = timed("chargement, avant", lambda data: load_before(data, defaults), records_before)
+    loaded, load_a = timed("chargement, après (modèle)", lambda data: schema.to_state(schema.from_record(data)), records_after)
+    assert all(loaded[i][key] == states[i][key] for i in range(len(states)) for key in schema.state_keys), "aller-retour différent"
+    print(f"Gain : enregistrement x{save_b / save_a:.1f}, chargement x{load_b / load_a:.1f} ; {len(records_before[0])} → {len(records_after[0])} clés enregistrées par dossier")
+
+
+if __name__ == "__main__":
+    main()
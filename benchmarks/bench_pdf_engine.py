@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Coût par rapport PDF : FPDF nu (police parsée et sous-ensemble recalculé à chaque rapport) vs report_engine.
+
+Usage (depuis le dossier de l'application, où se trouvent les polices DejaVu) :
+    python benchmarks/bench_pdf_engine.py [--reports 500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fpdf import FPDF
+
+import report_engine
+
+NOMS = ["El Fédini", "Benani", "Alaoui", "Zahraoui", "Ait Lhaj", "Bouchaïb", "Lahlou", "Chraïbi"]
+PRENOMS = ["Ali", "Sara", "Youssef", "Fatima-Zahra", "Anaïs", "Hélène", "Omar", "Noûr"]
+EXAMS = ["Echographie abdominale + images", "Echographie cardiaque + images", "Rx Thorax", "Antigène HLA I et II", "Bilan biologique + sérologies", "Observation médicale", "Myélogramme", "Caryotype hématologique", "Immunophénotypage", "FISH", "Biologie moléculaire"]
+
+
+class BaselinePDF(report_engine.PDF):
+    """Même mise en page, mais comportement d'avant report_engine : polices ajoutées (et parsées) dans chaque document,
+    sous-ensemble recalculé à chaque output()."""
+    def __init__(self, *args, **kwargs):
+        FPDF.__init__(self, *args, **kwargs)
+        self.base_font, self.font_styles = 'Arial', {'', 'B', 'I'}
+        for style, fname in report_engine.FONT_FILES.items():
+            if os.path.exists(fname):
+                self.add_font(report_engine.FONT_FAMILY, style, fname, uni=True)
+                self.base_font = report_engine.FONT_FAMILY
+        if self.base_font != 'Arial':
+            self.font_styles = {style for style, fname in report_engine.FONT_FILES.items() if os.path.exists(fname)}
+
+    _putfonts = FPDF._putfonts
+
+
+def make_sections(rnd, i):
+    return {
+        "Informations sur le Receveur": {"IPP": f"IPP{i:06d}", "Nom Complet": f"{rnd.choice(NOMS)} {rnd.choice(PRENOMS)}", "Date de Naissance": f"20{rnd.randint(0, 20):02d}-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}", "Sexe": rnd.choice(["Homme", "Femme"]), "Adresse": f"{rnd.randint(1, 300)} rue des Orangers, Casablanca", "Organisme Payeur": rnd.choice(["CNAM", "CNOPS", "AXA"])},
+        "Informations sur le Donneur": {"Nom Complet": f"{rnd.choice(NOMS)} {rnd.choice(PRENOMS)}", "Date de Naissance": "1990-01-01", "Sexe": rnd.choice(["Homme", "Femme"])},
+        "Statuts des Accords": {"Accord Tribunal": rnd.choice(["En cours", "Accordé"]), "Accord Ministère": "En cours", "Accord Organisme": "Refusé"},
+        "Check-list des Examens Médicaux": {exam: rnd.random() < 0.5 for exam in EXAMS},
+    }
+
+
+def render_with(pdf_class, sections):
+    pdf = pdf_class('P', 'mm', 'A4'); pdf.set_auto_page_break(auto=True, margin=15); pdf.add_page()
+    *info_sections, checklist_title = sections
+    for title in info_sections:
+        pdf.chapter_title(title); pdf.chapter_body(sections[title])
+    pdf.check_list(checklist_title, sections[checklist_title])
+    return pdf.output(dest='S')
+
+
+def run(label, render, batch):
+    started = time.perf_counter()
+    sizes = [len(render(sections)) for sections in batch]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:7.2f} s  {elapsed / len(batch) * 1000:7.2f} ms/rapport  {sum(sizes) / len(sizes) / 1024:6.1f} Ko/rapport")
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=500)
+    args = parser.parse_args(argv)
+    rnd = random.Random(42)
+    batch = [make_sections(rnd, i) for i in range(args.reports)]
+    if not os.path.exists(report_engine.FONT_FILES['']):
+        print(f"Attention : {report_engine.FONT_FILES['']} introuvable, les deux moteurs utiliseront Arial.")
+    before = run("avant (FPDF nu)", lambda sections: render_with(BaselinePDF, sections), batch)
+    after = run("après (report_engine)", report_engine.render_report, batch)
+    print(f"Gain : x{before / after:.1f} — sous-ensembles de police : {report_engine.subset_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
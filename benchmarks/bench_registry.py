@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Suite de benchmarks sur un registre synthétique : tableau de bord, recherche, chargement et rapport PDF.
+
+Pour chaque taille (1 000, 10 000, 100 000 dossiers par défaut), un processus séparé génère le registre
+(synthetic_registry, graine fixe) dans un répertoire de travail, s'y place, importe app et appelle
+directement les fonctions de l'application, sans serveur (mode "bare" de Streamlit : les widgets
+rendent leur valeur par défaut, st.rerun est sans effet) :
+
+    index_build       get_dossier_index() sans index existant (lecture de tous les dossiers) + index des noms
+    dashboard         render_dashboard_page() : comptage, page courante triée, table envoyée à st.dataframe
+    search_ipp        search_for_patient(IPP existant, "IPP")
+    search_name       search_for_patient(nom ou prénom mal orthographié, "Nom")
+    load_cold         load_patient_data() d'un dossier absent du cache
+    load_warm         load_patient_data() du même dossier, déjà en cache
+    pdf_cold          generate_pdf_report() d'un dossier jamais rendu
+    pdf_warm          generate_pdf_report() du même dossier (cache des rapports)
+
+Résultats : tableau à l'écran et fichier JSON (--output) avec, par taille et par chemin, le nombre
+de mesures, min, médiane, 95e centile et max en millisecondes, plus la version de Python, la plateforme
+et le commit : de quoi comparer deux exécutions et repérer une régression.
+
+Usage (depuis le dossier de l'application, où se trouvent les polices DejaVu) :
+    python benchmarks/bench_registry.py [--dossiers 1000 10000 100000] [--repeat 30] [--output bench_registry.json]
+    python benchmarks/bench_registry.py --workdir /tmp/registres   # registres gardés et réutilisés d'une exécution à l'autre
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+PATHS = ["index_build", "dashboard", "search_ipp", "search_name", "load_cold", "load_warm", "pdf_cold", "pdf_warm"]
+TYPOS = [lambda name: name.lower(), lambda name: name.replace("é", "e").replace("ï", "i"), lambda name: name[:-1], lambda name: name.replace(" ", "")]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, round(0.95 * (len(samples) - 1)))]
+    return {"runs": len(samples), "min_ms": samples[0] * 1000, "median_ms": statistics.median(samples) * 1000, "p95_ms": p95 * 1000, "max_ms": samples[-1] * 1000}
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def run_size(count, repeat, seed, workdir):
+    """Exécuté dans un processus à part (caches de Streamlit, index et watcher propres à chaque taille)."""
+    os.chdir(workdir)
+    for font in ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf", "DejaVuSans-Oblique.ttf"):
+        if os.path.exists(os.path.join(APP_DIR, font)) and not os.path.exists(font): shutil.copy(os.path.join(APP_DIR, font), font)
+    logging.disable(logging.WARNING) # import de app hors de `streamlit run`
+    import app
+    from dossier_index import INDEX_FILENAME
+    from synthetic_registry import generate_registry
+
+    schema = app.get_dossier_schema()
+    started = time.perf_counter()
+    ipps = generate_registry(app.BASE_UPLOAD_FOLDER, app.BLOB_STORE_FOLDER, schema, app.MEDICAL_EXAMS_LIST, count, seed)
+    generation_s = time.perf_counter() - started
+    for suffix in ("", "-wal", "-shm"): # index absent : index_build mesure une construction complète
+        try: os.remove(os.path.join(app.BASE_UPLOAD_FOLDER, INDEX_FILENAME + suffix))
+        except FileNotFoundError: pass
+
+    rnd = random.Random(seed)
+    samples = {path: [] for path in PATHS}
+    started = time.perf_counter()
+    index = app.get_dossier_index(); index.warm_up()
+    samples["index_build"].append(time.perf_counter() - started)
+    app.initialize_all_form_keys()
+    names = [row["receveur_nom"] for row in index.query_dossiers(limit=200)] + [row["receveur_prenom"] for row in index.query_dossiers(limit=200)]
+    cache, reports = app.get_dossier_cache(), app.get_report_cache()
+    for _ in range(repeat):
+        samples["dashboard"].append(timed(app.render_dashboard_page))
+        samples["search_ipp"].append(timed(app.search_for_patient, rnd.choice(ipps), "IPP"))
+        samples["search_name"].append(timed(app.search_for_patient, rnd.choice(TYPOS)(rnd.choice(names)), "Nom"))
+        ipp = rnd.choice(ipps)
+        cache.invalidate(ipp)
+        samples["load_cold"].append(timed(app.load_patient_data, ipp))
+        samples["load_warm"].append(timed(app.load_patient_data, ipp))
+        state = schema.to_state(schema.from_record(cache.load(ipp)))
+        reports.clear()
+        samples["pdf_cold"].append(timed(app.generate_pdf_report, state))
+        samples["pdf_warm"].append(timed(app.generate_pdf_report, state))
+    return {"dossiers": count, "generation_s": generation_s, "paths": {path: summarize(values) for path, values in samples.items()}}
+
+
+def git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dossiers", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=30, help="mesures par chemin (index_build : une seule)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_registry.json", help="fichier JSON des résultats")
+    parser.add_argument("--workdir", help="garde les registres générés dans ce dossier (sinon répertoire temporaire supprimé)")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS) # taille mesurée par le processus enfant
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        result = run_size(args.child, args.repeat, args.seed, args.workdir)
+        with open(args.child_output, 'w', encoding='utf-8') as f: json.dump(result, f)
+        return 0
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.dossiers:
+            workdir = os.path.join(args.workdir or tmp, f"registre-{count}-{args.seed}")
+            os.makedirs(workdir, exist_ok=True)
+            child_output = os.path.join(tmp, f"resultats-{count}.json")
+            command = [sys.executable, os.path.abspath(__file__), "--child", str(count), "--repeat", str(args.repeat), "--seed", str(args.seed), "--workdir", workdir, "--child-output", child_output]
+            child = subprocess.run(command, stderr=subprocess.PIPE, text=True) # bare mode : avertissements de Streamlit sur stderr, affichés seulement en cas d'échec
+            if child.returncode != 0:
+                print(f"{count:>7} dossiers : échec\n" + "\n".join(child.stderr.splitlines()[-20:]), file=sys.stderr)
+                return 1
+            with open(child_output, 'r', encoding='utf-8') as f: result = json.load(f)
+            results.append(result)
+            print(f"{count:>7} dossiers (générés en {result['generation_s']:.1f} s)")
+            for path, stats in result["paths"].items():
+                print(f"    {path:<12} médiane {stats['median_ms']:9.2f} ms   p95 {stats['p95_ms']:9.2f} ms   ({stats['runs']} mesure(s))")
+    report = {"suite": "registry", "created_at": datetime.datetime.now().isoformat(timespec='seconds'), "commit": git_commit(), "python": platform.python_version(),
+              "platform": platform.platform(), "seed": args.seed, "repeat": args.repeat, "results": results}
+    with open(args.output, 'w', encoding='utf-8') as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Résultats écrits dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
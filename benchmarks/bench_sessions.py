@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Charge mémoire de nombreuses sessions ouvertes en même temps : RSS du process et état de session estimé.
+
+Un processus neuf génère un registre synthétique (synthetic_registry), puis ouvre N sessions AppTest
+(100 par défaut) qui restent toutes vivantes, comme autant d'onglets de coordinateurs ouverts sur le
+même worker. Chaque session suit le parcours d'un coordinateur :
+
+    accueil (Nouveau Dossier, étape 1)
+    recherche par nom (nom mal orthographié)
+    recherche par IPP (préfixe de 8 caractères : jusqu'à 100 dossiers du registre)
+    ouverture d'un dossier trouvé (mode modification), puis étapes Médical et Confirmation
+
+Une session close par AppTest ne garde que son état (st.session_state, widgets compris, comme sur le
+serveur) ; l'arbre des éléments rendus, que le serveur ne garde pas, est libéré. Mesures :
+
+    rss_base          RSS après une session d'échauffement (modules, caches et index chargés)
+    rss_sessions      RSS avec les N sessions ouvertes
+    per_session       (rss_sessions - rss_base) / N, et taille estimée de l'état d'une session
+                      (session_memory.state_sizes : moyenne, max, clés les plus lourdes)
+
+Pour comparer avec une version antérieure de l'application (« avant ») :
+    git worktree add /tmp/avant <commit>
+    python benchmarks/bench_sessions.py --app-dir /tmp/avant
+
+Usage (depuis le dossier de l'application) :
+    python benchmarks/bench_sessions.py [--sessions 100] [--dossiers 2000] [--app-dir DOSSIER] [--output bench_sessions.json]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_registry import TYPOS
+from bench_startup import APP_DIR, make_workdir
+
+
+def click(at, label):
+    next(b for b in at.button if b.label == label).click() # premier bouton de ce libellé
+    at.run()
+
+
+def open_session(app_dir, rnd, ipps, names):
+    """Parcours d'un coordinateur ; retourne l'état de la session (l'AppTest et son arbre d'éléments sont libérés)."""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(app_dir, "app.py"), default_timeout=120)
+    at.run()
+    at.session_state.active_page = "Rechercher / Modifier"; at.run()
+    for query, search_by in ((rnd.choice(TYPOS)(rnd.choice(names)), "Nom"), (rnd.choice(ipps)[:8], "IPP")):
+        at.session_state.search_query, at.session_state.search_by = query, search_by # valeurs par défaut des deux champs, sans clé
+        click(at, "Lancer la recherche")
+        assert at.session_state.search_results, f"aucun résultat pour {query!r}"
+    click(at, "Modifier ce dossier")
+    for step in (3, 6):
+        at.session_state.current_step = step; at.run()
+    assert not at.exception, [e.value for e in at.exception]
+    assert at.session_state.edit_mode, "dossier non ouvert"
+    return at.session_state
+
+
+def rss():
+    from session_memory import process_rss
+    gc.collect()
+    return process_rss()
+
+
+def measure(app_dir, sessions, dossiers, seed):
+    """Exécuté dans un processus neuf : résultats en octets."""
+    logging.disable(logging.WARNING) # app hors de `streamlit run`
+    make_workdir()
+    sys.path.insert(0, app_dir) # l'application mesurée d'abord ; ce dépôt (ajouté par bench_registry) fournit session_memory s'il y manque
+    import app
+    from session_memory import state_sizes
+    from synthetic_registry import generate_registry
+    schema = app.get_dossier_schema()
+    ipps = generate_registry(app.BASE_UPLOAD_FOLDER, app.BLOB_STORE_FOLDER, schema, app.MEDICAL_EXAMS_LIST, dossiers, seed)
+    index = app.get_dossier_index(); index.warm_up()
+    names = [row["receveur_nom"] for row in index.query_dossiers(limit=200)] + [row["receveur_prenom"] for row in index.query_dossiers(limit=200)]
+    rnd = random.Random(seed)
+    open_session(app_dir, rnd, ipps, names) # échauffement : imports, caches, polices
+    base = rss()
+    states = [open_session(app_dir, rnd, ipps, names) for _ in range(sessions)]
+    total = rss()
+    sizes = [state_sizes(state) for state in states]
+    keys = {}
+    for session in sizes:
+        for key, size in session.items(): keys[key] = keys.get(key, 0) + size
+    heaviest = sorted(keys.items(), key=lambda item: item[1], reverse=True)[:8]
+    return {"sessions": sessions, "dossiers": dossiers, "rss_base": base, "rss_sessions": total, "rss_per_session": (total - base) / sessions,
+            "state_mean": statistics.mean(sum(s.values()) for s in sizes), "state_max": max(sum(s.values()) for s in sizes),
+            "keys_mean": statistics.mean(len(s) for s in sizes), "heaviest_keys": {key: size / sessions for key, size in heaviest}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100, help="sessions ouvertes en même temps")
+    parser.add_argument("--dossiers", type=int, default=2000, help="taille du registre synthétique")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--app-dir", default=APP_DIR, help="dossier de l'application mesurée (par défaut : ce dépôt)")
+    parser.add_argument("--output", help="écrit aussi les résultats dans ce fichier JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    app_dir = os.path.abspath(args.app_dir)
+
+    if args.child:
+        print(json.dumps(measure(app_dir, args.sessions, args.dossiers, args.seed))); return 0
+
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--sessions", str(args.sessions), "--dossiers", str(args.dossiers), "--seed", str(args.seed), "--app-dir", app_dir]
+    child = subprocess.run(command, capture_output=True, text=True) # processus neuf : RSS de départ comparable d'une version à l'autre
+    if child.returncode != 0: raise SystemExit(child.stderr[-2000:])
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    mb = 1024 * 1024
+    print(f"Application : {app_dir} — registre de {result['dossiers']} dossiers")
+    print(f"RSS après échauffement       {result['rss_base'] / mb:8.1f} Mo")
+    print(f"RSS, {result['sessions']} sessions ouvertes  {result['rss_sessions'] / mb:8.1f} Mo")
+    print(f"RSS par session              {result['rss_per_session'] / 1024:8.1f} Ko")
+    print(f"État de session estimé       {result['state_mean'] / 1024:8.1f} Ko en moyenne, {result['state_max'] / 1024:.1f} Ko au plus ({result['keys_mean']:.0f} clés)")
+    print("Clés les plus lourdes (moyenne par session) : " + ", ".join(f"{key} {size / 1024:.1f} Ko" for key, size in result["heaviest_keys"].items()))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f: json.dump(dict(result, app_dir=app_dir), f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Démarrage de l'application : premier affichage dans un process neuf, et coût fixe de chaque rerun.
+
+Chaque mesure à froid tourne dans un interpréteur neuf (comme un worker qui redémarre après un
+déploiement). streamlit est importé d'abord (le serveur l'a déjà chargé), puis AppTest exécute app.py :
+
+    first_paint     premier rerun : imports de l'application + page d'accueil (Nouveau Dossier, étape 1)
+    warm_rerun      rerun suivant de la même page
+    <page>          première visite de chaque autre page (modules chargés à ce moment-là compris)
+
+Le coût fixe d'un rerun est mesuré à part, dans le même interpréteur une fois tout chargé :
+exécution du haut de app.py (imports déjà en cache, constantes, définitions des fonctions et des
+décorateurs), sans main().
+
+Note : le menu latéral (streamlit_option_menu, composant Streamlit) charge pandas et pyarrow dès son
+premier appel ; ils restent donc dans la liste des modules chargés au premier affichage.
+
+Usage (depuis le dossier de l'application) :
+    python benchmarks/bench_startup.py [--runs 5] [--output bench_startup.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "PIL", "fpdf", "pypdf", "qrcode", "dateutil"]
+PAGES = ["Tableau de Bord", "Statistiques", "Rechercher / Modifier"]
+
+
+def make_workdir():
+    """Répertoire de travail vide (registre sans dossier) avec les ressources de l'application : feuille de style, logos, polices."""
+    workdir = tempfile.mkdtemp()
+    for name in os.listdir(APP_DIR):
+        if name == "assets" or name.endswith((".png", ".ttf")): os.symlink(os.path.join(APP_DIR, name), os.path.join(workdir, name))
+    os.chdir(workdir)
+    return workdir
+
+
+def measure_cold():
+    """Exécuté dans un interpréteur neuf : durées en secondes et modules lourds chargés au premier affichage."""
+    workdir = make_workdir()
+    started = time.perf_counter()
+    import streamlit # noqa: F401 (déjà chargé par le serveur : compté à part)
+    from streamlit.testing.v1 import AppTest
+    result = {"import_streamlit": time.perf_counter() - started}
+    at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=120)
+    started = time.perf_counter(); at.run()
+    result["first_paint"] = time.perf_counter() - started
+    result["heavy_modules_after_first_paint"] = [name for name in HEAVY_MODULES if name in sys.modules]
+    started = time.perf_counter(); at.run()
+    result["warm_rerun"] = time.perf_counter() - started
+    for page in PAGES:
+        at.session_state.active_page = page
+        started = time.perf_counter(); at.run()
+        result[page] = time.perf_counter() - started
+    assert not at.exception, [e.value for e in at.exception]
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def measure_rerun_overhead(repeat):
+    """Haut de app.py exécuté `repeat` fois, modules déjà importés ; durées en secondes."""
+    import logging
+    logging.disable(logging.WARNING) # app hors de `streamlit run`
+    workdir = make_workdir(); sys.path.insert(0, APP_DIR)
+    path = os.path.join(APP_DIR, "app.py")
+    with open(path, 'r', encoding='utf-8') as f: code = compile(f.read(), path, "exec")
+    samples = []
+    for _ in range(repeat + 1): # la première exécution importe les modules
+        started = time.perf_counter()
+        exec(code, {"__name__": "app_rerun", "__file__": path})
+        samples.append(time.perf_counter() - started)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return samples[1:]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="interpréteurs neufs pour les mesures à froid")
+    parser.add_argument("--reruns", type=int, default=200, help="exécutions du haut de app.py pour le coût fixe d'un rerun")
+    parser.add_argument("--output", help="écrit aussi les résultats dans ce fichier JSON")
+    parser.add_argument("--child", choices=("cold", "rerun"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child == "cold":
+        print(json.dumps(measure_cold())); return 0
+    if args.child == "rerun":
+        print(json.dumps(measure_rerun_overhead(args.reruns))); return 0
+
+    def child(kind):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", kind, "--reruns", str(args.reruns)], capture_output=True, text=True)
+        if output.returncode != 0: raise SystemExit(output.stderr[-2000:])
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    colds = [child("cold") for _ in range(args.runs)]
+    reruns = child("rerun")
+    results = {"runs": args.runs, "heavy_modules_after_first_paint": colds[-1]["heavy_modules_after_first_paint"], "cold_ms": {}, "rerun_overhead_ms": {"median": statistics.median(reruns) * 1000, "min": min(reruns) * 1000}}
+    for key in ["import_streamlit", "first_paint", "warm_rerun"] + PAGES:
+        results["cold_ms"][key] = statistics.median(run[key] for run in colds) * 1000
+        print(f"{key:<24} {results['cold_ms'][key]:8.0f} ms (médiane de {args.runs} process)")
+    print(f"{'rerun (coût fixe)':<24} {results['rerun_overhead_ms']['median']:8.2f} ms (médiane de {len(reruns)} exécutions)")
+    print("Modules lourds chargés au premier affichage : " + (", ".join(results["heavy_modules_after_first_paint"]) or "aucun"))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f: json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
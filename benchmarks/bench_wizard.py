@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Saisie d'un dossier complet dans l'assistant (Nouveau Dossier) : reruns déclenchés et temps passé à ré-exécuter le script.
+
+AppTest rejoue la saisie d'un coordinateur, étape par étape, en envoyant au serveur ce que le navigateur enverrait :
+  - un widget hors formulaire déclenche un rerun à chaque valeur validée (Entrée, perte du focus, clic) ;
+  - dans un st.form, rien n'est envoyé avant un bouton d'envoi (Précédent / Suivant de l'étape) ;
+  - dans un st.fragment, seule la fonction du fragment est ré-exécutée : compté à part, la barre latérale,
+    le menu, le CSS et le pied de page ne sont pas relancés (AppTest, lui, exécute tout le script).
+
+Les exécutions du script sont comptées au niveau du ScriptRunner de Streamlit : les st.rerun() de
+l'application (second rerun après un clic sur Suivant, par exemple) sont inclus.
+
+Usage (depuis le dossier de l'application) :
+    python benchmarks/bench_wizard.py [--dossiers 5]
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_startup import APP_DIR, make_workdir
+
+STEPS = ["Receveur", "Donneur", "Tribunaux", "Médical", "Ministère", "Organisme", "Confirmation"]
+
+
+def personne(prefix, suffix, n):
+    """(type de widget, libellé, valeur) des champs d'une personne, dans l'ordre de saisie."""
+    return [("text_input", "Nom" + suffix, f"Alaoui{n}"), ("text_input", "Prénom" + suffix, "Sara"), ("date_input", "Date de Naissance" + suffix, datetime.date(1990, 5, 17)),
+            ("radio", "Sexe" + suffix, "Femme"), ("selectbox", "Groupage Sanguin" + suffix.replace(" du ", " "), "O+"), ("text_input", "Contact Principal", "0612345678"),
+            ("selectbox", "Organisme Payeur", "CNOPS"), ("text_area", "Adresse" + suffix.replace(" du ", " "), "12 rue des Orangers, Rabat"),
+            ("text_input", f"Nom du Père du {prefix}", "Alaoui Omar"), ("text_input", f"Nom de la Mère du {prefix}", "Tazi Rim"),
+            ("number_input", f"Âge du Père du {prefix}", 61), ("number_input", f"Âge de la Mère du {prefix}", 58)]
+
+
+def scenario(n):
+    """Champs renseignés à chaque étape."""
+    return [[("text_input", "IPP", f"BENCH{n:04d}")] + personne("Receveur", "", n),
+            personne("donneur", " du Donneur", n),
+            [("selectbox", "Statut de l'accord du Tribunal", "Accordé")],
+            [],
+            [("selectbox", "Statut de l'accord", "Accordé")],
+            [("selectbox", "Statut de l'accord", "Accordé"), ("date_input", "Date de validation de l'accord", datetime.date(2024, 3, 1))],
+            []]
+
+
+class Counter:
+    """Compte les exécutions du script (événements SCRIPT_STARTED, st.rerun() compris) et le temps passé dans AppTest.run."""
+
+    def __init__(self):
+        from streamlit.runtime.scriptrunner.script_runner import ScriptRunner, ScriptRunnerEvent
+        self.executions = 0
+        def count(sender, event, **kwargs):
+            if event == ScriptRunnerEvent.SCRIPT_STARTED: self.executions += 1
+        init = ScriptRunner.__init__
+        def counted_init(runner, *args, **kwargs):
+            init(runner, *args, **kwargs)
+            runner.on_event.connect(count, weak=False)
+        ScriptRunner.__init__ = counted_init
+
+    def run(self, at):
+        """(exécutions du script, secondes) pour un AppTest.run()."""
+        before, started = self.executions, time.perf_counter()
+        at.run()
+        assert not at.exception, [e.value for e in at.exception]
+        return self.executions - before, time.perf_counter() - started
+
+
+def in_fragment(at):
+    # Le contenu de l'étape est-il rendu dans un st.fragment ? (fragments enregistrés par le dernier rerun)
+    return bool(at._fragment_storage._fragments)
+
+
+def fill_dossier(counter, n):
+    """Saisit un dossier complet ; retourne les compteurs par étape."""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=120)
+    counter.run(at)
+    steps = []
+    for step, fields in enumerate(scenario(n)):
+        stats = {"step": STEPS[step], "full": 0, "fragment": 0, "deferred": 0, "full_s": 0.0}
+        def send(executions, seconds, fragment):
+            # Widget d'un fragment : la première exécution n'aurait relancé que le fragment (un st.rerun() qui suit relance tout)
+            stats["fragment"] += fragment; stats["full"] += executions - fragment
+            stats["full_s"] += seconds * (executions - fragment) / executions
+        for kind, label, value in fields:
+            widget = next(w for w in getattr(at, kind) if w.label == label)
+            if kind in ("text_input", "text_area"): widget.input(value)
+            else: widget.set_value(value)
+            if widget.form_id: stats["deferred"] += 1; continue # envoyé avec le formulaire
+            send(*counter.run(at), in_fragment(at))
+        button = "Suivant →" if step < len(STEPS) - 1 else "Générer et Enregistrer le Dossier"
+        next(b for b in at.button if b.label == button).click()
+        send(*counter.run(at), False)
+        steps.append(stats)
+    assert at.session_state.receveur_ipp == f"BENCH{n:04d}" and os.path.isdir(os.path.join("patient_uploads_allogreffe", f"BENCH{n:04d}")), "dossier non enregistré"
+    return steps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dossiers", type=int, default=5, help="dossiers saisis (après un premier dossier d'échauffement, non compté)")
+    args = parser.parse_args(argv)
+    import logging
+    logging.disable(logging.WARNING)
+    make_workdir()
+    counter = Counter()
+    fill_dossier(counter, 0) # imports, caches et polices chargés une fois
+    runs = [fill_dossier(counter, n) for n in range(1, args.dossiers + 1)]
+    print(f"{'Étape':<14}{'reruns complets':>17}{'reruns fragment':>17}{'champs groupés':>16}{'temps reruns':>15}")
+    for i, step in enumerate(STEPS):
+        full, fragment, deferred = (runs[0][i][key] for key in ("full", "fragment", "deferred"))
+        seconds = statistics.median(run[i]["full_s"] for run in runs)
+        print(f"{step:<14}{full:>17}{fragment:>17}{deferred:>16}{seconds * 1000:>12.0f} ms")
+    full = sum(step["full"] for step in runs[0]); fragment = sum(step["fragment"] for step in runs[0])
+    seconds = statistics.median(sum(step["full_s"] for step in run) for run in runs)
+    print(f"Par dossier : {full} rerun(s) complet(s), {fragment} rerun(s) de fragment, {seconds * 1000:.0f} ms de reruns complets (médiane de {args.dossiers} dossiers)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
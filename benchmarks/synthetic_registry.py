@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Registre synthétique pour les benchmarks : N dossiers réalistes générés avec une graine fixe.
+
+Chaque dossier a son fichier (dossier_format), un journal de 1 à 4 versions (dossier_store) avec des
+accords obtenus au fil des mois, une check-list d'examens cochée au hasard, et environ un tiers des
+pièces jointes renseignées : références vers un petit jeu de blobs factices partagés (magasin adressé
+par contenu, comme upload_store) et leur manifeste uploads.json. Noms et prénoms accentués, dates de
+naissance de 1950 à 2020.
+
+L'écriture n'est pas durable (pas de fsync) : le but est de produire vite des dizaines de milliers
+de dossiers, pas de mesurer la sauvegarde.
+"""
+import datetime
+import hashlib
+import json
+import os
+import random
+
+from dossier_format import encode_dossier
+from dossier_index import DOSSIER_FILENAME
+from dossier_model import Dossier, checklist_item_key
+from dossier_store import ACCORD_FIELDS, HISTORY_FILENAME
+from upload_store import UPLOADS_MANIFEST
+
+NOMS = ["El Fédini", "Benani", "Alaoui", "Zahraoui", "Ait Lhaj", "Bouchaïb", "Lahlou", "Chraïbi", "Bennis", "Tazi", "El Ouazzani", "Bérrada", "Kettani", "Amraoui", "Lévy", "Saïdi"]
+PRENOMS = ["Ali", "Sara", "Youssef", "Fatima-Zahra", "Anaïs", "Hélène", "Omar", "Noûr", "Rim", "Mehdi", "Inès", "Zakaria", "Loubna", "Réda", "Salmâ", "Hamza"]
+SEXES = ["Homme", "Femme"]
+GROUPAGES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+ORGANISMES = ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"]
+STATUTS = ["En cours", "Accordé", "Refusé"]
+VILLES = ["Casablanca", "Rabat", "Fès", "Marrakech", "Tanger", "Agadir", "Oujda", "Meknès"]
+START = datetime.datetime(2019, 1, 1)
+MARKER = ".registre_synthetique.json"
+BLOBS = 24 # pièces jointes factices distinctes, partagées par tous les dossiers
+UPLOAD_CATEGORIES = {"admin": "tribunal", "ministere": "ministere"} # check-list -> catégorie de uploads.json (comme les pages Tribunaux et Ministère)
+
+
+def _birth(rnd, first_year, last_year):
+    return datetime.date(first_year, 1, 1) + datetime.timedelta(days=rnd.randint(0, (last_year - first_year) * 365))
+
+
+def make_blobs(blob_folder, rnd):
+    """Écrit les blobs factices (petits PDF et PNG) ; retourne leurs références sans nom ni catégorie."""
+    blobs = []
+    for i in range(BLOBS):
+        is_pdf = i % 3 != 0
+        header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n" if is_pdf else b"\x89PNG\r\n\x1a\n"
+        content = header + rnd.randbytes(rnd.randint(20_000, 400_000))
+        digest = hashlib.sha256(content).hexdigest()
+        os.makedirs(os.path.join(blob_folder, digest[:2]), exist_ok=True)
+        with open(os.path.join(blob_folder, digest[:2], digest), 'wb') as f: f.write(content)
+        blobs.append({"sha256": digest, "size": len(content), "type": "application/pdf" if is_pdf else "image/png", "ext": ".pdf" if is_pdf else ".png"})
+    return blobs
+
+
+def make_dossier(rnd, i, medical_exams):
+    """(ipp, dossier) ; receveur enfant ou adulte, donneur adulte de la même fratrie."""
+    dossier = Dossier(f"IPP{i:07d}")
+    family = rnd.choice(NOMS)
+    for person, years in ((dossier.receveur, (1950, 2020)), (dossier.donneur, (1950, 2005))):
+        person.nom, person.prenom = family, rnd.choice(PRENOMS)
+        person.date_naissance = _birth(rnd, *years)
+        person.adresse = f"{rnd.randint(1, 300)} rue des Orangers, {rnd.choice(VILLES)}"
+        person.sexe, person.groupage, person.organisme = rnd.choice(SEXES), rnd.choice(GROUPAGES), rnd.choice(ORGANISMES)
+        person.contact_principal = f"06{rnd.randint(0, 99_999_999):08d}"
+        person.nom_pere, person.nom_mere = f"{family} {rnd.choice(PRENOMS)}", f"{rnd.choice(NOMS)} {rnd.choice(PRENOMS)}"
+        person.age_pere, person.age_mere = rnd.randint(40, 90), rnd.randint(38, 88)
+    dossier.accords.organisme = dossier.receveur.organisme
+    dossier.checklists["medical"] = {exam: rnd.random() < 0.6 for exam in medical_exams}
+    return dossier
+
+
+def make_uploads(schema, rnd, blobs):
+    """Références de uploads.json : environ un tiers des documents des check-lists Tribunaux et Ministère."""
+    uploads = []
+    for name, items in schema.checklists:
+        if name not in UPLOAD_CATEGORIES: continue
+        for item in items:
+            if rnd.random() < 0.3:
+                blob = rnd.choice(blobs)
+                uploads.append({"name": f"{checklist_item_key(name, item)}{blob['ext']}", "category": UPLOAD_CATEGORIES[name], "sha256": blob["sha256"], "size": blob["size"], "type": blob["type"], "ingested_at": "2024-01-01T00:00:00"})
+    return uploads
+
+
+def _history(rnd, record):
+    """Journal de 1 à 4 versions : création, puis accords obtenus (ou refusés) au fil du temps."""
+    at = START + datetime.timedelta(minutes=rnd.randint(0, 6 * 365 * 24 * 60))
+    first = dict(record, **{field: "En cours" for field in ACCORD_FIELDS})
+    entries = [{"v": 1, "at": at.isoformat(timespec='seconds'), "set": first}]
+    for field in ACCORD_FIELDS:
+        status = rnd.choice(STATUTS)
+        record[field] = status
+        if status != "En cours":
+            at += datetime.timedelta(days=rnd.expovariate(1 / 40))
+            entries.append({"v": len(entries) + 1, "at": at.isoformat(timespec='seconds'), "set": {field: status}})
+    return entries
+
+
+def generate_registry(base_folder, blob_folder, schema, medical_exams, count, seed=42):
+    """Écrit `count` dossiers dans `base_folder` ; un registre déjà généré avec les mêmes paramètres est réutilisé.
+
+    Retourne la liste des IPP.
+    """
+    ipps = [f"IPP{i:07d}" for i in range(count)]
+    params = {"count": count, "seed": seed, "keys": len(schema.state_keys)}
+    try:
+        with open(os.path.join(base_folder, MARKER), 'r', encoding='utf-8') as f:
+            if json.load(f) == params: return ipps
+    except (OSError, ValueError):
+        pass
+    rnd = random.Random(seed)
+    os.makedirs(base_folder, exist_ok=True)
+    blobs = make_blobs(blob_folder, rnd)
+    for i in range(count):
+        dossier = make_dossier(rnd, i, medical_exams); uploads = make_uploads(schema, rnd, blobs)
+        record = schema.to_record(dossier)
+        entries = _history(rnd, record)
+        folder = os.path.join(base_folder, dossier.ipp)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, DOSSIER_FILENAME), 'wb') as f: f.write(encode_dossier(record, DOSSIER_FILENAME))
+        with open(os.path.join(folder, HISTORY_FILENAME), 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n" for entry in entries)
+        if uploads:
+            with open(os.path.join(folder, UPLOADS_MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump(uploads, f, ensure_ascii=False)
+    with open(os.path.join(base_folder, MARKER), 'w', encoding='utf-8') as f: json.dump(params, f)
+    return ipps
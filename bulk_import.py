@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""Import en lot de dossiers depuis un fichier CSV ou Excel (une ligne par receveur).
+
+Usage (depuis le dossier de l'application) :
+    python bulk_import.py dossiers.csv                       # crée les dossiers des lignes valides
+    python bulk_import.py dossiers.xlsx --update             # met aussi à jour les IPP déjà enregistrés
+    python bulk_import.py dossiers.csv --dry-run --errors erreurs.csv
+
+Les en-têtes sont les libellés du formulaire ("IPP", "Nom", "Groupage Sanguin", "Sexe du Donneur"...,
+voir IMPORT_LABELS ; casse et accents indifférents) ou directement les clés des dossiers (receveur_nom...).
+
+La validation porte sur des colonnes entières (pandas) : IPP manquants, en double dans le fichier ou
+déjà enregistrés, dates illisibles ou futures, âges, et valeurs hors liste (sexe, groupage sanguin,
+organisme payeur, statuts des accords). Chaque valeur fautive donne une ligne d'erreur
+(ligne du fichier, colonne, valeur, message) ; une ligne avec au moins une erreur n'est pas importée,
+les autres le sont. Un champ vide garde la valeur par défaut du formulaire (ou, avec --update,
+la valeur déjà enregistrée).
+
+Les dossiers valides sont écrits par lots de BATCH_SIZE : sauvegardes (dossier_store.save_dossier,
+avec leur journal) en parallèle sur un pool de threads, puis une seule transaction SQLite par lot
+pour l'index des dossiers.
+"""
+import argparse
+import datetime
+import io
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from dossier_format import read_dossier_file
+from dossier_index import find_dossier_file
+from dossier_store import save_dossier
+from name_search import normalize_name
+
+BATCH_SIZE = 500
+IMPORT_WORKERS = 8 # sauvegardes simultanées : le temps est surtout passé dans les fsync
+IMPORT_AUTHOR = "import"
+# mêmes listes que dans app.py (non importé : inutile de charger Streamlit ici)
+SEXES = ["Homme", "Femme"]
+GROUPAGES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+ORGANISMES = ["PAYANT", "CNAM", "CNOPS", "AXA", "FAR- Sociales", "Autre"]
+STATUTS = ["En cours", "Accordé", "Refusé"]
+
+IMPORT_LABELS = {
+    "receveur_ipp": "IPP", "receveur_nom": "Nom", "receveur_prenom": "Prénom", "receveur_date_naissance": "Date de Naissance",
+    "receveur_sexe": "Sexe", "receveur_groupage": "Groupage Sanguin", "receveur_contact_principal": "Contact Principal",
+    "receveur_organisme": "Organisme Payeur", "receveur_adresse": "Adresse",
+    "receveur_nom_pere": "Nom du Père du Receveur", "receveur_age_pere": "Âge du Père du Receveur",
+    "receveur_nom_mere": "Nom de la Mère du Receveur", "receveur_age_mere": "Âge de la Mère du Receveur",
+    "donneur_nom": "Nom du Donneur", "donneur_prenom": "Prénom du Donneur", "donneur_date_naissance": "Date de Naissance du Donneur",
+    "donneur_sexe": "Sexe du Donneur", "donneur_groupage": "Groupage Sanguin Donneur", "donneur_contact_principal": "Contact Principal Donneur",
+    "donneur_organisme": "Organisme Payeur Donneur", "donneur_adresse": "Adresse Donneur",
+    "donneur_nom_pere": "Nom du Père du Donneur", "donneur_age_pere": "Âge du Père du Donneur",
+    "donneur_nom_mere": "Nom de la Mère du Donneur", "donneur_age_mere": "Âge de la Mère du Donneur",
+    "accord_tribunal": "Accord Tribunal", "accord_ministere": "Accord Ministère", "organisme_accord": "Organisme de l'Accord",
+    "organisme_accord_statut": "Accord Organisme", "organisme_accord_nom_specifique": "Nom Spécifique de l'Organisme",
+    "organisme_accord_date_validation": "Date de validation de l'accord",
+}
+REQUIRED_KEYS = ("receveur_ipp", "receveur_nom")
+BIRTH_DATE_KEYS = ("receveur_date_naissance", "donneur_date_naissance")
+ERROR_COLUMNS = ["Ligne", "Colonne", "Valeur", "Erreur"]
+FIRST_DATA_LINE = 2 # ligne 1 : les en-têtes
+_FORBIDDEN_IPP = r"[^/\\:*?\"<>|\x00-\x1f]+" # l'IPP devient un nom de dossier
+
+
+def template_csv():
+    """En-têtes attendus, en CSV (modèle à remplir)."""
+    return pd.DataFrame(columns=list(IMPORT_LABELS.values())).to_csv(index=False).encode('utf-8-sig')
+
+
+def read_rows(source, filename=None):
+    """DataFrame de texte (cellules vides = "") depuis un chemin ou un fichier ouvert (téléversement Streamlit)."""
+    filename = filename or getattr(source, "name", None) or str(source)
+    if hasattr(source, "seek"): source.seek(0) # fichier téléversé déjà lu par une vérification précédente
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        frame = pd.read_excel(source, dtype=str, keep_default_na=False) # openpyxl nécessaire
+    else:
+        if hasattr(source, "read"): raw = source.read()
+        else:
+            with open(source, 'rb') as f: raw = f.read()
+        header = raw.split(b"\n", 1)[0]
+        sep = ";" if header.count(b";") > header.count(b",") else "," # Excel en français enregistre ses CSV avec des points-virgules
+        frame = pd.read_csv(io.BytesIO(raw), dtype=str, keep_default_na=False, sep=sep, encoding="utf-8-sig")
+    frame.index = pd.RangeIndex(FIRST_DATA_LINE, FIRST_DATA_LINE + len(frame)) # index = numéro de ligne dans le fichier
+    return frame
+
+
+def map_columns(frame, keys):
+    """(DataFrame renommé en clés de dossier, en-têtes ignorés) ; `keys` : clés acceptées."""
+    by_label = {normalize_name(label): key for key, label in IMPORT_LABELS.items() if key in keys}
+    by_label.update({normalize_name(key): key for key in keys})
+    renamed, ignored = {}, []
+    for column in frame.columns:
+        key = by_label.get(normalize_name(column))
+        if key is None or key in renamed.values(): ignored.append(str(column))
+        else: renamed[column] = key
+    return frame[list(renamed)].rename(columns=renamed), ignored
+
+
+def _choices(values):
+    """{forme normalisée: valeur canonique} : "homme", "HOMME" et " Homme" donnent "Homme"."""
+    return {normalize_name(value): value for value in values} | {value.upper(): value for value in values}
+
+
+class _Errors:
+    def __init__(self):
+        self.frames = []
+
+    def add(self, frame, key, mask, message):
+        if mask.any():
+            self.frames.append(pd.DataFrame({"Ligne": frame.index[mask], "Colonne": IMPORT_LABELS.get(key, key), "Valeur": frame.loc[mask, key], "Erreur": message}))
+
+    def frame(self):
+        if not self.frames: return pd.DataFrame(columns=ERROR_COLUMNS)
+        return pd.concat(self.frames, ignore_index=True).sort_values(["Ligne", "Colonne"], kind="stable", ignore_index=True)
+
+
+def _canonical(column, values, synonyms=None):
+    """Colonne ramenée aux valeurs de la liste (NaN si hors liste) ; la correspondance n'est calculée qu'une fois par valeur distincte."""
+    choices = _choices(values) | (synonyms or {})
+    uniques = column.unique()
+    mapping = {value: choices.get(value.upper(), choices.get(normalize_name(value))) for value in uniques}
+    return column.map(mapping)
+
+
+def _parse_dates(column):
+    dates = pd.to_datetime(column, format="ISO8601", errors="coerce") # AAAA-MM-JJ, avec ou sans heure (cellules date d'Excel)
+    retry = dates.isna() & (column != "")
+    if retry.any(): dates[retry] = pd.to_datetime(column[retry], format="%d/%m/%Y", errors="coerce")
+    return dates
+
+
+def validate_rows(frame, existing=(), update_existing=False, organismes=ORGANISMES, statuts=STATUTS, today=None):
+    """(lignes valides, erreurs).
+
+    `frame` : sortie de map_columns ; `existing` : IPP déjà enregistrés. Les lignes valides ont leurs
+    valeurs ramenées à la forme du formulaire (dates ISO, âges entiers, libellés exacts des listes).
+    """
+    today = pd.Timestamp(today or datetime.date.today())
+    frame = frame.apply(lambda column: column.str.strip())
+    errors = _Errors()
+    values = frame.copy()
+    for key in REQUIRED_KEYS:
+        if key not in frame: frame[key] = values[key] = ""
+        errors.add(frame, key, frame[key] == "", "valeur obligatoire")
+
+    ipp = frame["receveur_ipp"]
+    filled = ipp != ""
+    errors.add(frame, "receveur_ipp", filled & ~ipp.str.fullmatch(_FORBIDDEN_IPP) | ipp.str.startswith("."), "caractères interdits dans un IPP")
+    errors.add(frame, "receveur_ipp", filled & ipp.duplicated(keep=False), "IPP en double dans le fichier")
+    if not update_existing:
+        errors.add(frame, "receveur_ipp", filled & ipp.isin(existing), "IPP déjà enregistré (cocher la mise à jour des dossiers existants)")
+
+    enumerations = {"sexe": (SEXES, {"H": "Homme", "M": "Homme", "F": "Femme"}), "groupage": (GROUPAGES, None), "organisme": (organismes, None)}
+    for key in frame.columns:
+        column, filled = frame[key], frame[key] != ""
+        field = key.split("_", 1)[1] if key.startswith(("receveur_", "donneur_")) else key
+        if key == "organisme_accord" or field in enumerations:
+            allowed, synonyms = enumerations["organisme" if key == "organisme_accord" else field]
+            values[key] = _canonical(column, allowed, synonyms)
+            errors.add(frame, key, filled & values[key].isna(), "valeur hors liste : " + ", ".join(allowed))
+        elif key in ("accord_tribunal", "accord_ministere", "organisme_accord_statut"):
+            values[key] = _canonical(column, statuts)
+            errors.add(frame, key, filled & values[key].isna(), "statut hors liste : " + ", ".join(statuts))
+        elif key.endswith(("date_naissance", "date_validation")):
+            dates = _parse_dates(column)
+            errors.add(frame, key, filled & dates.isna(), "date illisible (AAAA-MM-JJ ou JJ/MM/AAAA)")
+            if key in BIRTH_DATE_KEYS:
+                errors.add(frame, key, (dates > today) | (dates.dt.year < 1900), "date de naissance impossible")
+            values[key] = dates.dt.strftime("%Y-%m-%d")
+        elif key.endswith(("age_pere", "age_mere")):
+            ages = pd.to_numeric(column, errors="coerce")
+            errors.add(frame, key, filled & ~(ages.between(0, 120) & (ages % 1 == 0)), "âge invalide (entier de 0 à 120)")
+            values[key] = ages
+        values.loc[~filled, key] = None # vide : valeur par défaut ou déjà enregistrée
+
+    errors = errors.frame()
+    return values[~values.index.isin(errors["Ligne"])], errors
+
+
+def _records(valid):
+    """{IPP: {clé: valeur}} sans les cellules vides ; âges en int."""
+    ages = [key for key in valid.columns if key.endswith(("age_pere", "age_mere"))]
+    records = {}
+    for row in valid.to_dict("records"):
+        record = {key: value for key, value in row.items() if value is not None and value == value}
+        for key in ages:
+            if key in record: record[key] = int(record[key])
+        records[record["receveur_ipp"]] = record
+    return records
+
+
+def _write_dossier(base_folder, schema, ipp, values):
+    """Fusionne les valeurs importées avec le dossier existant (ou les valeurs par défaut) et sauvegarde. Retourne (ipp, créé ?, dossier)."""
+    folder_path = os.path.join(base_folder, ipp)
+    source, _ = find_dossier_file(folder_path)
+    record = read_dossier_file(os.path.join(folder_path, source)) if source else {}
+    record.update(values)
+    record = schema.to_record(schema.from_record(record))
+    save_dossier(folder_path, record, author=IMPORT_AUTHOR)
+    return ipp, source is None, record
+
+
+def existing_ipps(base_folder):
+    if not os.path.isdir(base_folder): return set()
+    with os.scandir(base_folder) as entries:
+        return {entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.')}
+
+
+def import_dossiers(source, base_folder, schema, index=None, update_existing=False, dry_run=False, filename=None,
+                    organismes=ORGANISMES, statuts=STATUTS, batch_size=BATCH_SIZE, workers=IMPORT_WORKERS):
+    """Valide tout le fichier puis écrit les dossiers des lignes valides (rien si `dry_run`).
+
+    `index` (DossierIndex, optionnel) est mis à jour en une transaction par lot.
+    Retourne {rows, valid, created, updated, folders, errors (DataFrame), ignored_columns, validation_s, duration_s}.
+    """
+    started = time.perf_counter()
+    frame, ignored = map_columns(read_rows(source, filename), ("receveur_ipp",) + tuple(field[0] for field in schema.scalar_fields))
+    valid, errors = validate_rows(frame, existing_ipps(base_folder), update_existing, organismes, statuts)
+    records = _records(valid)
+    validation_s = time.perf_counter() - started
+    created, folders, failures = 0, [], []
+    if records and not dry_run:
+        os.makedirs(base_folder, exist_ok=True)
+        lines = dict(zip(valid["receveur_ipp"], valid.index))
+        ipps = list(records)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bulk-import") as pool:
+            for start in range(0, len(ipps), batch_size):
+                futures = [(ipp, pool.submit(_write_dossier, base_folder, schema, ipp, records[ipp])) for ipp in ipps[start:start + batch_size]]
+                saved = []
+                for ipp, future in futures:
+                    try:
+                        _, is_new, record = future.result()
+                    except Exception as e:
+                        logging.error(f"Import du dossier {ipp} impossible : {e}")
+                        failures.append({"Ligne": lines[ipp], "Colonne": IMPORT_LABELS["receveur_ipp"], "Valeur": ipp, "Erreur": f"écriture impossible : {e}"})
+                        continue
+                    created += is_new; folders.append(ipp); saved.append((ipp, record))
+                if index is not None and saved: index.upsert_many(saved)
+    if failures: errors = pd.concat([errors, pd.DataFrame(failures)], ignore_index=True)
+    logging.info(f"Import : {len(frame)} ligne(s), {len(records)} valide(s), {len(folders)} dossier(s) écrit(s)")
+    return {"rows": len(frame), "valid": len(records), "created": created, "updated": len(folders) - created, "folders": folders,
+            "errors": errors, "ignored_columns": ignored, "validation_s": validation_s, "duration_s": time.perf_counter() - started}
+
+
+def main(argv=None):
+    import app # listes de documents et d'examens, organismes, dossiers de l'application
+    from dossier_index import DossierIndex
+    from dossier_store import accord_timeline
+
+    parser = argparse.ArgumentParser(description="Importe des dossiers Allo-Greffe depuis un fichier CSV ou Excel.")
+    parser.add_argument("file", help="fichier .csv ou .xlsx, une ligne par receveur")
+    parser.add_argument("--update", action="store_true", help="met à jour les dossiers dont l'IPP est déjà enregistré au lieu de les refuser")
+    parser.add_argument("--dry-run", action="store_true", help="validation seulement, rien n'est écrit")
+    parser.add_argument("--errors", help="écrit les erreurs ligne par ligne dans ce fichier CSV")
+    parser.add_argument("-j", "--workers", type=int, default=IMPORT_WORKERS, help=f"sauvegardes simultanées (par défaut : {IMPORT_WORKERS})")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    index = None if args.dry_run else DossierIndex(app.BASE_UPLOAD_FOLDER, timeline=accord_timeline)
+    result = import_dossiers(args.file, app.BASE_UPLOAD_FOLDER, app.get_dossier_schema(), index, args.update, args.dry_run,
+                             organismes=app.ORGANISMES_LIST, statuts=app.ACCORD_STATUTS, workers=args.workers)
+    if result["ignored_columns"]: print("Colonnes ignorées : " + ", ".join(result["ignored_columns"]))
+    errors = result["errors"]
+    if args.errors: errors.to_csv(args.errors, index=False, encoding="utf-8-sig")
+    elif len(errors): print(errors.head(50).to_string(index=False))
+    print(f"{result['rows']} ligne(s) : {result['valid']} valide(s), {errors['Ligne'].nunique()} refusée(s) ; {result['created']} dossier(s) créé(s), {result['updated']} mis à jour"
+          f" en {result['duration_s']:.2f} s (validation {result['validation_s']:.2f} s)")
+    return 1 if len(errors) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
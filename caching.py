@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Caches mémoire partagés par toutes les sessions Streamlit d'un même process.
+
+LRUCache est un cache LRU borné (en nombre d'entrées et en poids total) avec
+statistiques ; DossierCache l'utilise pour garder les dossiers déjà parsés,
+validés par l'empreinte (mtime, taille, inode) du fichier sur disque.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from dossier_format import read_dossier_file
+from dossier_index import find_dossier_file
+from session_memory import deep_size
+
+
+class LRUCache:
+    def __init__(self, max_entries=256, max_weight=None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self._entries = OrderedDict() # clé -> (valeur, poids)
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, weight=1):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._weight -= previous[1]
+            self._entries[key] = (value, weight)
+            self._weight += weight
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or (self.max_weight is not None and self._weight > self.max_weight)):
+                _, (_, evicted_weight) = self._entries.popitem(last=False)
+                self._weight -= evicted_weight
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._weight -= entry[1]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._weight = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "weight": self._weight, "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "invalidations": self.invalidations, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class DossierCache(LRUCache):
+    """Dossiers parsés, indexés par dossier IPP ; une entrée n'est servie que si l'empreinte du fichier n'a pas changé.
+
+    Le poids d'une entrée est la taille estimée du dict en mémoire (session_memory.deep_size), plusieurs fois
+    celle du fichier : `max_weight` borne ainsi la mémoire réellement occupée (octets).
+    Les dicts retournés sont partagés entre sessions : ne pas les modifier.
+    """
+    def __init__(self, base_folder, max_entries=512, max_weight=64 * 1024 * 1024):
+        super().__init__(max_entries, max_weight)
+        self.base_folder = base_folder
+        self.stale = 0
+
+    def read(self, folder, source, fingerprint):
+        """Dossier `folder` tel que lu depuis `source` ; relit le fichier seulement si l'empreinte a changé."""
+        cached = self.get(folder)
+        if cached is not None:
+            if cached[0] == (source, fingerprint):
+                return cached[1]
+            with self._lock:
+                # l'entrée comptée comme hit est en réalité périmée
+                self.hits -= 1; self.misses += 1; self.stale += 1
+        data = read_dossier_file(os.path.join(self.base_folder, folder, source))
+        self.put(folder, ((source, fingerprint), data), weight=deep_size(data)) # mesuré une fois par lecture du fichier
+        return data
+
+    def load(self, folder):
+        """Dossier `folder` (dossier.msgpack, sinon data.json ou patient_data.json), ou None s'il n'existe pas."""
+        source, fingerprint = find_dossier_file(os.path.join(self.base_folder, folder))
+        if source is None:
+            return None
+        return self.read(folder, source, fingerprint)
+
+    def stats(self):
+        stats = super().stats()
+        stats["stale"] = self.stale
+        return stats
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Dossier complet à transmettre : le rapport suivi de toutes les pièces jointes, en un PDF ou un ZIP.
+
+Le fichier est écrit au fil de l'eau, pièce par pièce, sans jamais charger le dossier
+entier en mémoire :
+- ZIP : chaque pièce est copiée par blocs depuis le magasin de blobs (stockée sans
+  recompression, les PDF et photos étant déjà compressés) ;
+- PDF : les objets de chaque page source (lus à la demande par pypdf) sont renumérotés
+  et écrits un par un dans le fichier de sortie ; seuls la table des positions et la
+  liste des pages restent en mémoire. Les images sont converties une par une en page PDF
+  (fichier temporaire). La mémoire est ainsi bornée par la plus grosse pièce, pas par
+  la taille du dossier.
+"""
+import io
+import logging
+import os
+import tempfile
+import zipfile
+
+from PIL import Image, ImageOps
+
+from image_pipeline import image_format
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject
+except ImportError: # fusion PDF indisponible : seul le ZIP est proposé
+    PdfReader = None
+
+BUNDLE_FORMATS = ("pdf", "zip") if PdfReader is not None else ("zip",)
+A4_WIDTH_INCHES = 8.27
+IMAGE_PAGE_QUALITY = 90 # qualité JPEG des photos converties en pages
+_STORED_EXTENSIONS = {".pdf", ".jpg", ".jpeg", ".png"}
+_INHERITABLE = ("/Resources", "/MediaBox", "/CropBox", "/Rotate") # attributs qu'une page peut tenir de son arbre /Pages
+
+
+def bundle_path(output_folder, ipp, fmt):
+    return os.path.join(output_folder, f"Dossier_complet_{ipp}.{fmt}")
+
+
+def _unique_name(name, used):
+    stem, ext = os.path.splitext(name)
+    candidate, i = name, 1
+    while candidate in used:
+        i += 1; candidate = f"{stem} ({i}){ext}"
+    used.add(candidate)
+    return candidate
+
+
+def write_zip(out, report_bytes, report_name, attachments):
+    """`attachments` : [(chemin du blob, nom dans l'archive)]."""
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(report_name, report_bytes)
+        for path, arcname in attachments:
+            stored = os.path.splitext(arcname)[1].lower() in _STORED_EXTENSIONS
+            zf.write(path, arcname, compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+
+
+class StreamingPdfMerger:
+    """Concatène les pages de plusieurs PDF dans `out` en écrivant chaque objet dès qu'il est copié."""
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, out):
+        self.out = out
+        self.offsets = {}    # numéro d'objet -> position dans le fichier
+        self.page_numbers = []
+        self.next_number = 3
+        self.out.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _number_for(self, mapping, queue, ref):
+        key = (ref.idnum, ref.generation)
+        number = mapping.get(key)
+        if number is None:
+            number = mapping[key] = self.next_number; self.next_number += 1
+            queue.append((number, ref))
+        return number
+
+    def _remap(self, obj, mapping, queue):
+        if isinstance(obj, IndirectObject):
+            return IndirectObject(self._number_for(mapping, queue, obj), 0, None)
+        if isinstance(obj, DictionaryObject): # y compris les flux, dont seul le dictionnaire est recopié ici
+            return DictionaryObject({key: self._remap(value, mapping, queue) for key, value in obj.items()})
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._remap(value, mapping, queue) for value in obj)
+        return obj
+
+    @staticmethod
+    def _detached_page(page):
+        """Copie de la page sans /Parent, avec les attributs hérités de l'arbre des pages d'origine recopiés sur elle."""
+        copy = DictionaryObject({key: value for key, value in page.items() if key != "/Parent"})
+        node = page.get("/Parent")
+        while node is not None and any(key not in copy for key in _INHERITABLE):
+            node = node.get_object()
+            for key in _INHERITABLE:
+                if key not in copy and key in node: copy[NameObject(key)] = node[key]
+            node = node.get("/Parent")
+        return copy
+
+    def _write_object(self, number, obj, mapping, queue):
+        if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page":
+            # l'arbre des pages d'origine n'est pas recopié : la page est rattachée à la liste de pages du dossier complet
+            copy = self._remap(self._detached_page(obj), mapping, queue)
+            copy[NameObject("/Parent")] = IndirectObject(self.PAGES, 0, None)
+        else:
+            copy = self._remap(obj, mapping, queue)
+        self.offsets[number] = self.out.tell()
+        self.out.write(f"{number} 0 obj\n".encode())
+        if isinstance(obj, StreamObject):
+            data = obj._data # flux encodé tel quel, sans décompression
+            copy[NameObject("/Length")] = NumberObject(len(data))
+            copy.write_to_stream(self.out)
+            self.out.write(b"\nstream\n"); self.out.write(data); self.out.write(b"\nendstream")
+        else:
+            copy.write_to_stream(self.out)
+        self.out.write(b"\nendobj\n")
+
+    def add_pdf(self, source):
+        """Ajoute toutes les pages du PDF `source` (chemin ou flux). Retourne le nombre de pages ajoutées."""
+        start, first_number, page_count = self.out.tell(), self.next_number, len(self.page_numbers)
+        try:
+            reader = PdfReader(source)
+            if reader.is_encrypted and not reader.decrypt(""):
+                raise ValueError("PDF chiffré")
+            mapping, queue = {}, []
+            pages = [page.indirect_reference for page in reader.pages]
+            for ref in pages: # numérotées d'abord, pour que les liens entre pages pointent vers les copies
+                self.page_numbers.append(self._number_for(mapping, queue, ref))
+            while queue:
+                number, ref = queue.pop()
+                self._write_object(number, ref.get_object(), mapping, queue)
+        except Exception:
+            # pièce illisible : on revient à l'état d'avant, le reste du dossier reste valide
+            self.out.seek(start); self.out.truncate()
+            self.offsets = {number: offset for number, offset in self.offsets.items() if number < first_number}
+            del self.page_numbers[page_count:]; self.next_number = first_number
+            raise
+        return len(pages)
+
+    def add_image(self, path):
+        """Ajoute l'image en une page, à la largeur d'une page A4."""
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "L"): img = img.convert("RGB")
+            with tempfile.TemporaryFile() as tmp:
+                img.save(tmp, "PDF", resolution=max(72.0, img.width / A4_WIDTH_INCHES), quality=IMAGE_PAGE_QUALITY)
+                tmp.seek(0)
+                return self.add_pdf(tmp)
+
+    def close(self):
+        kids = " ".join(f"{number} 0 R" for number in self.page_numbers)
+        for number, body in ((self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>"), (self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_numbers)} >>")):
+            self.offsets[number] = self.out.tell()
+            self.out.write(f"{number} 0 obj\n{body}\nendobj\n".encode())
+        xref = self.out.tell()
+        self.out.write(f"xref\n0 {self.next_number}\n0000000000 65535 f \n".encode())
+        for number in range(1, self.next_number):
+            self.out.write(f"{self.offsets[number]:010d} 00000 n \n".encode())
+        self.out.write(f"trailer\n<< /Size {self.next_number} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def write_pdf(out, report_bytes, attachments):
+    """Retourne (pages écrites, [noms des pièces ignorées])."""
+    merger = StreamingPdfMerger(out)
+    merger.add_pdf(io.BytesIO(report_bytes))
+    skipped = []
+    for path, name in attachments:
+        fmt = image_format({"name": name})
+        try:
+            if fmt is not None: merger.add_image(path)
+            elif name.lower().endswith(".pdf"): merger.add_pdf(path)
+            else: skipped.append(name)
+        except Exception as e:
+            logging.warning(f"Pièce {name} non intégrée au dossier complet : {e}")
+            skipped.append(name)
+    merger.close()
+    return len(merger.page_numbers), skipped
+
+
+def build_bundle(upload_store, ipp, report_bytes, output_folder, fmt="pdf"):
+    """Écrit le dossier complet de `ipp` dans `output_folder` (temporaire + renommage).
+
+    Retourne {path, format, attachments, pages, skipped, size}.
+    """
+    if fmt not in BUNDLE_FORMATS:
+        raise ValueError(f"Format de dossier complet indisponible : {fmt}")
+    used = set()
+    report_name = _unique_name(f"Rapport_{ipp}.pdf", used)
+    attachments = [(upload_store.blob_path(ref["sha256"]), _unique_name(f"{ref['category']}/{ref['name']}" if fmt == "zip" else ref["name"], used)) for ref in upload_store.references(ipp)]
+    os.makedirs(output_folder, exist_ok=True)
+    target = bundle_path(output_folder, ipp, fmt)
+    pages, skipped = None, []
+    with tempfile.NamedTemporaryFile('wb', dir=output_folder, suffix='.part', delete=False) as tmp:
+        try:
+            if fmt == "zip": write_zip(tmp, report_bytes, report_name, attachments)
+            else: pages, skipped = write_pdf(tmp, report_bytes, attachments)
+        except BaseException:
+            tmp.close(); os.remove(tmp.name)
+            raise
+    os.replace(tmp.name, target)
+    logging.info(f"Dossier complet généré : {target}")
+    return {"path": target, "format": fmt, "attachments": len(attachments), "pages": pages, "skipped": skipped, "size": os.path.getsize(target)}
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Format de stockage des dossiers.
+
+Format courant : `dossier.msgpack` = en-tête MAGIC (4 octets) + version du format
+(1 octet) + dict du dossier encodé en MessagePack. Plus compact et plus rapide à
+décoder que le JSON indenté historique, et versionné explicitement pour pouvoir
+faire évoluer l'encodage.
+
+Formats historiques, toujours lus : `data.json` (app.py) et `patient_data.json`
+(test.py). migrate_dossiers.py convertit un dossier existant vers le format courant.
+msgpack est optionnel : sans lui, les dossiers restent écrits en data.json.
+"""
+import json
+import os
+
+try:
+    import msgpack
+except ImportError: # format binaire indisponible : JSON uniquement
+    msgpack = None
+
+BINARY_FILENAME = "dossier.msgpack"
+JSON_FILENAME = "data.json"
+LEGACY_FILENAMES = (JSON_FILENAME, "patient_data.json")
+MAGIC = b"AGD\x00"
+FORMAT_VERSION = 1
+HEADER_SIZE = len(MAGIC) + 1
+
+
+class DossierFormatError(ValueError):
+    pass
+
+
+def current_filename():
+    """Nom du fichier écrit par les sauvegardes."""
+    return BINARY_FILENAME if msgpack is not None else JSON_FILENAME
+
+
+def encode_dossier(data, filename=BINARY_FILENAME):
+    if filename != BINARY_FILENAME:
+        return json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+    return MAGIC + bytes([FORMAT_VERSION]) + msgpack.packb(data, use_bin_type=True)
+
+
+def decode_dossier(raw, filename=BINARY_FILENAME):
+    if filename != BINARY_FILENAME:
+        return json.loads(raw)
+    if raw[:len(MAGIC)] != MAGIC:
+        raise DossierFormatError("En-tête de dossier binaire invalide")
+    version = raw[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise DossierFormatError(f"Version de format de dossier non prise en charge : {version}")
+    if msgpack is None:
+        raise DossierFormatError("msgpack n'est pas installé : dossier binaire illisible")
+    return msgpack.unpackb(raw[HEADER_SIZE:], raw=False, strict_map_key=False)
+
+
+def read_dossier_file(path):
+    """Contenu du fichier de dossier `path`, quel que soit son format (déduit du nom)."""
+    with open(path, 'rb') as f: raw = f.read()
+    return decode_dossier(raw, os.path.basename(path))
+
+
+def canonical(data):
+    """Forme comparable d'un dossier (vérification des conversions, NaN compris)."""
+    return json.dumps(data, sort_keys=True, ensure_ascii=False)
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""Index SQLite persistant des dossiers patients (une ligne de résumé par dossier IPP).
+
+Le tableau de bord et la recherche interrogent cet index au lieu de relire
+chaque fichier de dossier à chaque rerun. L'index vit à la racine du dossier d'uploads
+et peut être reconstruit à tout moment à partir des fichiers.
+
+Chaque ligne garde l'empreinte (mtime, taille, inode) du fichier indexé :
+refresh() ne relit que les fichiers dont l'empreinte a changé, ce qui garde
+l'index juste même quand des scripts ou l'ancienne version (test.py, qui écrit
+patient_data.json) modifient les dossiers hors de l'application.
+"""
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from dossier_format import BINARY_FILENAME, LEGACY_FILENAMES, current_filename, read_dossier_file
+from name_search import NameSearchIndex
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError: # watchdog est optionnel : on se rabat sur un scan périodique des empreintes
+    Observer = None
+    FileSystemEventHandler = object
+
+INDEX_FILENAME = ".dossiers_index.sqlite3"
+DOSSIER_FILENAME = current_filename()
+# Format binaire courant, puis data.json (app.py avant la migration) et patient_data.json (test.py) : ordre de préférence à mtime égal
+DOSSIER_FILENAMES = (BINARY_FILENAME,) + LEGACY_FILENAMES
+SCHEMA_VERSION = 6
+
+SUMMARY_FIELDS = ["receveur_ipp", "receveur_nom", "receveur_prenom", "donneur_nom", "donneur_prenom", "accord_tribunal", "accord_ministere", "organisme_accord_statut", "receveur_organisme", "receveur_nom_pere", "receveur_nom_mere", "organisme_accord_date_validation", "receveur_date_naissance"]
+# Dates tirées de l'historique (dossier_store.accord_timeline) : création et passage de chaque accord à "Accordé"
+TIMELINE_FIELDS = ["created_at", "accord_tribunal_at", "accord_ministere_at", "organisme_accord_statut_at"]
+# Colonnes filtrables / triables côté serveur par le tableau de bord (chacune a son index SQLite)
+FILTER_FIELDS = ["accord_tribunal", "accord_ministere", "organisme_accord_statut", "receveur_organisme"]
+SORT_FIELDS = ["folder", "receveur_nom", "donneur_nom", "updated_at", "organisme_accord_date_validation"] + FILTER_FIELDS
+# IPP en minuscules (str.lower de Python, qui gère aussi les accents) : recherche par préfixe indexée et table FTS5 trigram
+SEARCH_FIELDS = ["receveur_ipp_lower"]
+TRIGRAM_MIN_LENGTH = 3 # en dessous, FTS5 trigram ne peut pas utiliser son index : recherche par préfixe
+
+
+FINGERPRINT_FIELDS = ["source", "mtime_ns", "size", "inode"]
+
+
+def file_fingerprint(path):
+    """Empreinte (mtime_ns, taille, inode) d'un fichier, ou None s'il n'existe pas."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def dossier_files(folder_path):
+    """[(fichier, empreinte)] des fichiers de dossier présents, dans l'ordre de DOSSIER_FILENAMES."""
+    files = []
+    for filename in DOSSIER_FILENAMES:
+        fingerprint = file_fingerprint(os.path.join(folder_path, filename))
+        if fingerprint is not None:
+            files.append((filename, fingerprint))
+    return files
+
+
+def find_dossier_file(folder_path):
+    """Fichier de dossier le plus récemment modifié et son empreinte ; à mtime égal, dossier.msgpack, data.json puis patient_data.json.
+
+    test.py écrit encore patient_data.json à côté des fichiers de l'application : le plus récent des deux
+    est le dossier à jour, quel que soit son format.
+    """
+    files = dossier_files(folder_path)
+    if not files:
+        return None, None
+    return max(files, key=lambda item: item[1][0]) # max garde le premier à égalité : l'ordre de préférence
+
+
+def summarize_dossier(folder, data, mtime, source=DOSSIER_FILENAME, fingerprint=None, timeline=None):
+    """Réduit un dossier complet à la ligne stockée dans l'index."""
+    summary = {"folder": folder, "updated_at": mtime, "source": source}
+    summary["mtime_ns"], summary["size"], summary["inode"] = fingerprint or (None, None, None)
+    for field in SUMMARY_FIELDS:
+        value = data.get(field)
+        summary[field] = value if value is None else str(value)
+    summary["receveur_ipp_lower"] = summary["receveur_ipp"].lower() if summary["receveur_ipp"] else None
+    for field in TIMELINE_FIELDS:
+        summary[field] = (timeline or {}).get(field)
+    return summary
+
+
+def new_refresh_stats():
+    return {"files_scanned": 0, "files_reparsed": 0, "files_removed": 0, "errors": 0, "duration_s": 0.0}
+
+
+class DossierIndex:
+    def __init__(self, base_folder, loader=None, timeline=None):
+        self.base_folder = base_folder
+        self.loader = loader # loader(dossier, fichier, empreinte) -> dict ; par défaut lecture directe du fichier
+        self.timeline = timeline # timeline(chemin du dossier) -> dict des TIMELINE_FIELDS ; colonnes vides si None
+        self.generation = 0 # incrémenté à chaque écriture : clé des caches calculés sur tout l'index
+        self.path = os.path.join(base_folder, INDEX_FILENAME)
+        self._lock = threading.RLock()
+        self.last_refresh_stats = new_refresh_stats()
+        self.total_refresh_stats = new_refresh_stats()
+        self._watcher = None
+        self._name_index = None # index de trigrammes en mémoire, construit à la première recherche par nom
+        self._ipp_trigrams = False # table FTS5 trigram disponible (SQLite >= 3.34 compilé avec FTS5)
+        os.makedirs(base_folder, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == SCHEMA_VERSION:
+                self._ipp_trigrams = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'dossiers_ipp'").fetchone() is not None
+                return
+            columns = ", ".join(f"{field} TEXT" for field in SUMMARY_FIELDS + TIMELINE_FIELDS)
+            with self._conn:
+                self._conn.execute("DROP TABLE IF EXISTS dossiers")
+                self._conn.execute("DROP TABLE IF EXISTS dossiers_ipp")
+                # COLLATE NOCASE : LIKE (insensible à la casse ASCII) peut alors parcourir l'index pour un préfixe
+                self._conn.execute(f"CREATE TABLE dossiers (folder TEXT PRIMARY KEY, {columns}, receveur_ipp_lower TEXT COLLATE NOCASE, updated_at REAL, source TEXT, mtime_ns INTEGER, size INTEGER, inode INTEGER)")
+                for field in SORT_FIELDS[1:] + SEARCH_FIELDS:
+                    self._conn.execute(f"CREATE INDEX idx_dossiers_{field} ON dossiers ({field})")
+                try: # lignes liées par rowid à celles de dossiers ; l'index n'est jamais passé au VACUUM (il se reconstruit)
+                    self._conn.execute("CREATE VIRTUAL TABLE dossiers_ipp USING fts5(receveur_ipp_lower, tokenize='trigram')")
+                    self._ipp_trigrams = True
+                except sqlite3.OperationalError: # FTS5 absent ou SQLite < 3.34 : recherche par préfixe seulement
+                    self._ipp_trigrams = False
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            logging.info(f"Index des dossiers créé (schéma v{SCHEMA_VERSION}) : {self.path}")
+            self.rebuild()
+
+    def _write_summary(self, summary):
+        columns = ["folder"] + SUMMARY_FIELDS + TIMELINE_FIELDS + SEARCH_FIELDS + ["updated_at"] + FINGERPRINT_FIELDS
+        placeholders = ", ".join("?" for _ in columns)
+        self.generation += 1
+        if self._ipp_trigrams: # INSERT OR REPLACE donne une nouvelle rowid à la ligne : l'ancienne entrée FTS est retirée
+            self._conn.execute("DELETE FROM dossiers_ipp WHERE rowid = (SELECT rowid FROM dossiers WHERE folder = ?)", (summary["folder"],))
+        cursor = self._conn.execute(f"INSERT OR REPLACE INTO dossiers ({', '.join(columns)}) VALUES ({placeholders})", [summary[c] for c in columns])
+        if self._ipp_trigrams and summary["receveur_ipp_lower"]:
+            self._conn.execute("INSERT INTO dossiers_ipp (rowid, receveur_ipp_lower) VALUES (?, ?)", (cursor.lastrowid, summary["receveur_ipp_lower"]))
+        if self._name_index is not None:
+            self._name_index.update(summary["folder"], summary)
+
+    def _delete_folder(self, folder):
+        if self._ipp_trigrams:
+            self._conn.execute("DELETE FROM dossiers_ipp WHERE rowid = (SELECT rowid FROM dossiers WHERE folder = ?)", (folder,))
+        self._conn.execute("DELETE FROM dossiers WHERE folder = ?", (folder,))
+        self.generation += 1
+        if self._name_index is not None:
+            self._name_index.remove(folder)
+
+    def _saved_summary(self, folder, data, mtime=None):
+        source, fingerprint = find_dossier_file(os.path.join(self.base_folder, folder))
+        if mtime is None:
+            mtime = fingerprint[0] / 1e9 if fingerprint else datetime.datetime.now().timestamp()
+        return summarize_dossier(folder, data, mtime, source or DOSSIER_FILENAME, fingerprint, self._timeline(folder))
+
+    def upsert(self, folder, data, mtime=None):
+        """Met à jour la ligne d'un dossier après sa sauvegarde (l'empreinte évite une relecture au prochain refresh)."""
+        summary = self._saved_summary(folder, data, mtime)
+        with self._lock, self._conn:
+            self._write_summary(summary)
+
+    def upsert_many(self, items):
+        """Comme upsert pour [(dossier, données)], en une seule transaction (import en lot)."""
+        summaries = [self._saved_summary(folder, data) for folder, data in items]
+        with self._lock, self._conn:
+            for summary in summaries: self._write_summary(summary)
+        return len(summaries)
+
+    def delete(self, folder):
+        with self._lock, self._conn:
+            self._delete_folder(folder)
+
+    def _timeline(self, folder):
+        return self.timeline(os.path.join(self.base_folder, folder)) if self.timeline is not None else None
+
+    def _read_summary(self, folder, source, fingerprint):
+        try:
+            if self.loader is not None:
+                data = self.loader(folder, source, fingerprint)
+            else:
+                data = read_dossier_file(os.path.join(self.base_folder, folder, source))
+            return summarize_dossier(folder, data, fingerprint[0] / 1e9, source, fingerprint, self._timeline(folder))
+        except ValueError: logging.error(f"Could not decode dossier file {source} for patient {folder}") # JSON ou binaire invalide
+        except Exception as e: logging.error(f"Error processing folder {folder}: {e}")
+        return None
+
+    def refresh(self, folders=None):
+        """Synchronise l'index avec le disque en ne relisant que les fichiers dont l'empreinte a changé.
+
+        `folders` limite le scan à certains dossiers IPP (utilisé par le watcher). Retourne les compteurs
+        du passage : fichiers examinés, relus, supprimés de l'index, erreurs et durée.
+        """
+        started = time.perf_counter()
+        stats = new_refresh_stats()
+        with self._lock:
+            known = {row["folder"]: (row["source"], (row["mtime_ns"], row["size"], row["inode"])) for row in self._conn.execute("SELECT folder, source, mtime_ns, size, inode FROM dossiers")}
+        if folders is None:
+            try:
+                with os.scandir(self.base_folder) as entries: folders = [entry.name for entry in entries if entry.is_dir()]
+            except FileNotFoundError:
+                folders = []
+            removed = set(known) - set(folders)
+        else:
+            removed = set()
+        changed = []
+        for folder in folders:
+            source, fingerprint = find_dossier_file(os.path.join(self.base_folder, folder))
+            if source is None:
+                if folder in known: removed.add(folder)
+                continue
+            stats["files_scanned"] += 1
+            if known.get(folder) == (source, fingerprint):
+                continue
+            summary = self._read_summary(folder, source, fingerprint)
+            stats["files_reparsed"] += 1
+            if summary is None:
+                stats["errors"] += 1
+            else:
+                changed.append(summary)
+        with self._lock, self._conn:
+            for summary in changed:
+                self._write_summary(summary)
+            for folder in removed:
+                self._delete_folder(folder)
+        stats["files_removed"] = len(removed)
+        stats["duration_s"] = time.perf_counter() - started
+        with self._lock:
+            self.last_refresh_stats = stats
+            for key, value in stats.items():
+                self.total_refresh_stats[key] += value
+        if changed or removed:
+            logging.info(f"Index des dossiers actualisé : {stats}")
+        return stats
+
+    def rebuild(self):
+        """Reconstruit entièrement l'index à partir des fichiers de dossiers. Retourne le nombre de dossiers indexés."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM dossiers")
+            if self._ipp_trigrams: self._conn.execute("DELETE FROM dossiers_ipp")
+            self._name_index = None
+            self.generation += 1
+        self.refresh()
+        nb_dossiers = self.count()
+        logging.info(f"Index des dossiers reconstruit : {nb_dossiers} dossier(s).")
+        return nb_dossiers
+
+    def start_watcher(self, interval=5.0):
+        """Démarre (une seule fois) la surveillance du dossier d'uploads en tâche de fond."""
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = DossierWatcher(self, interval)
+                self._watcher.start()
+            return self._watcher
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dossiers").fetchone()[0]
+
+    def list_dossiers(self):
+        """Toutes les lignes de résumé, triées par dossier IPP."""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute("SELECT * FROM dossiers ORDER BY folder")]
+
+    def snapshot(self, columns):
+        """Instantané en colonnes de tout l'index, en un seul SELECT : {colonne: [valeurs]}."""
+        cursor = self._conn.cursor()
+        cursor.row_factory = None # tuples simples : pas d'objet Row par ligne
+        with self._lock:
+            rows = cursor.execute(f"SELECT {', '.join(columns)} FROM dossiers").fetchall()
+        return {column: list(values) for column, values in zip(columns, zip(*rows))} if rows else {column: [] for column in columns}
+
+    def _filter_clause(self, filters):
+        """WHERE + paramètres à partir des filtres du tableau de bord.
+
+        `filters` accepte, pour chaque champ de FILTER_FIELDS, une liste de valeurs admises,
+        ainsi que les bornes `updated_from` / `updated_to` (dates) et `validation_from` / `validation_to`.
+        """
+        filters = filters or {}
+        clauses, params = [], []
+        for field in FILTER_FIELDS:
+            values = filters.get(field)
+            if values:
+                clauses.append(f"{field} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+        if filters.get("updated_from"):
+            clauses.append("updated_at >= ?"); params.append(datetime.datetime.combine(filters["updated_from"], datetime.time.min).timestamp())
+        if filters.get("updated_to"):
+            clauses.append("updated_at < ?"); params.append(datetime.datetime.combine(filters["updated_to"] + datetime.timedelta(days=1), datetime.time.min).timestamp())
+        if filters.get("validation_from"):
+            clauses.append("organisme_accord_date_validation >= ?"); params.append(filters["validation_from"].isoformat())
+        if filters.get("validation_to"):
+            clauses.append("organisme_accord_date_validation <= ?"); params.append(filters["validation_to"].isoformat())
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count_dossiers(self, filters=None):
+        where, params = self._filter_clause(filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM dossiers{where}", params).fetchone()[0]
+
+    def query_dossiers(self, filters=None, sort_by="folder", descending=False, limit=50, offset=0):
+        """Une page de lignes de résumé : seules `limit` lignes sont lues, filtrées et triées par SQLite."""
+        if sort_by not in SORT_FIELDS:
+            raise ValueError(f"Tri non supporté : {sort_by}")
+        where, params = self._filter_clause(filters)
+        direction = "DESC" if descending else "ASC"
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(f"SELECT * FROM dossiers{where} ORDER BY {sort_by} {direction}, folder {direction} LIMIT ? OFFSET ?", params + [int(limit), int(offset)])]
+
+    def get_dossiers(self, folders):
+        """Lignes de résumé des dossiers demandés, dans l'ordre de `folders`."""
+        folders = list(folders)
+        if not folders:
+            return []
+        with self._lock:
+            rows = {row["folder"]: dict(row) for row in self._conn.execute(f"SELECT * FROM dossiers WHERE folder IN ({', '.join('?' for _ in folders)})", folders)}
+        return [rows[folder] for folder in folders if folder in rows]
+
+    def _get_name_index(self):
+        with self._lock:
+            if self._name_index is None:
+                name_index = NameSearchIndex()
+                for row in self._conn.execute("SELECT * FROM dossiers"):
+                    name_index.update(row["folder"], dict(row))
+                self._name_index = name_index
+            return self._name_index
+
+    def warm_up(self):
+        """Construit l'index des noms à l'avance (appelé par le watcher) pour que la première recherche soit rapide."""
+        self._get_name_index()
+
+    def search(self, query, search_by, top_k=20):
+        """Recherche par sous-chaîne sur l'IPP, ou recherche approchée (accents, espaces, tirets) sur les noms ; au plus `top_k` lignes.
+
+        L'IPP est cherché dans la table FTS5 trigram à partir de TRIGRAM_MIN_LENGTH caractères, par préfixe
+        (index de receveur_ipp_lower) pour une requête plus courte ou si FTS5 n'est pas disponible.
+
+        La recherche par nom couvre receveur, donneur et parents du receveur ; chaque ligne retournée
+        porte alors `match_score`, `match_role` et `match_name`, les meilleurs résultats en premier.
+        """
+        query = (query or "").lower().strip()
+        if not query:
+            return []
+        if search_by == 'IPP':
+            with self._lock:
+                if self._ipp_trigrams and len(query) >= TRIGRAM_MIN_LENGTH:
+                    # GLOB (sensible à la casse, les deux côtés sont en minuscules) : le LIKE de FTS5 rate les caractères accentués ;
+                    # les jokers sont échappés entre crochets, instr() garantit la sous-chaîne exacte
+                    pattern = "*" + "".join(f"[{char}]" if char in "*?[" else char for char in query) + "*"
+                    rows = self._conn.execute("SELECT dossiers.* FROM dossiers_ipp JOIN dossiers ON dossiers.rowid = dossiers_ipp.rowid WHERE dossiers_ipp.receveur_ipp_lower GLOB ? AND instr(dossiers.receveur_ipp_lower, ?) ORDER BY dossiers.folder LIMIT ?", (pattern, query, top_k))
+                else:
+                    pattern = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                    rows = self._conn.execute("SELECT * FROM dossiers WHERE receveur_ipp_lower LIKE ? ESCAPE '\\' ORDER BY folder LIMIT ?", (pattern, top_k))
+                return [dict(row) for row in rows]
+        matches = self._get_name_index().search(query, top_k=top_k)
+        rows = {row["folder"]: row for row in self.get_dossiers(match["folder"] for match in matches)}
+        results = []
+        for match in matches:
+            row = rows.get(match["folder"])
+            if row is not None:
+                row.update(match_score=match["score"], match_role=match["role"], match_name=match["name"])
+                results.append(row)
+        return results
+
+
+class _DossierEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        relative = os.path.relpath(event.src_path, self.watcher.index.base_folder)
+        folder = relative.split(os.sep, 1)[0]
+        if folder not in ('.', '..') and not folder.startswith(INDEX_FILENAME):
+            self.watcher.mark_dirty(folder)
+
+
+class DossierWatcher(threading.Thread):
+    """Garde l'index à jour en arrière-plan.
+
+    Avec watchdog (inotify sous Linux), seuls les dossiers IPP touchés sont rafraîchis ;
+    sans watchdog, un refresh complet par empreintes est lancé toutes les `interval` secondes.
+    """
+    def __init__(self, index, interval=5.0):
+        super().__init__(name="dossier-index-watcher", daemon=True)
+        self.index = index
+        self.interval = interval
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._observer = None
+
+    def mark_dirty(self, folder):
+        with self._dirty_lock:
+            self._dirty.add(folder)
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def run(self):
+        try:
+            self.index.warm_up()
+        except Exception as e:
+            logging.error(f"Name index warm-up failed: {e}", exc_info=True)
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_DossierEventHandler(self), self.index.base_folder, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+            logging.info("Surveillance de l'index des dossiers : watchdog actif.")
+        else:
+            logging.info(f"Surveillance de l'index des dossiers : scan des empreintes toutes les {self.interval}s.")
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, set()
+            try:
+                if self._observer is None:
+                    self.index.refresh()
+                elif dirty:
+                    time.sleep(0.2) # laisse les écritures en rafale se terminer
+                    self.index.refresh(sorted(dirty))
+            except Exception as e:
+                logging.error(f"Dossier index watcher error: {e}", exc_info=True)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""Modèle typé d'un dossier d'allogreffe : receveur, donneur, accords, check-lists.
+
+Sur disque, un dossier reste un dict plat dont les clés sont celles de st.session_state
+(dates en ISO 8601) : l'index, l'historique des versions et batch_reports le lisent tel quel.
+Chaque check-list y tient en une clé (checklist_admin, checklist_medical, checklist_ministere) :
+{élément: True / False}, les éléments non renseignés n'y figurent pas.
+La session, elle, garde la forme compacte de chaque check-list (un entier, deux bits par élément,
+voir checklist_bits). Les pièces jointes ne font pas partie du dossier : leurs références sont dans
+`<dossier IPP>/uploads.json` (upload_store) ; les clés *_upload des anciens dossiers sont ignorées.
+`Dossier` en est la forme typée en mémoire. DossierSchema construit une seule fois la table
+des champs (clé de session, section, attribut, date ou non) à partir des listes de documents
+et d'examens ; les convertisseurs parcourent ces tuples (un attrgetter par section à l'écriture),
+sans test de type sur chaque clé de la session ni formats de date essayés les uns après les autres.
+"""
+import datetime
+import logging
+import operator
+
+DEFAULT_BIRTH_DATE = datetime.date(2000, 1, 1)
+
+
+def _today():
+    return datetime.date.today()
+
+
+def admin_doc_key(doc):
+    return f"admin_doc_{doc.lower().replace(' ', '_').replace('(', '').replace(')', '')}_upload"
+
+
+def ministere_doc_key(doc):
+    return f"ministere_doc_{doc.lower().replace(' ', '_').replace('è', 'e')}_upload"
+
+
+def medical_exam_key(exam):
+    return f"medical_exam_{exam.lower().replace(' ', '_').replace('é', 'e').replace('è', 'e')}"
+
+
+def checklist_key(name):
+    """Clé du dossier (et de la session) d'une check-list : {élément: True / False} dans le dossier, entier (checklist_bits) dans la session."""
+    return f"checklist_{name}"
+
+
+def checklist_item_key(name, item):
+    """Colonne d'un élément de check-list dans les exports à plat (statut vrai, faux ou vide)."""
+    if name == "medical": return medical_exam_key(item)
+    return (admin_doc_key if name == "admin" else ministere_doc_key)(item)[:-len("_upload")]
+
+
+def parse_date(value):
+    """date depuis une chaîne ISO (date seule ou date et heure) ; None et les dates passent tels quels."""
+    if value is None or type(value) is datetime.date:
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return datetime.date.fromisoformat(value[:10])
+
+
+class _Record:
+    """Classe de base à slots ; FIELDS : ((attribut, clé de session, défaut ou fonction, date ?), ...)."""
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, **values):
+        for name, _, default, _ in self.FIELDS:
+            setattr(self, name, values[name] if name in values else default() if callable(default) else default)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+
+class Personne(_Record):
+    """Receveur ou donneur ; la clé de session est préfixée par le rôle (receveur_nom, donneur_nom...)."""
+    FIELDS = (("nom", "nom", "", False), ("prenom", "prenom", "", False), ("date_naissance", "date_naissance", DEFAULT_BIRTH_DATE, True), ("adresse", "adresse", "", False), ("sexe", "sexe", "Homme", False), ("groupage", "groupage", "O+", False), ("contact_principal", "contact_principal", "", False), ("nom_pere", "nom_pere", "", False), ("age_pere", "age_pere", 0, False), ("nom_mere", "nom_mere", "", False), ("age_mere", "age_mere", 0, False), ("organisme", "organisme", "PAYANT", False))
+    __slots__ = tuple(field[0] for field in FIELDS)
+
+
+class Accords(_Record):
+    FIELDS = (("tribunal", "accord_tribunal", "En cours", False), ("ministere", "accord_ministere", "En cours", False), ("organisme", "organisme_accord", "PAYANT", False), ("organisme_statut", "organisme_accord_statut", "En cours", False), ("organisme_nom_specifique", "organisme_accord_nom_specifique", "", False), ("organisme_date_validation", "organisme_accord_date_validation", _today, True))
+    __slots__ = tuple(field[0] for field in FIELDS)
+
+
+class Dossier:
+    """`checklists` : {nom de la check-list: {élément: True / False}}, élément absent = non renseigné."""
+    __slots__ = ("ipp", "receveur", "donneur", "accords", "checklists")
+
+    def __init__(self, ipp="", receveur=None, donneur=None, accords=None, checklists=None):
+        self.ipp = ipp
+        self.receveur = receveur if receveur is not None else Personne()
+        self.donneur = donneur if donneur is not None else Personne()
+        self.accords = accords if accords is not None else Accords()
+        self.checklists = checklists if checklists is not None else {}
+
+    __eq__ = _Record.__eq__
+    __repr__ = _Record.__repr__
+
+
+_MISSING = object()
+
+
+def _decode_date(value, key, default):
+    if value is _MISSING:
+        return default() if callable(default) else default
+    try:
+        return parse_date(value)
+    except (TypeError, ValueError):
+        logging.warning(f"Date illisible '{value}' pour '{key}' : valeur par défaut conservée.")
+        return default() if callable(default) else default
+
+
+def _encode_date(value):
+    return value.isoformat() if value is not None else None
+
+
+def _checklist(value, items):
+    """Statuts enregistrés d'une check-list, limités aux éléments de la liste actuelle."""
+    if not isinstance(value, dict): return {}
+    return {item: value[item] for item in items if type(value.get(item)) is bool}
+
+
+def checklist_bits(statuses, items):
+    """Forme de session d'une check-list : deux bits par élément, dans l'ordre de `items` (bit 2i : renseigné, bit 2i+1 : oui)."""
+    bits = 0
+    for i, item in enumerate(items):
+        value = statuses.get(item)
+        if type(value) is bool: bits |= (3 if value else 1) << 2 * i
+    return bits
+
+
+def checklist_statuses(value, items):
+    """{élément: True / False} des éléments renseignés, depuis la forme de session (entier) ou enregistrée (dict)."""
+    if isinstance(value, dict): return _checklist(value, items)
+    if type(value) is not int: return {}
+    return {item: bool(value >> (2 * i + 1) & 1) for i, item in enumerate(items) if value >> (2 * i) & 1}
+
+
+def _legacy_checklist(get, fields):
+    """Dossiers antérieurs aux check-lists : une clé booléenne par examen, seul True est un statut renseigné (False était la valeur par défaut)."""
+    return {item: True for key, item in fields if get(key) is True}
+
+
+class DossierSchema:
+    """Table des champs d'un dossier pour des listes de documents et d'examens données, et convertisseurs qui la parcourent."""
+    SECTIONS = (("receveur", Personne, "receveur_"), ("donneur", Personne, "donneur_"), ("accords", Accords, ""))
+
+    def __init__(self, admin_docs, medical_exams, ministere_docs):
+        self.checklists = (("admin", tuple(admin_docs)), ("medical", tuple(medical_exams)), ("ministere", tuple(ministere_docs)))
+        self.checklist_fields = tuple((checklist_item_key(name, item), name, item) for name, items in self.checklists for item in items)
+        self.scalar_fields = tuple((prefix + key, section, name, default, is_date) for section, cls, prefix in self.SECTIONS for name, key, default, is_date in cls.FIELDS)
+        self.date_keys = frozenset(key for key, _, _, _, is_date in self.scalar_fields if is_date)
+        self.state_keys = ("receveur_ipp",) + tuple(field[0] for field in self.scalar_fields) + tuple(checklist_key(name) for name, _ in self.checklists) # clés de session et du dossier
+        # Écriture, par section : (attribut du Dossier, clés, attrgetter de tous les attributs, clés des dates)
+        self._writers = tuple((section, tuple(prefix + key for _, key, _, _ in cls.FIELDS), operator.attrgetter(*(name for name, _, _, _ in cls.FIELDS)),
+                               tuple(prefix + key for _, key, _, is_date in cls.FIELDS if is_date)) for section, cls, prefix in self.SECTIONS)
+        # Lecture, selon que les dates sont décodées (dossier) ou non (session) : par section, champs répartis une fois par traitement
+        self._readers = {decode_dates: tuple((section, cls) + self._reader_fields(cls, prefix, decode_dates) for section, cls, prefix in self.SECTIONS) for decode_dates in (False, True)}
+        self._checklist_keys = tuple((checklist_key(name), name, items) for name, items in self.checklists)
+        self._legacy_medical = tuple((key, item) for key, name, item in self.checklist_fields if name == "medical")
+
+    @staticmethod
+    def _reader_fields(cls, prefix, decode_dates):
+        """((clé, attribut, défaut), ...) lus tels quels, avec défaut calculé à la demande, puis dates à décoder."""
+        plain, lazy, dates = [], [], []
+        for name, key, default, is_date in cls.FIELDS:
+            (dates if is_date and decode_dates else lazy if callable(default) else plain).append((prefix + key, name, default))
+        return tuple(plain), tuple(lazy), tuple(dates)
+
+    def _write(self, dossier, encode_dates):
+        values = {"receveur_ipp": dossier.ipp}
+        for section, keys, getter, date_keys in self._writers:
+            values.update(zip(keys, getter(getattr(dossier, section))))
+            if encode_dates:
+                for key in date_keys: values[key] = _encode_date(values[key])
+        checklists = dossier.checklists
+        for key, name, items in self._checklist_keys: # dossier : copie, il ne partage rien avec le cache ; session : entiers
+            values[key] = dict(checklists.get(name, ())) if encode_dates else checklist_bits(checklists.get(name, {}), items)
+        return values
+
+    def _read(self, values, decode_dates):
+        get = values.get
+        dossier = object.__new__(Dossier); dossier.ipp = get("receveur_ipp") or ""
+        for section, cls, plain, lazy, dates in self._readers[decode_dates]:
+            record = object.__new__(cls); setattr(dossier, section, record)
+            for key, name, default in plain: setattr(record, name, get(key, default))
+            for key, name, default in lazy: setattr(record, name, values[key] if key in values else default())
+            for key, name, default in dates: setattr(record, name, _decode_date(get(key, _MISSING), key, default))
+        dossier.checklists = checklists = {}
+        for key, name, items in self._checklist_keys:
+            checklists[name] = checklist_statuses(get(key), items)
+        if decode_dates and checklist_key("medical") not in values:
+            checklists["medical"] = _legacy_checklist(get, self._legacy_medical)
+        return dossier
+
+    def default_state(self):
+        """Valeurs initiales du formulaire, clé de session par clé de session (state_keys)."""
+        return self._write(Dossier(), False)
+
+    def to_state(self, dossier):
+        """Dossier -> {clé de session: valeur}, à appliquer d'un bloc avec st.session_state.update()."""
+        return self._write(dossier, False)
+
+    def from_state(self, state):
+        """Dossier depuis st.session_state (ou tout mapping) ; seules les clés de session du schéma sont lues."""
+        return self._read(state, False)
+
+    def to_record(self, dossier):
+        """Dict plat enregistré sur disque : clés de session, dates en ISO."""
+        return self._write(dossier, True)
+
+    def from_record(self, record):
+        """Dossier depuis le dict lu sur disque ; une date illisible garde sa valeur par défaut. `record` (qui peut venir du cache partagé) n'est pas modifié."""
+        return self._read(record, True)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Écriture sûre des dossiers et historique de leurs versions.
+
+Le fichier du dossier (dossier.msgpack, voir dossier_format) est toujours remplacé
+atomiquement (fichier temporaire + fsync + rename) :
+un arrêt brutal ou deux sauvegardes simultanées laissent l'ancienne ou la nouvelle
+version complète, jamais un fichier tronqué. Les fichiers des anciens formats (data.json,
+patient_data.json de test.py) ne sont pas supprimés : plus anciens, ils ne masquent pas le
+dossier enregistré (find_dossier_file retient le plus récent), et seul migrate_dossiers.py les retire.
+
+Chaque sauvegarde ajoute une ligne au journal `history.jsonl` du dossier, qui ne fait
+que grandir : seules les clés modifiées (`set`) ou supprimées (`unset`) par rapport à
+la version précédente y figurent, plus une copie complète toutes les SNAPSHOT_EVERY
+versions pour que la reconstruction d'une version reste rapide.
+"""
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl # verrou entre process (plusieurs serveurs Streamlit sur le même dossier partagé)
+except ImportError:
+    fcntl = None
+
+from dossier_format import encode_dossier, read_dossier_file
+from dossier_index import DOSSIER_FILENAME, find_dossier_file
+
+HISTORY_FILENAME = "history.jsonl"
+LOCK_FILENAME = ".lock"
+SNAPSHOT_EVERY = 50
+ACCORD_FIELDS = ("accord_tribunal", "accord_ministere", "organisme_accord_statut")
+ACCORDED = "Accordé"
+
+_locks_guard = threading.Lock()
+_locks = {} # dossier -> verrou des sauvegardes de ce process
+
+
+def _fsync_dir(path):
+    if os.name != 'posix':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try: os.fsync(fd)
+    finally: os.close(fd)
+
+
+def write_bytes_atomic(path, raw):
+    """Remplace `path` par `raw` : temporaire dans le même répertoire, fsync, puis rename."""
+    folder = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile('wb', dir=folder, prefix=".tmp-", delete=False) as f:
+        try:
+            f.write(raw); f.flush(); os.fsync(f.fileno())
+        except BaseException:
+            f.close(); os.remove(f.name)
+            raise
+    os.replace(f.name, path)
+    _fsync_dir(folder)
+
+
+def write_dossier_file(folder_path, data, filename=DOSSIER_FILENAME):
+    """Écrit le dossier au format de `filename` ; les fichiers d'autres formats restent en place (voir migrate_dossiers.py)."""
+    write_bytes_atomic(os.path.join(folder_path, filename), encode_dossier(data, filename))
+
+
+def compute_delta(previous, current):
+    """(clés ajoutées ou modifiées avec leur valeur, clés supprimées)."""
+    changed = {key: value for key, value in current.items() if key not in previous or previous[key] != value}
+    removed = sorted(key for key in previous if key not in current)
+    return changed, removed
+
+
+class DossierLock:
+    def __init__(self, folder_path):
+        with _locks_guard:
+            self._thread_lock = _locks.setdefault(os.path.abspath(folder_path), threading.Lock())
+        self._path = os.path.join(folder_path, LOCK_FILENAME)
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            self._file = open(self._path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN); self._file.close(); self._file = None
+        self._thread_lock.release()
+
+
+def read_history(folder_path):
+    """Entrées du journal, dans l'ordre. Une dernière ligne incomplète (arrêt pendant l'ajout) est ignorée."""
+    entries = []
+    try:
+        with open(os.path.join(folder_path, HISTORY_FILENAME), 'r', encoding='utf-8') as f:
+            for line in f:
+                try: entries.append(json.loads(line))
+                except json.JSONDecodeError: logging.warning(f"Ligne illisible ignorée dans l'historique de {folder_path}")
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def replay(entries, version=None):
+    """Contenu du dossier à la version `version` (la dernière si None), reconstruit depuis le journal."""
+    if version is not None:
+        entries = [entry for entry in entries if entry["v"] <= version]
+        if not entries or entries[-1]["v"] != version:
+            raise KeyError(f"Version {version} absente de l'historique")
+    start = max((i for i, entry in enumerate(entries) if entry.get("snapshot")), default=0)
+    data = {}
+    for entry in entries[start:]:
+        if entry.get("snapshot"): data = {}
+        data.update(entry.get("set", {}))
+        for key in entry.get("unset", ()): data.pop(key, None)
+    return data
+
+
+def _append_history(folder_path, entry):
+    path = os.path.join(folder_path, HISTORY_FILENAME)
+    line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n"
+    with open(path, 'a+b') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell(): # ligne incomplète laissée par un arrêt brutal : elle est retirée avant d'ajouter
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.seek(0); content = f.read(); f.truncate(content.rfind(b"\n") + 1)
+        f.write(line.encode('utf-8')); f.flush(); os.fsync(f.fileno())
+
+
+def save_dossier(folder_path, data, author=None):
+    """Écrit le dossier atomiquement et ajoute la différence au journal. Retourne le numéro de version (None si inchangé)."""
+    os.makedirs(folder_path, exist_ok=True)
+    with DossierLock(folder_path):
+        entries = read_history(folder_path)
+        previous = replay(entries) if entries else _read_current(folder_path) # dossier antérieur au journal : sa version sur disque sert de base
+        version = (entries[-1]["v"] if entries else 0) + 1
+        if not entries and previous:
+            _append_history(folder_path, {"v": version, "at": _now(), "snapshot": True, "set": previous, "note": "version initiale"})
+            version += 1
+        changed, removed = compute_delta(previous, data)
+        write_dossier_file(folder_path, data)
+        if not changed and not removed and entries:
+            return None
+        entry = {"v": version, "at": _now()}
+        if author: entry["by"] = author
+        if version % SNAPSHOT_EVERY == 0: entry.update(snapshot=True, set=data)
+        else: entry.update({"set": changed, "unset": removed} if removed else {"set": changed})
+        _append_history(folder_path, entry)
+        return version
+
+
+def _read_current(folder_path):
+    source, _ = find_dossier_file(folder_path)
+    try:
+        return read_dossier_file(os.path.join(folder_path, source)) if source else {}
+    except (OSError, ValueError): # fichier tronqué par une ancienne écriture non atomique
+        return {}
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+def list_versions(folder_path):
+    """[{v, at, by, changed}] du plus récent au plus ancien ; `changed` : nombre de champs modifiés."""
+    return [{"v": entry["v"], "at": entry.get("at"), "by": entry.get("by"), "changed": len(entry.get("set", {})) + len(entry.get("unset", ()))} for entry in reversed(read_history(folder_path))]
+
+
+def load_version(folder_path, version):
+    return replay(read_history(folder_path), version)
+
+
+def accord_timeline(folder_path):
+    """{created_at, <accord>_at} depuis le journal : date de la première version, et pour chaque accord
+    la date de la version où il est passé à "Accordé" (None s'il ne l'est pas dans la dernière version)."""
+    entries = read_history(folder_path)
+    timeline = {"created_at": entries[0].get("at") if entries else None}
+    for field in ACCORD_FIELDS:
+        status, at = None, None
+        for entry in entries:
+            values = entry.get("set", {})
+            if field in values:
+                if values[field] == ACCORDED and status != ACCORDED: at = entry.get("at")
+                status = values[field]
+            elif field in entry.get("unset", ()) or entry.get("snapshot"):
+                status = None
+        timeline[f"{field}_at"] = at if status == ACCORDED else None
+    return timeline
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Aperçus et vignettes des scans téléversés, en tâche de fond.
+
+Les photos de CIN ou d'actes prises au téléphone pèsent souvent 5 à 15 Mo.
+Pour chaque image ingérée dans le magasin de blobs (upload_store), un pool de
+threads produit une vignette et un aperçu web en JPEG, rangés sous l'empreinte
+du contenu d'origine (donc partagés par tous les dossiers qui référencent le même
+scan). Les pages n'affichent que ces fichiers dérivés, jamais l'image d'origine.
+Le blob d'origine n'est jamais modifié ni recompressé : pièces justificatives légales et
+médicales, partagées par tous les dossiers qui les référencent, dont le nom est l'empreinte
+SHA-256 du contenu (upload_store s'y fie) et que le dossier complet (dossier_bundle) reprend tel quel.
+"""
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+IMAGE_TYPES = {"image/jpeg": "JPEG", "image/jpg": "JPEG", "image/png": "PNG"}
+IMAGE_EXTENSIONS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG"}
+THUMBNAIL_SIZE = 256
+PREVIEW_SIZE = 1600
+PREVIEW_QUALITY = 80
+
+
+def image_format(reference):
+    """Format PIL ("JPEG", "PNG") du document référencé, ou None si ce n'est pas une image."""
+    return IMAGE_TYPES.get(reference.get("type") or "") or IMAGE_EXTENSIONS.get(os.path.splitext(reference["name"])[1].lower())
+
+
+def _save_atomic(path, save):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(path), suffix='.part', delete=False) as tmp:
+        try: save(tmp)
+        except BaseException:
+            tmp.close(); os.remove(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+    return os.path.getsize(path)
+
+
+def _jpeg_ready(img):
+    return img.convert("RGB") if img.mode not in ("RGB", "L") else img
+
+
+class ImagePipeline:
+    def __init__(self, upload_store, max_workers=2, thumbnail_size=THUMBNAIL_SIZE, preview_size=PREVIEW_SIZE, preview_quality=PREVIEW_QUALITY):
+        self.upload_store = upload_store
+        self.derived_folder = os.path.join(upload_store.blob_folder, "derived")
+        self.thumbnail_size = thumbnail_size
+        self.preview_size = preview_size
+        self.preview_quality = preview_quality
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-pipeline")
+        self._lock = threading.Lock()
+        self._submitted = set() # empreintes déjà traitées ou en cours
+        self.stats = {"queued": 0, "processed": 0, "failed": 0, "derived_bytes": 0}
+
+    def derived_path(self, digest, kind):
+        return os.path.join(self.derived_folder, digest[:2], f"{digest}.{kind}.jpg")
+
+    def thumbnail_path(self, digest):
+        """Vignette du blob `digest` si elle est prête, sinon None."""
+        path = self.derived_path(digest, "thumb")
+        return path if os.path.exists(path) else None
+
+    def preview_path(self, digest):
+        path = self.derived_path(digest, "preview")
+        return path if os.path.exists(path) else None
+
+    def pending(self):
+        return self.stats["queued"] - self.stats["processed"] - self.stats["failed"]
+
+    def submit(self, reference):
+        """Met en file le traitement de l'image référencée ; sans effet si ce n'est pas une image ou si c'est déjà fait."""
+        fmt = image_format(reference)
+        digest = reference["sha256"]
+        if fmt is None:
+            return None
+        with self._lock:
+            if digest in self._submitted:
+                return None
+            self._submitted.add(digest)
+            if os.path.exists(self.derived_path(digest, "thumb")) and os.path.exists(self.derived_path(digest, "preview")):
+                return None # déjà produit par un process précédent
+            self.stats["queued"] += 1
+        return self._executor.submit(self._process, digest)
+
+    def _process(self, digest):
+        blob = self.upload_store.blob_path(digest)
+        try:
+            with Image.open(blob) as img:
+                img.load()
+                oriented = ImageOps.exif_transpose(img) # photos de téléphone : l'orientation est souvent dans l'EXIF
+                derived = 0
+                for kind, size in (("preview", self.preview_size), ("thumb", self.thumbnail_size)):
+                    copy = _jpeg_ready(oriented.copy()); copy.thumbnail((size, size))
+                    derived += _save_atomic(self.derived_path(digest, kind), lambda f: copy.save(f, "JPEG", quality=self.preview_quality, optimize=True))
+        except Exception as e:
+            logging.error(f"Traitement de l'image {digest[:12]} impossible : {e}")
+            with self._lock: self.stats["failed"] += 1
+            return
+        with self._lock:
+            self.stats["processed"] += 1; self.stats["derived_bytes"] += derived
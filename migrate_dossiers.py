@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Migration en lot des dossiers data.json / patient_data.json vers le format binaire (dossier.msgpack).
+
+Usage (depuis le dossier de l'application) :
+    python migrate_dossiers.py                  # tous les dossiers, tous les cœurs
+    python migrate_dossiers.py IPP1 IPP2 -j 4   # dossiers choisis, 4 processus
+    python migrate_dossiers.py --dry-run        # conversion et vérification seulement, rien n'est écrit
+    python migrate_dossiers.py --keep-legacy    # garde les fichiers JSON d'origine (plus anciens que dossier.msgpack, donc ignorés)
+
+Chaque dossier est converti sous son verrou de sauvegarde (dossier_store.DossierLock).
+Le fichier converti est le plus récent (find_dossier_file, comme à la lecture) : si data.json et
+patient_data.json coexistent, une sauvegarde de test.py postérieure à celle de l'application l'emporte.
+La conversion est vérifiée deux fois : décodage de l'encodage en mémoire, puis relecture
+du fichier écrit ; les deux doivent être identiques au JSON d'origine.
+
+Un fichier JSON n'est supprimé que si son contenu est vérifié : identique au dossier converti, ou à
+une version du journal history.jsonl (une sauvegarde de l'application l'a remplacé, il y est conservé).
+Un fichier différent des deux est gardé et signalé comme conflit, à examiner à la main ; de même, un
+dossier.msgpack plus ancien qui ne serait ni l'un ni l'autre n'est pas écrasé (échec du dossier).
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dossier_format import BINARY_FILENAME, LEGACY_FILENAMES, canonical, decode_dossier, encode_dossier, msgpack, read_dossier_file
+from dossier_index import dossier_files, find_dossier_file
+from dossier_store import DossierLock, read_history, replay, write_dossier_file
+
+BASE_UPLOAD_FOLDER = "patient_uploads_allogreffe" # même valeur que dans app.py (non importé : inutile de charger Streamlit ici)
+
+
+def list_folders(base_folder, ipps=None):
+    if ipps:
+        return [os.path.join(base_folder, ipp) for ipp in ipps]
+    with os.scandir(base_folder) as entries:
+        return sorted(entry.path for entry in entries if entry.is_dir() and not entry.name.startswith('.'))
+
+
+def removable_check(folder_path, expected):
+    """checked(fichier) : vrai si ce fichier du dossier peut disparaître, son contenu étant celui du dossier converti ou une version du journal."""
+    versions = None
+    def checked(name):
+        nonlocal versions
+        try: content = canonical(read_dossier_file(os.path.join(folder_path, name)))
+        except (OSError, ValueError): return False # illisible : rien ne prouve qu'il est conservé ailleurs
+        if content == expected: return True
+        if versions is None: # journal relu seulement en cas de différence
+            entries = read_history(folder_path)
+            versions = {canonical(replay(entries, entry["v"])) for entry in entries}
+        return content in versions
+    return checked
+
+
+def migrate_folder(job):
+    """Exécuté dans un processus du pool : (dossier, statut, octets avant, octets après, erreur ou None, fichiers JSON conservés car différents)."""
+    folder_path, dry_run, keep_legacy = job
+    ipp = os.path.basename(folder_path)
+    try:
+        with DossierLock(folder_path):
+            present = [name for name, _ in dossier_files(folder_path)]
+            source, _ = find_dossier_file(folder_path) # le plus récent
+            if source is None:
+                return ipp, "absent", 0, 0, None, []
+            legacy = [name for name in present if name in LEGACY_FILENAMES and name != source]
+            if source == BINARY_FILENAME and not legacy:
+                return ipp, "déjà migré", 0, 0, None, []
+            data = read_dossier_file(os.path.join(folder_path, source))
+            expected = canonical(data)
+            checked = removable_check(folder_path, expected)
+            size_before = size_after = 0
+            if source != BINARY_FILENAME:
+                if BINARY_FILENAME in present and not checked(BINARY_FILENAME):
+                    raise ValueError(f"{BINARY_FILENAME} plus ancien que {source} mais différent, et absent de l'historique : conflit à résoudre à la main")
+                raw = encode_dossier(data)
+                if canonical(decode_dossier(raw)) != expected:
+                    raise ValueError("aller-retour en mémoire différent du JSON d'origine")
+                size_before, size_after = os.path.getsize(os.path.join(folder_path, source)), len(raw)
+                legacy.append(source)
+            kept = [name for name in legacy if not checked(name)]
+            if dry_run:
+                return ipp, "vérifié", size_before, size_after, None, kept
+            if source != BINARY_FILENAME:
+                write_dossier_file(folder_path, data, BINARY_FILENAME)
+                if canonical(read_dossier_file(os.path.join(folder_path, BINARY_FILENAME))) != expected:
+                    os.remove(os.path.join(folder_path, BINARY_FILENAME)) # le JSON d'origine reste la référence
+                    raise ValueError("fichier écrit différent du JSON d'origine")
+            if not keep_legacy:
+                for name in legacy:
+                    if name not in kept: os.remove(os.path.join(folder_path, name))
+            return ipp, "migré" if source != BINARY_FILENAME else "déjà migré", size_before, size_after, None, kept
+    except Exception as e:
+        return ipp, "échec", 0, 0, f"{type(e).__name__}: {e}", []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convertit les dossiers Allo-Greffe au format binaire dossier.msgpack.")
+    parser.add_argument("ipps", nargs="*", help="IPP à migrer (par défaut : tous les dossiers)")
+    parser.add_argument("--base", default=BASE_UPLOAD_FOLDER, help=f"dossier racine des patients (par défaut : {BASE_UPLOAD_FOLDER})")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="nombre de processus (par défaut : tous les cœurs)")
+    parser.add_argument("--dry-run", action="store_true", help="convertit et vérifie sans rien écrire")
+    parser.add_argument("--keep-legacy", action="store_true", help="ne supprime pas data.json / patient_data.json après migration")
+    args = parser.parse_args(argv)
+    if msgpack is None:
+        print("msgpack n'est pas installé (pip install msgpack) : migration impossible.", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    jobs = [(folder, args.dry_run, args.keep_legacy) for folder in list_folders(args.base, args.ipps)]
+    counts, failures, conflicts, bytes_before, bytes_after = {}, [], [], 0, 0
+    if jobs:
+        workers = max(1, min(args.workers, len(jobs)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for ipp, status, before, after, error, kept in pool.map(migrate_folder, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+                counts[status] = counts.get(status, 0) + 1
+                bytes_before += before; bytes_after += after
+                if error is not None:
+                    failures.append((ipp, error))
+                conflicts += [(ipp, name) for name in kept]
+
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items())) or "aucun dossier"
+    print(f"{summary} en {time.perf_counter() - started:.2f} s")
+    if bytes_before:
+        print(f"Taille des dossiers convertis : {bytes_before / 1024:.0f} Ko → {bytes_after / 1024:.0f} Ko ({bytes_after / bytes_before:.0%})")
+    for ipp, name in conflicts:
+        print(f"CONFLIT {ipp} : {name} diffère du dossier converti et de son historique, conservé (plus ancien, ignoré à la lecture)", file=sys.stderr)
+    for ipp, error in failures:
+        print(f"ÉCHEC {ipp} : {error}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Recherche de noms tolérante (accents, espaces, tirets) par index de trigrammes.
+
+Les noms sont normalisés ("El Fédini" -> "elfedini") puis découpés en trigrammes.
+Chaque nom distinct n'est indexé qu'une fois, avec la liste des (dossier, rôle)
+qui le portent : un nom de famille partagé par des centaines de dossiers ne coûte
+qu'une entrée dans l'index inversé.
+"""
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+# Rôle affiché -> champs du dossier. Pour les personnes, nom, prénom et "nom prénom" sont indexés.
+NAME_FIELDS = {
+    "Receveur": ("receveur_nom", "receveur_prenom"),
+    "Donneur": ("donneur_nom", "donneur_prenom"),
+    "Père du receveur": ("receveur_nom_pere",),
+    "Mère du receveur": ("receveur_nom_mere",),
+}
+MIN_SCORE = 0.3
+
+_SEPARATORS = re.compile(r"[\s\-_'’.]+")
+
+
+def normalize_name(text):
+    """Minuscules, sans accents, espaces/tirets/apostrophes réduits à un seul espace."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _SEPARATORS.sub(" ", stripped.lower()).strip()
+
+
+def name_key(text):
+    """Forme compacte utilisée pour les trigrammes : "El Fédini" et "Elfedini" donnent "elfedini"."""
+    return normalize_name(text).replace(" ", "")
+
+
+def trigrams(key):
+    if not key:
+        return frozenset()
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def dossier_names(summary):
+    """(rôle, nom) indexables d'un résumé de dossier."""
+    for role, fields in NAME_FIELDS.items():
+        values = [summary.get(field) or "" for field in fields]
+        for value in values + ([" ".join(values)] if len(values) > 1 else []):
+            if value.strip():
+                yield role, value.strip()
+
+
+class NameSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._term_ids = {}     # clé compacte -> id du terme
+        self._term_grams = []   # id -> nombre de trigrammes du terme
+        self._term_grams_array = np.zeros(0, dtype=np.float64) # copie numpy de _term_grams pour le calcul vectorisé des scores
+        self._term_owners = []  # id -> {(dossier, rôle)}
+        self._postings = {}     # trigramme -> [id de terme] (les termes ne sont jamais retirés, seulement leurs propriétaires)
+        self._postings_arrays = {} # trigramme -> copie numpy de la liste, invalidée à chaque ajout
+        self._folder_terms = {} # dossier -> {id de terme} (pour les mises à jour / suppressions)
+        self._display = {}      # dossier -> {rôle: nom complet affiché}
+
+    def __len__(self):
+        return len(self._folder_terms)
+
+    def _term_id(self, key):
+        term_id = self._term_ids.get(key)
+        if term_id is None:
+            grams = trigrams(key)
+            term_id = len(self._term_grams)
+            self._term_ids[key] = term_id
+            self._term_grams.append(len(grams))
+            self._term_owners.append(set())
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(term_id)
+                self._postings_arrays.pop(gram, None)
+        return term_id
+
+    def _posting_array(self, gram):
+        array = self._postings_arrays.get(gram)
+        if array is None:
+            array = self._postings_arrays[gram] = np.array(self._postings.get(gram, ()), dtype=np.int64)
+        return array
+
+    def _remove_locked(self, folder):
+        for term_id in self._folder_terms.pop(folder, ()):
+            self._term_owners[term_id] = {owner for owner in self._term_owners[term_id] if owner[0] != folder}
+        self._display.pop(folder, None)
+
+    def update(self, folder, summary):
+        with self._lock:
+            self._remove_locked(folder)
+            terms = set()
+            display = {}
+            for role, value in dossier_names(summary):
+                key = name_key(value)
+                if not key:
+                    continue
+                term_id = self._term_id(key)
+                self._term_owners[term_id].add((folder, role))
+                terms.add(term_id)
+                if len(value) > len(display.get(role, "")):
+                    display[role] = value
+            if terms:
+                self._folder_terms[folder] = terms
+                self._display[folder] = display
+
+    def remove(self, folder):
+        with self._lock:
+            self._remove_locked(folder)
+
+    def search(self, query, top_k=20, min_score=MIN_SCORE):
+        """Dossiers les plus proches de `query`, triés par score décroissant.
+
+        Le score mélange le coefficient de Dice et la couverture des trigrammes de la requête,
+        pour qu'un nom partiel ("fedini") trouve aussi un nom plus long ("El Fédini").
+        Retourne une liste de dicts {folder, role, name, score}.
+        """
+        query_grams = trigrams(name_key(query))
+        if not query_grams:
+            return []
+        q = len(query_grams)
+        with self._lock:
+            postings = np.concatenate([self._posting_array(gram) for gram in query_grams])
+            if not len(postings):
+                return []
+            if len(self._term_grams_array) != len(self._term_grams):
+                self._term_grams_array = np.array(self._term_grams, dtype=np.float64)
+            counts = np.bincount(postings) # nombre de trigrammes communs par terme
+            term_ids = np.flatnonzero(counts)
+            common = counts[term_ids].astype(np.float64)
+            scores = common / (q + self._term_grams_array[term_ids]) + 0.5 * common / q
+            keep = scores >= min_score
+            term_ids, scores = term_ids[keep], scores[keep]
+            best = {}
+            # Les termes sont parcourus par score décroissant : on s'arrête dès que top_k dossiers sont trouvés.
+            # argpartition évite de trier tous les candidats ; on élargit la fenêtre si elle ne suffit pas.
+            window = top_k * 8
+            while True:
+                if window < len(scores):
+                    candidates = np.argpartition(-scores, window)[:window]
+                else:
+                    candidates = np.arange(len(scores))
+                candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+                best.clear()
+                last_score = None
+                for position in candidates:
+                    score = float(scores[position])
+                    if len(best) >= top_k and score < last_score:
+                        break
+                    for folder, role in self._term_owners[term_ids[position]]:
+                        if folder not in best:
+                            best[folder] = (score, role)
+                            last_score = score
+                if len(best) >= top_k or len(candidates) == len(scores):
+                    break
+                window *= 4
+            ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))[:top_k]
+            return [{"folder": folder, "role": role, "name": self._display[folder][role], "score": round(score, 3)} for folder, (score, role) in ranked]
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Profilage permanent des reruns : histogrammes de latence en mémoire, export Prometheus et JSON lines.
+
+Chaque fonction décorée par `RerunProfiler.timed` (les render_* et les accès disque de l'application)
+et chaque rerun complet sont comptés dans des histogrammes à seuils fixes (comme ceux de Prometheus) :
+un enregistrement coûte un perf_counter, une recherche dichotomique et quelques additions sous verrou,
+de quoi laisser le profilage actif en production.
+
+Histogrammes tenus :
+  - par fonction (tous reruns et toutes sessions confondus) ;
+  - par page : durée du rerun entier, et de chaque fonction appelée pendant un rerun de cette page ;
+  - par session : durée des reruns, pour les MAX_SESSIONS sessions les plus récentes.
+
+Streamlit exécute le script de chaque session dans son propre thread : la page et la session du
+rerun en cours sont gardées dans une variable locale au thread. Un fragment (@st.fragment) relancé
+seul ne passe pas par le script entier : décoré par `RerunProfiler.fragment`, il est compté comme un
+rerun de sa page et de sa session. Les autres appels hors rerun (threads de fond, scripts) ne
+comptent que dans les histogrammes par fonction.
+
+Les exports (metrics.prom, metrics.jsonl) sont écrits par un thread de fond, jamais par le rerun.
+"""
+import bisect
+import datetime
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dossier_store import write_bytes_atomic
+
+# Seuils des histogrammes, en secondes (le dernier seuil, +Inf, est implicite)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_SESSIONS = 200
+METRIC_PREFIX = "allogreffe"
+PROMETHEUS_FILENAME = "metrics.prom"
+JSONL_FILENAME = "metrics.jsonl"
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count, self.total, self.max = 0, 0.0, 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1; self.total += seconds
+        if seconds > self.max: self.max = seconds
+
+    def quantile(self, q):
+        """Estimation depuis les seuils (interpolation linéaire dans le seuil atteint, comme histogram_quantile)."""
+        if not self.count: return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "sum_s": self.total, "mean_s": self.total / self.count if self.count else 0.0, "p50_s": self.quantile(0.5), "p95_s": self.quantile(0.95), "max_s": self.max}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RerunProfiler:
+    def __init__(self, export_folder=None, export_interval=60.0, max_sessions=MAX_SESSIONS):
+        self.export_folder = export_folder # metrics.prom et metrics.jsonl y sont réécrits toutes les `export_interval` secondes
+        self.export_interval = export_interval
+        self.max_sessions = max_sessions
+        self.started_at = datetime.datetime.now()
+        self._lock = threading.Lock()
+        self._current = threading.local()
+        self._last_export = time.monotonic()
+        self._exporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiling-export") if export_folder is not None else None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.functions = {} # fonction -> Histogram
+            self.pages = {} # page -> Histogram des reruns
+            self.page_functions = {} # (page, fonction) -> Histogram
+            self.sessions = OrderedDict() # session -> Histogram des reruns, la plus récente en dernier
+
+    def timed(self, function):
+        """Décorateur : chaque appel de `function` est compté sous son nom."""
+        name = function.__name__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+        return wrapper
+
+    def fragment(self, context):
+        """Décorateur des fonctions @st.fragment ; `context()` -> (session, page) du fragment.
+
+        Appelée pendant un rerun complet, la fonction est comptée comme par `timed` ; relancée seule
+        (rerun du fragment), elle est en plus comptée comme un rerun de sa page et de sa session.
+        """
+        def decorator(function):
+            timed = self.timed(function)
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if getattr(self._current, "started", None) is not None: return timed(*args, **kwargs)
+                self.begin_rerun(*context())
+                try:
+                    return timed(*args, **kwargs)
+                finally:
+                    self.end_rerun()
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds):
+        page = getattr(self._current, "page", None)
+        with self._lock:
+            histogram = self.functions.get(name) or self.functions.setdefault(name, Histogram())
+            histogram.observe(seconds)
+            if page is not None:
+                key = (page, name)
+                histogram = self.page_functions.get(key) or self.page_functions.setdefault(key, Histogram())
+                histogram.observe(seconds)
+
+    def begin_rerun(self, session, page):
+        self._current.page, self._current.session, self._current.started = page, session, time.perf_counter()
+
+    def end_rerun(self, page=None):
+        """Compte le rerun en cours ; `page` : page finalement affichée (celle du début si None)."""
+        started = getattr(self._current, "started", None)
+        if started is None: return None
+        seconds = time.perf_counter() - started
+        page = page or self._current.page
+        with self._lock:
+            (self.pages.get(page) or self.pages.setdefault(page, Histogram())).observe(seconds)
+            session = self.sessions.pop(self._current.session, None) or Histogram()
+            session.observe(seconds)
+            self.sessions[self._current.session] = session
+            while len(self.sessions) > self.max_sessions: self.sessions.popitem(last=False)
+            export = self.export_folder is not None and time.monotonic() - self._last_export >= self.export_interval
+            if export: self._last_export = time.monotonic()
+        self._current.page = self._current.session = self._current.started = None
+        if export: self._exporter.submit(self._write_exports_logged)
+        return seconds
+
+    def _series(self):
+        """[(métrique, labels, Histogram)], copiés sous verrou."""
+        with self._lock:
+            series = [("rerun_seconds", {"page": page}, _copy(h)) for page, h in self.pages.items()]
+            series += [("function_seconds", {"function": name}, _copy(h)) for name, h in self.functions.items()]
+            series += [("page_function_seconds", {"page": page, "function": name}, _copy(h)) for (page, name), h in self.page_functions.items()]
+            series += [("session_rerun_seconds", {"session": session}, _copy(h)) for session, h in self.sessions.items()]
+        return series
+
+    def prometheus_text(self):
+        """Format texte d'exposition de Prometheus (histogrammes cumulés) ; sans les sessions, pour borner la cardinalité."""
+        lines, typed = [], set()
+        for metric, labels, histogram in self._series():
+            if metric == "session_rerun_seconds": continue
+            name = f"{METRIC_PREFIX}_{metric}"
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram"); typed.add(name)
+            base = ",".join(f'{key}="{_label(value)}"' for key, value in labels.items())
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{base}}} {histogram.total:.6f}")
+            lines.append(f"{name}_count{{{base}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def json_lines(self):
+        """Une ligne JSON par histogramme : labels, résumé (p50, p95...) et seuils cumulés."""
+        at = datetime.datetime.now().isoformat(timespec='seconds')
+        lines = []
+        for metric, labels, histogram in self._series():
+            cumulative, buckets = 0, {}
+            for bound, n in zip(BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += n; buckets[str(bound)] = cumulative
+            lines.append(json.dumps({"at": at, "metric": metric, **labels, **histogram.summary(), "buckets": buckets}, ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def write_exports(self):
+        """Réécrit metrics.prom (collecteur textfile de node_exporter, par exemple) et metrics.jsonl."""
+        os.makedirs(self.export_folder, exist_ok=True)
+        write_bytes_atomic(os.path.join(self.export_folder, PROMETHEUS_FILENAME), self.prometheus_text().encode('utf-8'))
+        write_bytes_atomic(os.path.join(self.export_folder, JSONL_FILENAME), self.json_lines().encode('utf-8'))
+
+    def _write_exports_logged(self):
+        try:
+            self.write_exports()
+        except OSError as e:
+            logging.error(f"Export du profilage impossible : {e}")
+
+    def table(self, kind, page=None):
+        """Lignes de résumé pour l'affichage : kind = "pages", "functions", "sessions" ou "page_functions" (d'une page)."""
+        with self._lock:
+            if kind == "page_functions": items = [(name, h) for (p, name), h in self.page_functions.items() if p == page]
+            else: items = list(getattr(self, kind).items())
+            items = [(label, _copy(h)) for label, h in items]
+        return [{"name": label, **histogram.summary()} for label, histogram in items]
+
+
+def _copy(histogram):
+    copy = Histogram()
+    copy.counts, copy.count, copy.total, copy.max = list(histogram.counts), histogram.count, histogram.total, histogram.max
+    return copy
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""QR codes des dossiers, mémorisés pour tout le process.
+
+Le contenu d'un QR code (IPP + nom) ne change presque jamais d'un rerun à l'autre :
+la matrice est calculée une fois par contenu, puis chaque format demandé est
+gardé dans un cache LRU borné, indexé par (contenu, format).
+Le format SVG est dessiné directement depuis la matrice, sans passer par PIL ;
+le rapport PDF dessine la même matrice en rectangles vectoriels.
+"""
+from io import BytesIO
+
+import qrcode
+
+from caching import LRUCache
+
+QR_FORMATS = ("matrix", "svg", "png")
+QR_BORDER = 4      # modules blancs autour du code (zone calme)
+QR_BOX_SIZE = 10   # pixels par module pour la sortie PNG
+
+_cache = LRUCache(max_entries=512, max_weight=8 * 1024 * 1024)
+
+
+def _make_matrix(data):
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=QR_BOX_SIZE, border=0)
+    qr.add_data(data); qr.make(fit=True)
+    return tuple(tuple(bool(module) for module in row) for row in qr.get_matrix())
+
+
+def _make_svg(matrix):
+    # Une ligne de modules noirs consécutifs = un seul segment du chemin
+    size = len(matrix) + 2 * QR_BORDER
+    segments = []
+    for y, x, width in dark_runs(matrix):
+        segments.append(f"M{x + QR_BORDER} {y + QR_BORDER}h{width}v1h-{width}z")
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{"".join(segments)}" fill="#000"/></svg>')
+
+
+def _make_png(data):
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=QR_BOX_SIZE, border=QR_BORDER)
+    qr.add_data(data); qr.make(fit=True)
+    buffer = BytesIO(); qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def dark_runs(matrix):
+    """(ligne, colonne, longueur) de chaque suite horizontale de modules noirs."""
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]: x += 1
+                yield y, start, x - start
+            else:
+                x += 1
+
+
+def qr_code(data, fmt="svg"):
+    """QR code de `data` : matrice de booléens ("matrix"), texte SVG ("svg") ou octets PNG ("png")."""
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Format de QR code inconnu : {fmt}")
+    key = (data, fmt)
+    value = _cache.get(key)
+    if value is None:
+        if fmt == "matrix": value = _make_matrix(data); weight = len(value) ** 2
+        elif fmt == "svg": value = _make_svg(qr_code(data, "matrix")); weight = len(value)
+        else: value = _make_png(data); weight = len(value) # seul format qui passe par PIL
+        _cache.put(key, value, weight=weight)
+    return value
+
+
+def cache_stats():
+    stats = _cache.stats()
+    stats["max_entries"], stats["max_weight"] = _cache.max_entries, _cache.max_weight
+    return stats
+
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Export en colonnes (Parquet ou Arrow IPC) de tous les dossiers : un dossier par ligne, un champ par colonne.
+
+Usage (depuis le dossier de l'application) :
+    python registry_export.py                   # registry_export_allogreffe/registre.parquet, dossiers modifiés seulement
+    python registry_export.py --format arrow    # registre.arrow (Arrow IPC, lisible sans copie par pyarrow / polars)
+    python registry_export.py --full            # relit tous les dossiers
+
+Colonnes : `folder`, `updated_at`, puis tous les champs du modèle de dossier (dossier_model.DossierSchema),
+typés : dates en date32, âges en entiers, éléments des check-lists en booléens, statuts des accords
+en texte. Les pièces jointes (uploads.json de chaque dossier) ne sont pas exportées.
+
+L'export est incrémental : l'empreinte (fichier, mtime, taille, inode) de chaque dossier exporté est
+gardée dans `<export>.manifest.json` ; seuls les dossiers nouveaux ou modifiés sont relus, les autres
+lignes sont reprises telles quelles de l'export précédent. pyarrow est optionnel : sans lui, l'export
+est indisponible et le tableau de bord revient aux DataFrame pandas.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from dossier_format import read_dossier_file
+from dossier_index import find_dossier_file
+from dossier_model import checklist_key, parse_date
+from dossier_store import write_bytes_atomic
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError: # export en colonnes indisponible
+    pa = None
+
+EXPORT_FORMATS = ("parquet", "arrow") if pa is not None else ()
+EXPORT_BASENAME = "registre"
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def export_path(output_folder, fmt):
+    return os.path.join(output_folder, f"{EXPORT_BASENAME}.{fmt}")
+
+
+def columnar(columns):
+    """Table à afficher à partir de {colonne: [valeurs]} : table Arrow (passée telle quelle à st.dataframe) ou, sans pyarrow, DataFrame."""
+    if pa is not None: return pa.table(columns)
+    import pandas as pd # sans pyarrow seulement : le tableau de bord n'a pas besoin de pandas sinon
+    return pd.DataFrame(columns)
+
+
+def _as_int(value):
+    try: return int(value) if value is not None and value != "" else None
+    except (TypeError, ValueError): return None
+
+
+def _as_date(value):
+    try: return parse_date(value) if value != "" else None
+    except (TypeError, ValueError): return None
+
+
+def _checklist_status(data, name, item, legacy_key):
+    """True / False / None (non renseigné) ; les dossiers antérieurs aux check-lists n'ont qu'une clé booléenne par examen."""
+    statuses = data.get(checklist_key(name))
+    if isinstance(statuses, dict):
+        status = statuses.get(item)
+        return status if type(status) is bool else None
+    return True if data.get(legacy_key) is True else None
+
+
+def column_types(schema):
+    """{colonne: (type Arrow, conversion d'une valeur du fichier)} dans l'ordre des colonnes de l'export."""
+    string = (pa.string(), lambda value: value if value is None or isinstance(value, str) else str(value))
+    columns = {"folder": string, "updated_at": (pa.timestamp("ms"), None), "receveur_ipp": string}
+    for key, _, _, default, is_date in schema.scalar_fields:
+        columns[key] = (pa.date32(), _as_date) if is_date else (pa.int64(), _as_int) if type(default) is int else string
+    for key, _, _ in schema.checklist_fields:
+        columns[key] = (pa.bool_(), None) # statut lu dans la check-list du dossier (_checklist_status)
+    return columns
+
+
+def records_table(schema, rows):
+    """Table Arrow de `rows` = [(dossier, mtime, dict lu sur disque)], construite colonne par colonne."""
+    columns = column_types(schema)
+    arrays = {"folder": pa.array([folder for folder, _, _ in rows], pa.string()), "updated_at": pa.array([datetime.datetime.fromtimestamp(mtime) for _, mtime, _ in rows], pa.timestamp("ms"))}
+    for key, name, item in schema.checklist_fields:
+        arrays[key] = pa.array([_checklist_status(data, name, item, key) for _, _, data in rows], pa.bool_())
+    for key, (arrow_type, convert) in columns.items():
+        if key not in arrays:
+            arrays[key] = pa.array([convert(data.get(key)) for _, _, data in rows], arrow_type)
+    return pa.table(arrays, schema=pa.schema([(key, arrow_type) for key, (arrow_type, _) in columns.items()]))
+
+
+def read_table(path):
+    if path.endswith(".parquet"):
+        return pq.read_table(path)
+    with pa.OSFile(path, 'rb') as source: # lu en mémoire : le fichier est remplacé à l'export suivant
+        return pa.ipc.open_file(source).read_all()
+
+
+def _write_table(table, path):
+    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(path) or ".", suffix='.part', delete=False) as tmp:
+        try:
+            if path.endswith(".parquet"): pq.write_table(table, tmp, compression="zstd")
+            else:
+                with pa.ipc.new_file(tmp, table.schema) as writer: writer.write_table(table)
+        except BaseException:
+            tmp.close(); os.remove(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+
+
+def _load_manifest(path, columns):
+    try:
+        with open(path + MANIFEST_SUFFIX, 'r', encoding='utf-8') as f: manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # colonnes différentes (listes de documents ou d'examens modifiées) : tout est relu
+    return manifest.get("fingerprints", {}) if manifest.get("columns") == columns and os.path.exists(path) else {}
+
+
+def export_registry(base_folder, output_folder, schema, fmt="parquet", full=False):
+    """Met à jour l'export `fmt` de tous les dossiers de `base_folder`.
+
+    Retourne {path, format, dossiers, reread, removed, errors, duration_s, size}.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export indisponible : {fmt}")
+    started = time.perf_counter()
+    os.makedirs(output_folder, exist_ok=True)
+    path = export_path(output_folder, fmt)
+    columns = list(column_types(schema))
+    known = {} if full else _load_manifest(path, columns)
+
+    with os.scandir(base_folder) as entries:
+        folders = sorted(entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.'))
+    fingerprints, rows, errors = {}, [], 0
+    for folder in folders:
+        source, fingerprint = find_dossier_file(os.path.join(base_folder, folder))
+        if source is None:
+            continue
+        fingerprints[folder] = [source, *fingerprint]
+        if known.get(folder) == fingerprints[folder]:
+            continue
+        try:
+            rows.append((folder, fingerprint[0] / 1e9, read_dossier_file(os.path.join(base_folder, folder, source))))
+        except Exception as e:
+            logging.error(f"Dossier {folder} non exporté : {e}")
+            del fingerprints[folder]; errors += 1
+
+    stale = [folder for folder in known if known[folder] != fingerprints.get(folder)]
+    table = records_table(schema, rows)
+    if known:
+        previous = read_table(path)
+        if stale: previous = previous.filter(pc.invert(pc.is_in(previous["folder"], value_set=pa.array(stale, pa.string()))))
+        table = pa.concat_tables([previous.cast(table.schema), table])
+    table = table.sort_by("folder")
+    _write_table(table, path)
+    write_bytes_atomic(path + MANIFEST_SUFFIX, json.dumps({"columns": columns, "fingerprints": fingerprints}).encode('utf-8'))
+    removed = sum(1 for folder in known if folder not in fingerprints)
+    logging.info(f"Registre exporté : {path} ({table.num_rows} dossiers, {len(rows)} relus)")
+    return {"path": path, "format": fmt, "dossiers": table.num_rows, "reread": len(rows), "removed": removed, "errors": errors, "duration_s": time.perf_counter() - started, "size": os.path.getsize(path)}
+
+
+def main(argv=None):
+    import app # listes de documents et d'examens, dossiers de l'application
+
+    parser = argparse.ArgumentParser(description="Exporte tous les dossiers Allo-Greffe en Parquet ou Arrow.")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--output", default=app.REGISTRY_EXPORT_FOLDER, help=f"dossier de l'export (par défaut : {app.REGISTRY_EXPORT_FOLDER})")
+    parser.add_argument("--full", action="store_true", help="relit tous les dossiers au lieu des seuls dossiers modifiés")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    if pa is None:
+        print("pyarrow n'est pas installé (pip install pyarrow) : export impossible.", file=sys.stderr)
+        return 2
+    result = export_registry(app.BASE_UPLOAD_FOLDER, args.output, app.get_dossier_schema(), args.format, args.full)
+    print(f"{result['path']} : {result['dossiers']} dossier(s), {result['reread']} relu(s), {result['removed']} retiré(s), {result['errors']} erreur(s) en {result['duration_s']:.2f} s ({result['size'] / 1024:.0f} Ko)")
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
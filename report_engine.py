@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Moteur de rendu des rapports PDF, réutilisable d'un rapport à l'autre.
+
+Ce module est importé une seule fois par process (contrairement à app.py, réexécuté
+à chaque rerun Streamlit), ce qui permet de garder :
+- les polices DejaVu parsées une seule fois, puis recopiées dans chaque nouveau document ;
+- le sous-ensemble de police embarqué : il est pré-rempli avec tout l'alphabet latin
+  utilisé par les dossiers, donc identique d'un rapport à l'autre, et son flux
+  (TTFontFile.makeSubset, ~90 % du temps de rendu) et son tableau de largeurs ne sont
+  calculés qu'une fois ;
+- les libellés et lignes de check-list déjà formatés.
+"""
+import copy
+import functools
+import logging
+import threading
+
+import fpdf.fpdf as fpdf_module
+from fpdf import FPDF
+
+from caching import LRUCache
+from qr_codes import QR_BORDER, dark_runs, qr_code
+
+FONT_FAMILY = 'DejaVu'
+FONT_FILES = {'': 'DejaVuSans.ttf', 'B': 'DejaVuSans-Bold.ttf', 'I': 'DejaVuSans-Oblique.ttf'} # seule la variante '' est obligatoire
+QR_SIZE_MM = 30 # côté du QR code du dossier, zone calme comprise
+# ASCII imprimable et Latin-1 (accents français), plus la ponctuation typographique courante
+PRELOADED_CHARS = list(range(32, 127)) + list(range(160, 256)) + [ord(c) for c in "’‘“”–—…•€"]
+# Un nom hors Latin-1 (arabe, par exemple) donne un nouvel ensemble de caractères, donc un sous-ensemble de plus : caches bornés
+SUBSET_CACHE_MAX_ENTRIES = 64
+SUBSET_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+_font_lock = threading.Lock()
+_font_templates = {}    # (clé de police, fichier) -> (entrée de self.fonts, entrées de self.font_files), ou TTFFont avec fpdf2
+_missing_fonts = set()  # fichiers introuvables, pour ne pas retenter (ni re-logger) à chaque rapport
+_subset_lock = threading.Lock()
+_subset_cache = LRUCache(SUBSET_CACHE_MAX_ENTRIES, SUBSET_CACHE_MAX_BYTES) # (fichier, ensemble de caractères) -> (flux, codeToGlyph, maxUni), poids : taille du flux
+_widths_cache = LRUCache(SUBSET_CACHE_MAX_ENTRIES) # (fichier, ensemble de caractères, maxUni) -> tableau /W des largeurs
+
+if hasattr(fpdf_module, 'TTFontFile'): # fpdf 1.7 : sous-ensemble calculé par TTFontFile.makeSubset à chaque output()
+    class _CachedTTFontFile(fpdf_module.TTFontFile):
+        def makeSubset(self, file, subset):
+            key = (file, frozenset(subset)) # fpdf ajoute chaque caractère écrit, doublons compris : seul l'ensemble compte
+            cached = _subset_cache.get(key)
+            if cached is None:
+                stream = super().makeSubset(file, subset)
+                cached = (stream, dict(self.codeToGlyph), self.maxUni)
+                _subset_cache.put(key, cached, weight=len(stream))
+            stream, self.codeToGlyph, self.maxUni = cached
+            return stream
+else:
+    _CachedTTFontFile = None
+
+try: # fpdf2 : la police parsée (TTFFont) sert de modèle, recopié pour chaque document
+    from fontTools import ttLib
+    from fpdf.fonts import SubsetMap, TTFFont
+    TTFFont.__slots__
+except (ImportError, AttributeError):
+    TTFFont = None
+
+
+def _fpdf2_font(template, index):
+    """Copie d'une police fpdf2 déjà parsée : métriques partagées, sous-ensemble et fichier propres au document."""
+    font = TTFFont.__new__(TTFFont)
+    for name in TTFFont.__slots__:
+        if hasattr(template, name): setattr(font, name, getattr(template, name))
+    font.i = index
+    font.ttfont = ttLib.TTFont(font.ttffile, recalcTimestamp=False, fontNumber=font.collection_font_number, lazy=True) # réduit sur place par fpdf2 à l'output
+    if font.is_compressed: font.ttfont.flavor = None
+    font.missing_glyphs, font.biggest_size_pt, font._hbfont = [], 0, None
+    font.subset = SubsetMap(font)
+    return font
+
+
+def subset_cache_stats():
+    return _subset_cache.stats()
+
+
+def _add_font_once(pdf, style, fname):
+    """Ajoute la police au document en ne la parsant qu'à la première demande du process. False si le fichier manque."""
+    fontkey = FONT_FAMILY.lower() + style
+    key = (fontkey, fname)
+    if fontkey in pdf.fonts:
+        return True
+    if fname in _missing_fonts:
+        return False
+    template = _font_templates.get(key)
+    if template is None:
+        with _font_lock:
+            template = _font_templates.get(key)
+            if template is None:
+                try:
+                    pdf.add_font(FONT_FAMILY, style, fname, **({'uni': True} if _CachedTTFontFile is not None else {})) # 'uni' déprécié par fpdf2
+                except (RuntimeError, OSError): # RuntimeError avec fpdf 1.7, FileNotFoundError avec fpdf2
+                    _missing_fonts.add(fname)
+                    if not style:
+                        logging.warning("DejaVuSans.ttf not found. PDF may not render special characters correctly. Please download it and place it in the same folder as the script.")
+                    return False
+                font = pdf.fonts[fontkey]
+                if isinstance(font, dict): # structure fpdf 1.7
+                    font['subset'] += [c for c in PRELOADED_CHARS if c not in font['subset']]
+                    _font_templates[key] = (copy.deepcopy(font), {name: dict(entry) for name, entry in pdf.font_files.items() if name in (fontkey, fname)})
+                elif TTFFont is not None and isinstance(font, TTFFont) and font.color_font is None: # fpdf2 ; une police couleur reste liée à son document
+                    _font_templates[key] = _fpdf2_font(font, 0)
+                return True
+    if not isinstance(template, tuple):
+        pdf.fonts[fontkey] = _fpdf2_font(template, len(pdf.fonts) + 1)
+        return True
+    font, font_files = template
+    pdf.fonts[fontkey] = dict(font, i=len(pdf.fonts) + 1, subset=list(font['subset'])) # 'cw' et 'desc' restent partagés (lecture seule)
+    for name, entry in font_files.items():
+        pdf.font_files[name] = dict(entry)
+    return True
+
+
+@functools.lru_cache(maxsize=1024)
+def _label(key):
+    return f"{key.replace('_', ' ').title()}: "
+
+
+@functools.lru_cache(maxsize=1024)
+def _check_row(item, status):
+    return f"- {item}: {'Oui' if status else 'Non'}"
+
+
+class PDF(FPDF):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if _add_font_once(self, '', FONT_FILES['']):
+            self.base_font = FONT_FAMILY
+            self.font_styles = {style for style, fname in FONT_FILES.items() if _add_font_once(self, style, fname)}
+        else:
+            self.base_font = 'Arial' # Fallback font
+            self.font_styles = {'', 'B', 'I'}
+
+    def set_font(self, family, style='', size=0):
+        if family == self.base_font and style not in self.font_styles: style = '' # variante grasse/italique absente : police normale
+        super().set_font(family, style, size)
+
+    def _putfonts(self):
+        if _CachedTTFontFile is None:
+            return super()._putfonts()
+        with _subset_lock: # substitution limitée à ce document
+            original, fpdf_module.TTFontFile = fpdf_module.TTFontFile, _CachedTTFontFile
+            try: super()._putfonts()
+            finally: fpdf_module.TTFontFile = original
+
+    def _putTTfontwidths(self, font, maxUni):
+        # fpdf 1.7 parcourt tous les codes jusqu'à maxUni en testant l'appartenance à une liste : on garde le résultat
+        key = (font['ttffile'], frozenset(font['subset']), maxUni)
+        widths = _widths_cache.get(key)
+        if widths is None:
+            lines = []
+            original, self._out = self._out, lines.append
+            try: super()._putTTfontwidths(dict(font, subset=set(font['subset'])), maxUni)
+            finally: self._out = original
+            _widths_cache.put(key, lines); widths = lines
+        for line in widths:
+            self._out(line)
+
+    def header(self): self.set_font(self.base_font, 'B', 14); self.cell(0, 10, 'Dossier Patient Allo-Greffe', 0, 1, 'C'); self.ln(5)
+    def footer(self): self.set_y(-15); self.set_font(self.base_font, 'I', 8); self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+    def chapter_title(self, title): self.set_font(self.base_font, 'B', 12); self.set_fill_color(220, 230, 240); self.cell(0, 8, title, 0, 1, 'L', fill=True); self.ln(3)
+
+    def chapter_body(self, data_dict):
+        label_width = 50
+        value_width = self.w - self.l_margin - self.r_margin - label_width - 2
+        for key, value in data_dict.items():
+            self.set_font(self.base_font, 'B', 10); self.cell(label_width, 6, _label(key), 0, 0)
+            self.set_font(self.base_font, '', 10); self.multi_cell(value_width, 6, str(value), 0, 'L')
+        self.ln(2)
+
+    def check_list(self, title, items_dict):
+        self.chapter_title(title)
+        for item, status in items_dict.items():
+            self.set_font(self.base_font, 'B' if status else '', 10) # Bold if status is True
+            self.cell(0, 7, _check_row(item, bool(status)), 0, 1)
+        self.ln(4)
+
+
+    def qr_code(self, matrix, x, y, size):
+        """QR code vectoriel (un rectangle par suite de modules noirs), `size` mm de côté zone calme comprise."""
+        module = size / (len(matrix) + 2 * QR_BORDER)
+        self.set_fill_color(0, 0, 0)
+        for row, col, width in dark_runs(matrix):
+            self.rect(x + (col + QR_BORDER) * module, y + (row + QR_BORDER) * module, width * module, module, 'F')
+
+
+def render_report(sections, qr_data=None):
+    """Rapport complet en bytes. `sections` : {titre: {libellé: valeur}}, la dernière section étant la check-list.
+
+    Si `qr_data` est donné, son QR code (matrice issue du cache de qr_codes) est dessiné après la check-list.
+    """
+    pdf = PDF('P', 'mm', 'A4'); pdf.set_auto_page_break(auto=True, margin=15); pdf.add_page()
+    *info_sections, checklist_title = sections
+    for title in info_sections:
+        pdf.chapter_title(title); pdf.chapter_body(sections[title])
+    pdf.check_list(checklist_title, sections[checklist_title])
+    if qr_data:
+        if pdf.get_y() + QR_SIZE_MM > pdf.h - pdf.b_margin: pdf.add_page()
+        pdf.qr_code(qr_code(qr_data, "matrix"), pdf.l_margin, pdf.get_y(), QR_SIZE_MM)
+    output = pdf.output(dest='S')
+    return output.encode('latin-1') if isinstance(output, str) else bytes(output) # fpdf 1.7 retourne une str latin-1, fpdf2 un bytearray
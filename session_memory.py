@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Empreinte mémoire des sessions : taille estimée de st.session_state, clé par clé, et RSS du process.
+
+Chaque session Streamlit garde son état (champs du dossier, check-lists, résultats de recherche,
+valeurs des widgets à clé) dans la mémoire du worker, tant que l'onglet reste ouvert : avec de nombreux
+coordinateurs connectés, c'est ce qui fait grimper la mémoire d'un process. `deep_size` estime les
+octets d'une valeur et de tout ce qu'elle contient (sys.getsizeof, objets partagés comptés une fois) ;
+`SessionMemory` garde la dernière mesure des MAX_SESSIONS sessions les plus récentes, pour la page
+Administration.
+
+Estimation seulement : les chaînes internées et les objets partagés avec d'autres sessions (ou avec les
+caches du process) sont comptés dans chaque session qui les référence.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+MAX_SESSIONS = 200
+_CONTAINERS = (dict, list, tuple, set, frozenset)
+_OPAQUE = (str, bytes, bytearray, int, float, complex, bool, type(None), type, type(sys), type(len), type(lambda: None))
+
+
+def deep_size(value, seen=None):
+    """Octets estimés de `value` et de son contenu ; `seen` (ids déjà comptés) permet de mesurer plusieurs valeurs sans double compte.
+
+    Les DataFrame et Series pandas sont mesurés par memory_usage(deep=True), sans parcourir leurs objets internes.
+    """
+    seen = set() if seen is None else seen
+    total, stack = 0, [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen: continue
+        seen.add(id(obj))
+        if isinstance(obj, _OPAQUE):
+            total += sys.getsizeof(obj); continue
+        if isinstance(obj, _CONTAINERS):
+            total += sys.getsizeof(obj)
+            if isinstance(obj, dict): stack.extend(obj.keys()); stack.extend(obj.values())
+            else: stack.extend(obj)
+            continue
+        memory_usage = getattr(obj, "memory_usage", None)
+        if callable(memory_usage) and type(obj).__module__.startswith("pandas"):
+            usage = memory_usage(deep=True)
+            total += int(usage.sum() if hasattr(usage, "sum") else usage); continue
+        total += sys.getsizeof(obj)
+        if hasattr(obj, "__dict__"): stack.append(obj.__dict__)
+        for name in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, name): stack.append(getattr(obj, name))
+    return total
+
+
+def state_sizes(state):
+    """{clé: octets estimés} d'un mapping (st.session_state) ; ce qui est partagé entre clés est compté pour la première."""
+    if hasattr(state, "to_dict"): state = state.to_dict() # st.session_state : une copie d'un bloc plutôt qu'un accès verrouillé par clé
+    seen = set()
+    return {key: deep_size(value, seen) for key, value in state.items()}
+
+
+def process_rss():
+    """Mémoire résidente actuelle du process en octets (Linux) ; à défaut, le pic (ru_maxrss) ; None si inconnue."""
+    try:
+        with open("/proc/self/statm", 'r') as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # octets sous macOS, Ko ailleurs
+
+
+class SessionMemory:
+    """Dernière mesure de l'état de chaque session, pour les `max_sessions` sessions les plus récentes."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self.sessions = OrderedDict() # session -> (heure de la mesure, page, {clé: octets}), la plus récente en dernier
+
+    def record(self, session, state, page=None):
+        """Mesure `state` (st.session_state de la session) ; retourne le total en octets."""
+        sizes = state_sizes(state)
+        with self._lock:
+            self.sessions.pop(session, None)
+            self.sessions[session] = (time.time(), page, sizes)
+            while len(self.sessions) > self.max_sessions: self.sessions.popitem(last=False)
+        return sum(sizes.values())
+
+    def table(self):
+        """Une ligne par session suivie, la plus lourde en premier."""
+        with self._lock:
+            entries = list(self.sessions.items())
+        rows = []
+        for session, (at, page, sizes) in entries:
+            largest = max(sizes, key=sizes.get) if sizes else None
+            rows.append({"session": session, "page": page, "keys": len(sizes), "bytes": sum(sizes.values()), "largest_key": largest, "largest_bytes": sizes.get(largest, 0), "measured_at": at})
+        return sorted(rows, key=lambda row: row["bytes"], reverse=True)
+
+    def total(self):
+        """Somme des dernières mesures de toutes les sessions suivies, en octets."""
+        with self._lock:
+            return sum(sum(sizes.values()) for _, _, sizes in self.sessions.values())
@@ -9,6 +9,8 @@ import base64
 import logging
 import qrcode
 from io import BytesIO
+from dossier_format import read_dossier_file
+from dossier_index import find_dossier_file
 
 # --- Configuration & Global Constants ---
 st.set_page_config(
@@ -166,14 +168,13 @@ def save_patient_data(state):
         return False
 
 def load_patient_data(ipp):
-    """Loads a patient's data from their JSON file into the session state."""
-    json_path = os.path.join(BASE_UPLOAD_FOLDER, ipp, "patient_data.json")
-    if not os.path.exists(json_path):
+    """Loads a patient's data into the session state, from whichever dossier file is the newest (app.py writes dossier.msgpack or data.json)."""
+    source, _ = find_dossier_file(os.path.join(BASE_UPLOAD_FOLDER, ipp))
+    if source is None:
         st.error(f"Aucun dossier trouvé pour l'IPP: {ipp}")
         return False
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = read_dossier_file(os.path.join(BASE_UPLOAD_FOLDER, ipp, source))
         
         # Reset state before loading new data, preserving active page
         active_page = st.session_state.get('active_page')
@@ -426,10 +427,11 @@ def render_search_page():
         results = []
         if os.path.exists(BASE_UPLOAD_FOLDER):
             for ipp_folder in os.listdir(BASE_UPLOAD_FOLDER):
-                patient_data_path = os.path.join(BASE_UPLOAD_FOLDER, ipp_folder, "patient_data.json")
-                if os.path.isdir(os.path.join(BASE_UPLOAD_FOLDER, ipp_folder)) and os.path.exists(patient_data_path):
+                source, _ = find_dossier_file(os.path.join(BASE_UPLOAD_FOLDER, ipp_folder))
+                if source is not None:
+                    patient_data_path = os.path.join(BASE_UPLOAD_FOLDER, ipp_folder, source)
                     try:
-                        with open(patient_data_path, 'r', encoding='utf-8') as f: data = json.load(f)
+                        data = read_dossier_file(patient_data_path)
                         
                         match = False
                         query = st.session_state.search_query.lower()
@@ -440,7 +442,7 @@ def render_search_page():
                             if query in full_name.lower():
                                 match = True
                         if match: results.append(data)
-                    except (json.JSONDecodeError, KeyError) as e:
+                    except (ValueError, KeyError) as e: # JSON invalide ou dossier binaire illisible
                         logging.warning(f"Skipping corrupted or invalid data file: {patient_data_path} - {e}")
         st.session_state.search_results = results
 
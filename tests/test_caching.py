@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Cache des dossiers : le poids d'une entrée est sa taille en mémoire, pas celle du fichier."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from caching import DossierCache  # noqa: E402
+from dossier_store import save_dossier  # noqa: E402
+from session_memory import deep_size  # noqa: E402
+
+
+def dossier(ipp):
+    return {"receveur_ipp": ipp, "receveur_nom": "El Fédini", "receveur_prenom": "Anaïs", "receveur_date_naissance": "2011-05-04",
+            "checklist_medical": {"Rx Thorax": True, "FISH": False}, "accord_tribunal": "Accordé"}
+
+
+def test_entries_are_weighed_by_their_size_in_memory(tmp_path):
+    for ipp in ("IPP1", "IPP2"):
+        save_dossier(str(tmp_path / ipp), dossier(ipp))
+    cache = DossierCache(str(tmp_path))
+    data = cache.load("IPP1")
+    assert data == dossier("IPP1")
+    assert cache.stats()["weight"] == deep_size(data)
+    assert deep_size(data) > sum(entry.stat().st_size for entry in os.scandir(tmp_path / "IPP1") if entry.name.startswith(("dossier.", "data.")))
+
+    budget = DossierCache(str(tmp_path), max_weight=deep_size(data)) # place pour un seul dossier parsé
+    budget.load("IPP1"); budget.load("IPP2")
+    assert budget.stats()["entries"] == 1 and budget.stats()["evictions"] == 1
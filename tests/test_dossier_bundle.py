@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Dossier complet en PDF : le fichier fusionné se relit avec pypdf, chaque page garde sa taille et ses ressources."""
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pypdf = pytest.importorskip("pypdf")
+fpdf = pytest.importorskip("fpdf")
+Image = pytest.importorskip("PIL.Image")
+
+from dossier_bundle import write_pdf  # noqa: E402
+
+
+def fpdf_bytes(pages, orientation="P"):
+    """PDF produit par fpdf : MediaBox et Resources sont posés sur l'arbre /Pages, pas sur chaque page."""
+    pdf = fpdf.FPDF(orientation=orientation)
+    pdf.set_font("helvetica", size=12)
+    for i in range(pages):
+        pdf.add_page(); pdf.cell(40, 10, f"page {i + 1}")
+    data = pdf.output(dest="S")
+    return data.encode("latin-1") if isinstance(data, str) else bytes(data)
+
+
+def test_merged_pages_keep_inherited_mediabox_and_resources(tmp_path):
+    attachment = tmp_path / "piece.pdf"
+    attachment.write_bytes(fpdf_bytes(1, orientation="L"))
+    photo = tmp_path / "photo.png"
+    Image.new("RGB", (40, 30), "white").save(photo)
+
+    out = io.BytesIO()
+    pages, skipped = write_pdf(out, fpdf_bytes(2), [(str(attachment), "piece.pdf"), (str(photo), "photo.png")])
+    assert (pages, skipped) == (4, [])
+
+    out.seek(0)
+    reader = pypdf.PdfReader(out)
+    assert len(reader.pages) == 4
+    for page in reader.pages:
+        assert len(page.mediabox) == 4 and page.mediabox.width > 0 and page.mediabox.height > 0
+        assert "/Resources" in page
+        assert page.get("/Parent").get_object() == reader.trailer["/Root"]["/Pages"].get_object()
+    assert reader.pages[0].mediabox.width < reader.pages[0].mediabox.height # portrait du rapport
+    assert reader.pages[2].mediabox.width > reader.pages[2].mediabox.height # paysage de la pièce jointe
+
+
+def test_source_page_trees_are_not_copied():
+    out = io.BytesIO()
+    write_pdf(out, fpdf_bytes(2), [])
+    out.seek(0)
+    reader = pypdf.PdfReader(out)
+    types = [reader.get_object(number).get("/Type") for number in range(1, int(reader.trailer["/Size"])) if isinstance(reader.get_object(number), pypdf.generic.DictionaryObject)]
+    assert types.count("/Pages") == 1
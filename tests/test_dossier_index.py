@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Index des dossiers : fichier de dossier retenu quand plusieurs formats coexistent, recherche par IPP."""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dossier_index import DossierIndex, find_dossier_file  # noqa: E402
+
+
+def write_json(path, data, mtime):
+    with open(path, 'w', encoding='utf-8') as f: json.dump(data, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_newest_file_wins_over_format_priority(tmp_path):
+    folder = tmp_path / "IPP1"; folder.mkdir()
+    write_json(folder / "data.json", {"receveur_ipp": "IPP1", "receveur_nom": "Ancien"}, 1_000_000)
+    write_json(folder / "patient_data.json", {"receveur_ipp": "IPP1", "receveur_nom": "Nouveau"}, 2_000_000) # test.py, après l'application
+    assert find_dossier_file(str(folder))[0] == "patient_data.json"
+
+    index = DossierIndex(str(tmp_path)); index.refresh()
+    assert [row["receveur_nom"] for row in index.query_dossiers()] == ["Nouveau"]
+
+    write_json(folder / "data.json", {"receveur_ipp": "IPP1", "receveur_nom": "Application"}, 3_000_000)
+    index.refresh()
+    assert [row["receveur_nom"] for row in index.query_dossiers()] == ["Application"]
+
+
+def test_equal_mtimes_keep_the_preference_order(tmp_path):
+    for name in ("patient_data.json", "data.json"):
+        write_json(tmp_path / name, {}, 1_000_000)
+    assert find_dossier_file(str(tmp_path))[0] == "data.json"
+
+
+def test_ipp_search_uses_indexes_and_follows_updates(tmp_path):
+    index = DossierIndex(str(tmp_path))
+    index.upsert_many([(ipp, {"receveur_ipp": ipp}) for ipp in ("IPP1200", "IPP3412", "XÉ_120", "AB9")])
+    search = lambda query: [row["folder"] for row in index.search(query, 'IPP')]
+
+    assert search("120") == (["IPP1200", "XÉ_120"] if index._ipp_trigrams else []) # sous-chaîne avec FTS5 trigram, préfixe sinon
+    assert search("ip") == ["IPP1200", "IPP3412"] # requête courte : préfixe
+    assert search("xé_") == ["XÉ_120"] and search("x%") == [] and search("ip*") == [] # accents, jokers pris littéralement
+
+    index.upsert("IPP1200", {"receveur_ipp": "IPP9900"}); index.delete("XÉ_120")
+    assert search("120") == []
+    assert search("ipp99") == ["IPP1200"]
+
+    plan = " ".join(row[3] for row in index._conn.execute("EXPLAIN QUERY PLAN SELECT * FROM dossiers WHERE receveur_ipp_lower LIKE ? ESCAPE '\\'", ("ipp%",)))
+    assert "idx_dossiers_receveur_ipp_lower" in plan
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Sauvegarde des dossiers : les fichiers des anciens formats restent en place jusqu'à la migration."""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dossier_format import read_dossier_file  # noqa: E402
+from dossier_index import DOSSIER_FILENAME, find_dossier_file  # noqa: E402
+from dossier_store import load_version, save_dossier  # noqa: E402
+
+
+def test_save_keeps_legacy_files_and_wins_by_mtime(tmp_path):
+    legacy = tmp_path / "patient_data.json"
+    legacy.write_text(json.dumps({"receveur_ipp": "IPP1", "receveur_nom": "test.py"}), encoding='utf-8')
+    os.utime(legacy, (1_000_000, 1_000_000))
+
+    save_dossier(str(tmp_path), {"receveur_ipp": "IPP1", "receveur_nom": "app.py"})
+    assert legacy.exists() # test.py garde son fichier
+    source, _ = find_dossier_file(str(tmp_path))
+    assert source == DOSSIER_FILENAME
+    assert read_dossier_file(str(tmp_path / source))["receveur_nom"] == "app.py"
+    assert load_version(str(tmp_path), 1)["receveur_nom"] == "test.py" # version initiale : le fichier de test.py
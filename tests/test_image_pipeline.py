@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Vignettes et aperçus des images : produits à côté, le blob d'origine reste identique à son empreinte."""
+import hashlib
+import io
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+Image = pytest.importorskip("PIL.Image")
+
+from image_pipeline import ImagePipeline  # noqa: E402
+from upload_store import UploadStore  # noqa: E402
+
+
+def uploaded_photo(name="cin.jpg"):
+    """JPEG très peu compressé (bruit), comme une photo de téléphone."""
+    rnd = random.Random(1)
+    img = Image.new("RGB", (400, 300))
+    img.putdata([(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)) for _ in range(400 * 300)])
+    f = io.BytesIO(); img.save(f, "JPEG", quality=100)
+    f.name, f.type = name, "image/jpeg"
+    return f
+
+
+def test_original_blob_is_never_modified(tmp_path):
+    store = UploadStore(str(tmp_path / "patients"), str(tmp_path / "blobs"))
+    reference = store.ingest("IPP1", "tribunal", uploaded_photo())
+    pipeline = ImagePipeline(store, max_workers=1)
+    pipeline.submit(reference).result()
+
+    with open(store.blob_path(reference["sha256"]), 'rb') as f:
+        assert hashlib.sha256(f.read()).hexdigest() == reference["sha256"]
+    thumbnail, preview = pipeline.thumbnail_path(reference["sha256"]), pipeline.preview_path(reference["sha256"])
+    assert thumbnail and preview
+    assert pipeline.stats["derived_bytes"] == os.path.getsize(thumbnail) + os.path.getsize(preview)
+    assert pipeline.submit(reference) is None # une fois par contenu
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Migration vers dossier.msgpack : le fichier le plus récent est converti, seuls les fichiers vérifiés sont supprimés."""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip("msgpack")
+
+from dossier_format import BINARY_FILENAME, read_dossier_file  # noqa: E402
+from dossier_store import save_dossier, write_dossier_file  # noqa: E402
+from migrate_dossiers import migrate_folder  # noqa: E402
+
+
+def write_json(path, data, mtime):
+    with open(path, 'w', encoding='utf-8') as f: json.dump(data, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_newest_legacy_file_is_converted_and_a_divergent_one_is_kept(tmp_path):
+    write_json(tmp_path / "data.json", {"receveur_ipp": "IPP1", "receveur_nom": "Application"}, 1_000_000)
+    write_json(tmp_path / "patient_data.json", {"receveur_ipp": "IPP1", "receveur_nom": "test.py"}, 2_000_000)
+
+    ipp, status, _, _, error, kept = migrate_folder((str(tmp_path), False, False))
+    assert (status, error, kept) == ("migré", None, ["data.json"])
+    assert read_dossier_file(str(tmp_path / BINARY_FILENAME))["receveur_nom"] == "test.py"
+    assert not (tmp_path / "patient_data.json").exists() # converti et vérifié
+    assert (tmp_path / "data.json").exists() # différent, absent de l'historique : conservé
+
+
+def test_legacy_file_replaced_by_an_app_save_is_removed(tmp_path):
+    write_json(tmp_path / "data.json", {"receveur_ipp": "IPP1", "receveur_nom": "Avant"}, 1_000_000)
+    save_dossier(str(tmp_path), {"receveur_ipp": "IPP1", "receveur_nom": "Après"}) # data.json gardé, copié en version 1 du journal
+
+    _, status, _, _, error, kept = migrate_folder((str(tmp_path), False, False))
+    assert (status, error, kept) == ("déjà migré", None, [])
+    assert not (tmp_path / "data.json").exists()
+
+
+def test_dry_run_and_keep_legacy_leave_every_file(tmp_path):
+    write_json(tmp_path / "patient_data.json", {"receveur_ipp": "IPP1"}, 1_000_000)
+    assert migrate_folder((str(tmp_path), True, False))[1] == "vérifié"
+    assert not (tmp_path / BINARY_FILENAME).exists()
+    assert migrate_folder((str(tmp_path), False, True))[1] == "migré"
+    assert (tmp_path / "patient_data.json").exists() and (tmp_path / BINARY_FILENAME).exists()
+
+
+def test_older_divergent_binary_file_is_not_overwritten(tmp_path):
+    write_dossier_file(str(tmp_path), {"receveur_ipp": "IPP1", "receveur_nom": "Binaire"}, BINARY_FILENAME)
+    os.utime(tmp_path / BINARY_FILENAME, (1_000_000, 1_000_000))
+    write_json(tmp_path / "data.json", {"receveur_ipp": "IPP1", "receveur_nom": "JSON"}, 2_000_000)
+
+    _, status, _, _, error, _ = migrate_folder((str(tmp_path), False, False))
+    assert status == "échec" and "conflit" in error
+    assert read_dossier_file(str(tmp_path / BINARY_FILENAME))["receveur_nom"] == "Binaire"
+    assert (tmp_path / "data.json").exists()
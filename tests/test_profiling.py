@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Profilage : un fragment relancé seul compte comme un rerun de sa page, l'export se fait hors du rerun."""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import JSONL_FILENAME, PROMETHEUS_FILENAME, RerunProfiler  # noqa: E402
+
+
+def test_fragment_rerun_counts_for_its_page_and_session():
+    profiler = RerunProfiler()
+    render_medical_page = profiler.fragment(lambda: ("s1", "Nouveau Dossier / étape 4"))(lambda: None)
+
+    render_medical_page() # rerun du fragment seul
+    assert profiler.pages["Nouveau Dossier / étape 4"].count == 1
+    assert profiler.sessions["s1"].count == 1
+    assert profiler.page_functions[("Nouveau Dossier / étape 4", "<lambda>")].count == 1
+
+    profiler.begin_rerun("s1", "Nouveau Dossier / étape 4") # rerun complet : le fragment n'est qu'une fonction de plus
+    render_medical_page()
+    profiler.end_rerun()
+    assert profiler.pages["Nouveau Dossier / étape 4"].count == 2
+    assert profiler.sessions["s1"].count == 2
+    assert profiler.functions["<lambda>"].count == 2
+
+
+def test_exports_are_written_off_the_rerun_thread(tmp_path):
+    profiler = RerunProfiler(str(tmp_path), export_interval=0)
+    writers = []
+    write_exports = profiler.write_exports
+    profiler.write_exports = lambda: (writers.append(threading.current_thread()), write_exports())
+
+    profiler.begin_rerun("s1", "Tableau de Bord"); profiler.end_rerun()
+    profiler._exporter.shutdown(wait=True)
+    assert writers and threading.current_thread() not in writers
+    assert (tmp_path / PROMETHEUS_FILENAME).exists() and (tmp_path / JSONL_FILENAME).exists()
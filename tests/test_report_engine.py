@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Moteur PDF : sans police DejaVu, le rapport est rendu en Arial (fpdf 1.7 comme fpdf2)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("fpdf")
+
+import report_engine  # noqa: E402
+
+SECTIONS = {
+    "Informations sur le Receveur": {"IPP": "IPP000001", "Nom Complet": "Chraïbi Hélène"},
+    "Check-list des Examens Médicaux": {"Rx Thorax": True, "Myélogramme": False},
+}
+
+
+def test_missing_font_falls_back_to_arial(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # polices cherchées dans le dossier courant
+    monkeypatch.setattr(report_engine, "_missing_fonts", set())
+    monkeypatch.setattr(report_engine, "_font_templates", {})
+
+    for _ in range(2):
+        assert report_engine.render_report(SECTIONS).startswith(b"%PDF")
+    assert report_engine.FONT_FILES[''] in report_engine._missing_fonts
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Stockage des documents téléversés, adressé par contenu et idempotent.
+
+Chaque fichier est lu par blocs et haché (SHA-256), puis copié dans le magasin de
+blobs partagé par tous les patients seulement si ce contenu y manque : un même scan
+(la CIN d'un parent jointe aux dossiers de plusieurs frères et sœurs) n'est stocké
+qu'une fois.
+Chaque patient garde ses références (nom d'origine, catégorie, empreinte) dans
+`<dossier IPP>/uploads.json`.
+
+Un fichier déjà ingéré pour ce patient et cette catégorie n'est ni relu ni réécrit :
+Streamlit renvoie le même objet téléversé à chaque rerun, reconnu par son file_id.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from caching import LRUCache
+
+UPLOADS_MANIFEST = "uploads.json"
+CHUNK_SIZE = 1024 * 1024
+
+
+def new_ingest_stats():
+    return {"ingested": 0, "skipped": 0, "blobs_written": 0, "deduplicated": 0, "bytes_written": 0, "bytes_deduplicated": 0}
+
+
+class UploadStore:
+    def __init__(self, base_folder, blob_folder, chunk_size=CHUNK_SIZE):
+        self.base_folder = base_folder
+        self.blob_folder = blob_folder
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._seen = LRUCache(max_entries=4096) # (ipp, catégorie, file_id) -> référence déjà enregistrée
+        self.stats = new_ingest_stats()
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_folder, digest[:2], digest)
+
+    def manifest_path(self, ipp):
+        return os.path.join(self.base_folder, ipp, UPLOADS_MANIFEST)
+
+    def references(self, ipp):
+        """Références des documents du patient, dans l'ordre d'ingestion."""
+        try:
+            with open(self.manifest_path(ipp), 'r', encoding='utf-8') as f: return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def disk_usage(self, ipp):
+        """Octets occupés par les documents du patient (chaque blob compté une fois, à sa taille actuelle)."""
+        total = 0
+        for digest in {ref["sha256"] for ref in self.references(ipp)}:
+            try: total += os.path.getsize(self.blob_path(digest))
+            except FileNotFoundError: pass
+        return total
+
+    def _write_manifest(self, ipp, references):
+        path = self.manifest_path(ipp); os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            json.dump(references, f, ensure_ascii=False, indent=2)
+        os.replace(f.name, path)
+
+    def _chunks(self, uploaded_file):
+        uploaded_file.seek(0)
+        try:
+            while True:
+                chunk = uploaded_file.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            uploaded_file.seek(0)
+
+    def _store_blob(self, uploaded_file):
+        """Hache le fichier par blocs, puis ne l'écrit (temporaire + rename) que si ce contenu est absent du magasin.
+
+        Le fichier téléversé est déjà en mémoire : le relire coûte bien moins qu'une écriture disque inutile.
+        Retourne (empreinte, taille, déjà présent).
+        """
+        digest, size = hashlib.sha256(), 0
+        for chunk in self._chunks(uploaded_file):
+            digest.update(chunk); size += len(chunk)
+        digest = digest.hexdigest()
+        target = self.blob_path(digest)
+        if os.path.exists(target):
+            return digest, size, True
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(target), suffix='.part', delete=False) as tmp:
+            try:
+                for chunk in self._chunks(uploaded_file): tmp.write(chunk)
+            except BaseException:
+                tmp.close(); os.remove(tmp.name)
+                raise
+        os.replace(tmp.name, target)
+        return digest, size, False
+
+    def ingest(self, ipp, category, uploaded_file):
+        """Enregistre `uploaded_file` pour le patient `ipp` ; sans effet (ni lecture ni écriture) s'il l'est déjà.
+
+        Retourne la référence du document : {name, category, sha256, size, type, ingested_at}.
+        """
+        seen_key = (ipp, category, getattr(uploaded_file, 'file_id', None) or id(uploaded_file))
+        reference = self._seen.get(seen_key)
+        if reference is not None:
+            self.stats["skipped"] += 1
+            return reference
+        digest, size, existed = self._store_blob(uploaded_file)
+        with self._lock:
+            references = self.references(ipp)
+            reference = next((ref for ref in references if ref["sha256"] == digest and ref["category"] == category and ref["name"] == uploaded_file.name), None)
+            if reference is None:
+                reference = {"name": uploaded_file.name, "category": category, "sha256": digest, "size": size, "type": getattr(uploaded_file, 'type', None), "ingested_at": datetime.datetime.now().isoformat(timespec='seconds')}
+                references.append(reference)
+                self._write_manifest(ipp, references)
+            self.stats["ingested"] += 1
+            if existed:
+                self.stats["deduplicated"] += 1; self.stats["bytes_deduplicated"] += size
+            else:
+                self.stats["blobs_written"] += 1; self.stats["bytes_written"] += size
+        self._seen.put(seen_key, reference)
+        logging.info(f"Document {uploaded_file.name} ({category}) rattaché au dossier {ipp} : blob {digest[:12]}{' (déjà présent)' if existed else ''}")
+        return reference